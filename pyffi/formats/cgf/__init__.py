@@ -201,6 +201,8 @@ Create a CGF file from scratch
 # ***** END LICENSE BLOCK *****
 # --------------------------------------------------------------------------
 
+import bisect
+import io
 import itertools
 import logging
 import struct
@@ -213,6 +215,7 @@ import warnings
 import pyffi.object_models.common
 import pyffi.object_models
 import pyffi.object_models.xml
+import pyffi.object_models.xml.tracking
 import pyffi.utils.mathutils
 import pyffi.utils.tangentspace
 from pyffi.object_models.xml.basic import BasicBase
@@ -536,6 +539,7 @@ but got instance of %s""" % (self._template, block.__class__))
         _link_stack = None
         _block_index_dct = None
         _block_dct = None
+        _lazy_stream = None
 
         def __init__(self, filetype=0xffff0000, game="Far Cry"):
             # 0xffff0000 = CgfFormat.FileType.GEOM
@@ -695,169 +699,257 @@ but got instance of %s""" % (self._template, block.__class__))
             finally:
                 stream.seek(pos)
 
-        def read(self, stream):
+        def read(self, stream, lazy=False):
             """Read a cgf file. Does not reset stream position.
 
+            The chunks are read in the order in which they are stored in
+            the file. In lazy mode, the data of the file is kept in
+            memory, and chunks are only decoded when they are accessed,
+            either through :meth:`get_chunk`, or all at once through
+            :attr:`chunks`.
+
+            >>> stream = open('tests/cgf/vcols.cgf', 'rb')
+            >>> data = CgfFormat.Data()
+            >>> data.read(stream, lazy=True)
+            >>> stream.close()
+            >>> node = data.get_chunk(4) # also decodes the chunks it links to
+            >>> node.object.__class__.__name__
+            'MeshChunk'
+            >>> [chunk.__class__.__name__ for chunk in data.chunks]
+            ... # doctest: +NORMALIZE_WHITESPACE
+            ['SourceInfoChunk', 'TimingChunk', 'MtlChunk', 'MtlChunk',
+             'NodeChunk', 'MeshChunk']
+
             :param stream: The stream from which to read.
             :type stream: ``file``
+            :param lazy: Whether to decode chunks only when they are
+                accessed.
+            :type lazy: ``bool``
             """
-            validate = True # whether we validate on reading
-            
-            logger = logging.getLogger("pyffi.cgf.data")
             self.inspect(stream)
 
             # is it a caf file? these are missing chunk headers on controllers
             # (note: stream.name may not be a python string for some file
             # implementations, notably PyQt4, so convert it explicitely)
-            is_caf = (str(stream.name)[-4:].lower() == ".caf")
-
-            chunk_types = [
-                chunk_type for chunk_type in dir(CgfFormat.ChunkType) \
-                if chunk_type[:2] != '__']
-
-            # get the chunk sizes (for double checking that we have all data)
-            if validate:
-                chunk_offsets = [chunkhdr.offset
-                                 for chunkhdr in self.chunk_table.chunk_headers]
-                chunk_offsets.append(self.header.offset)
-                chunk_sizes = []
-                for chunkhdr in self.chunk_table.chunk_headers:
-                    next_chunk_offsets = [offset for offset in chunk_offsets
-                                          if offset > chunkhdr.offset]
-                    if next_chunk_offsets:
-                        chunk_sizes.append(min(next_chunk_offsets) - chunkhdr.offset)
-                    else:
-                        stream.seek(0, 2)
-                        chunk_sizes.append(stream.tell() - chunkhdr.offset)
+            self._is_caf = (str(getattr(stream, "name", ""))[-4:].lower()
+                            == ".caf")
+
+            # check that ids are unique, and that all chunk types are known
+            chunk_headers = list(self.chunk_table.chunk_headers)
+            self._chunk_index_dct = {}
+            for chunknum, chunkhdr in enumerate(chunk_headers):
+                if chunkhdr.id in self._chunk_index_dct:
+                    raise ValueError('chunk id %i not unique'%chunkhdr.id)
+                if chunkhdr.type not in CgfFormat.CHUNK_MAP:
+                    raise ValueError('unknown chunk type 0x%08X'%chunkhdr.type)
+                self._chunk_index_dct[chunkhdr.id] = chunknum
+
+            # get the chunk sizes (for double checking that we have all
+            # data): each chunk ends where the next one in the file starts
+            offsets = sorted(set(
+                [chunkhdr.offset for chunkhdr in chunk_headers]
+                + [self.header.offset]))
+            stream.seek(0, 2)
+            end_offset = stream.tell()
+            self._chunk_sizes = []
+            for chunkhdr in chunk_headers:
+                index = bisect.bisect_right(offsets, chunkhdr.offset)
+                next_offset = (offsets[index] if index < len(offsets)
+                               else end_offset)
+                self._chunk_sizes.append(next_offset - chunkhdr.offset)
 
             # read the chunks
-            self._link_stack = [] # list of chunk identifiers, as added to the stack
-            self._block_dct = {} # maps chunk index to actual chunk
-            self.chunks = [] # records all chunks as read from cgf file in proper order
-            self.versions = [] # records all chunk versions as read from cgf file
-            for chunknum, chunkhdr in enumerate(self.chunk_table.chunk_headers):
-                # check that id is unique
-                if chunkhdr.id in self._block_dct:
-                    raise ValueError('chunk id %i not unique'%chunkhdr.id)
+            self._block_dct = {} # maps chunk id to actual chunk
+            self._chunk_links = {} # maps chunk index to its chunk ids
+            self.chunks = [None] * len(chunk_headers) # in proper order
+            self.versions = [chunkhdr.version for chunkhdr in chunk_headers]
+            if lazy:
+                stream.seek(0)
+                self._lazy_stream = io.BytesIO(stream.read())
+                stream.seek(end_offset)
+                return
+            for chunknum in sorted(range(len(chunk_headers)),
+                                   key=lambda i: chunk_headers[i].offset):
+                self._read_chunk(stream, chunknum)
 
-                # get chunk type
-                for chunk_type in chunk_types:
-                    if getattr(CgfFormat.ChunkType, chunk_type) == chunkhdr.type:
-                        break
-                else:
-                    raise ValueError('unknown chunk type 0x%08X'%chunkhdr.type)
-                try:
-                    chunk = getattr(CgfFormat, '%sChunk' % chunk_type)()
-                except AttributeError:
+            # fix links
+            for chunknum in range(len(chunk_headers)):
+                self._fix_chunk_links(chunknum)
+
+        @property
+        def chunks(self):
+            """List of chunks (the actual data). In lazy mode, accessing
+            this list decodes all chunks that have not been decoded yet.
+            """
+            if self._lazy_stream is not None:
+                for chunknum, chunk in enumerate(self._chunks):
+                    if chunk is None:
+                        self.get_chunk(chunknum)
+            return self._chunks
+
+        @chunks.setter
+        def chunks(self, chunks):
+            self._chunks = chunks
+            self._lazy_stream = None
+
+        def get_chunk(self, index):
+            """Return a chunk, decoding it first if it has not been
+            decoded yet. Chunks which it links to are decoded along
+            with it.
+
+            :param index: The index of the chunk in :attr:`chunks`.
+            :type index: ``int``
+            :return: The chunk.
+            :rtype: L{CgfFormat.Chunk}
+            """
+            chunk = self._chunks[index]
+            if chunk is not None or self._lazy_stream is None:
+                return chunk
+            # decode the chunk and everything it links to, then fix links
+            decoded = []
+            stack = [index]
+            while stack:
+                chunknum = stack.pop()
+                if self._chunks[chunknum] is not None:
+                    continue
+                self._read_chunk(self._lazy_stream, chunknum)
+                decoded.append(chunknum)
+                stack.extend(self._chunk_index_dct[chunk_id]
+                             for chunk_id in self._chunk_links[chunknum]
+                             if chunk_id in self._chunk_index_dct)
+            for chunknum in decoded:
+                self._fix_chunk_links(chunknum)
+            if all(chunk is not None for chunk in self._chunks):
+                self._lazy_stream = None
+            return self._chunks[index]
+
+        def _read_chunk(self, stream, chunknum):
+            """Read the chunk with given index in the chunk table, and
+            check its size. Its links are fixed later, by
+            :meth:`_fix_chunk_links`.
+            """
+            logger = logging.getLogger("pyffi.cgf.data")
+            chunkhdr = self.chunk_table.chunk_headers[chunknum]
+            chunk_class = CgfFormat.CHUNK_MAP[chunkhdr.type]
+            chunk_type = chunk_class.__name__[:-5]
+            # track changes to the chunk
+            tracker = pyffi.object_models.xml.tracking.ChangeTracker()
+            with pyffi.object_models.xml.tracking.track(tracker):
+                chunk = chunk_class()
+            tracker.owner = chunk
+            # check the chunk version
+            if not self.game in chunk.get_games():
+                logger.error(
+                    'game %s does not support %sChunk; '
+                    'trying anyway'
+                    % (self.game, chunk_type))
+            if not chunkhdr.version in chunk.get_versions(self.game):
+                logger.error(
+                    'chunk version 0x%08X not supported for '
+                    'game %s and %sChunk; '
+                    'trying anyway'
+                    % (chunkhdr.version, self.game, chunk_type))
+
+            # now read the chunk
+            stream.seek(chunkhdr.offset)
+            logger.debug("Reading %s chunk version 0x%08X at 0x%08X"
+                         % (chunk_type, chunkhdr.version, stream.tell()))
+
+            # in far cry, most chunks start with a copy of chunkhdr
+            # in crysis, more chunks start with chunkhdr
+            # caf files are special: they don't have headers on controllers
+            if not(self.user_version == CgfFormat.UVER_FARCRY
+                   and chunkhdr.type in [
+                       CgfFormat.ChunkType.SourceInfo,
+                       CgfFormat.ChunkType.BoneNameList,
+                       CgfFormat.ChunkType.BoneLightBinding,
+                       CgfFormat.ChunkType.BoneInitialPos,
+                       CgfFormat.ChunkType.MeshMorphTarget]) \
+                and not(self.user_version == CgfFormat.UVER_CRYSIS
+                        and chunkhdr.type in [
+                            CgfFormat.ChunkType.BoneNameList,
+                            CgfFormat.ChunkType.BoneInitialPos]) \
+                and not(self._is_caf
+                        and chunkhdr.type in [
+                            CgfFormat.ChunkType.Controller]) \
+                and not((self.game == "Aion") and chunkhdr.type in [
+                    CgfFormat.ChunkType.MeshPhysicsData,
+                    CgfFormat.ChunkType.MtlName]):
+                chunkhdr_copy = CgfFormat.ChunkHeader()
+                chunkhdr_copy.read(stream, self)
+                # check that the copy is valid
+                # note: chunkhdr_copy.offset != chunkhdr.offset check removed
+                # as many crysis cgf files have this wrong
+                if chunkhdr_copy.type != chunkhdr.type \
+                   or chunkhdr_copy.version != chunkhdr.version \
+                   or chunkhdr_copy.id != chunkhdr.id:
                     raise ValueError(
-                        'undecoded chunk type 0x%08X (%sChunk)'
-                        %(chunkhdr.type, chunk_type))
-                # check the chunk version
-                if not self.game in chunk.get_games():
-                    logger.error(
-                        'game %s does not support %sChunk; '
-                        'trying anyway'
-                        % (self.game, chunk_type))
-                if not chunkhdr.version in chunk.get_versions(self.game):
-                    logger.error(
-                        'chunk version 0x%08X not supported for '
-                        'game %s and %sChunk; '
-                        'trying anyway'
-                        % (chunkhdr.version, self.game, chunk_type))
-
-                # now read the chunk
-                stream.seek(chunkhdr.offset)
-                logger.debug("Reading %s chunk version 0x%08X at 0x%08X"
-                             % (chunk_type, chunkhdr.version, stream.tell()))
-
-                # in far cry, most chunks start with a copy of chunkhdr
-                # in crysis, more chunks start with chunkhdr
-                # caf files are special: they don't have headers on controllers
-                if not(self.user_version == CgfFormat.UVER_FARCRY
-                       and chunkhdr.type in [
-                           CgfFormat.ChunkType.SourceInfo,
-                           CgfFormat.ChunkType.BoneNameList,
-                           CgfFormat.ChunkType.BoneLightBinding,
-                           CgfFormat.ChunkType.BoneInitialPos,
-                           CgfFormat.ChunkType.MeshMorphTarget]) \
-                    and not(self.user_version == CgfFormat.UVER_CRYSIS
-                            and chunkhdr.type in [
-                                CgfFormat.ChunkType.BoneNameList,
-                                CgfFormat.ChunkType.BoneInitialPos]) \
-                    and not(is_caf
-                            and chunkhdr.type in [
-                                CgfFormat.ChunkType.Controller]) \
-                    and not((self.game == "Aion") and chunkhdr.type in [
-                        CgfFormat.ChunkType.MeshPhysicsData,
-                        CgfFormat.ChunkType.MtlName]):
-                    chunkhdr_copy = CgfFormat.ChunkHeader()
-                    chunkhdr_copy.read(stream, self)
-                    # check that the copy is valid
-                    # note: chunkhdr_copy.offset != chunkhdr.offset check removed
-                    # as many crysis cgf files have this wrong
-                    if chunkhdr_copy.type != chunkhdr.type \
-                       or chunkhdr_copy.version != chunkhdr.version \
-                       or chunkhdr_copy.id != chunkhdr.id:
-                        raise ValueError(
-                            'chunk starts with invalid header:\n\
+                        'chunk starts with invalid header:\n\
 expected\n%sbut got\n%s'%(chunkhdr, chunkhdr_copy))
-                else:
-                    chunkhdr_copy = None
+            else:
+                chunkhdr_copy = None
 
-                # quick hackish trick with version... not beautiful but it works
-                self.version = chunkhdr.version
-                try:
+            # quick hackish trick with version... not beautiful but it works
+            # the links of each chunk are kept separately, as chunks are
+            # not necessarily read in the order in which they are fixed
+            self.version = chunkhdr.version
+            self._link_stack = []
+            try:
+                with pyffi.object_models.xml.tracking.track(tracker):
                     chunk.read(stream, self)
-                finally:
-                    self.version = self.header.version
-                self.chunks.append(chunk)
-                self.versions.append(chunkhdr.version)
-                self._block_dct[chunkhdr.id] = chunk
-
-                if validate:
-                    # calculate size
-                    # (quick hackish trick with version)
-                    self.version = chunkhdr.version
-                    try:
-                        size = chunk.get_size(self)
-                    finally:
-                        self.version = self.header.version
-                    # take into account header copy
-                    if chunkhdr_copy:
-                        size += chunkhdr_copy.get_size(self)
-                    # check with number of bytes read
-                    if size != stream.tell() - chunkhdr.offset:
-                        logger.error("""\
+            finally:
+                self.version = self.header.version
+            self._chunk_links[chunknum] = self._link_stack
+            self._link_stack = []
+            self._chunks[chunknum] = chunk
+            self._block_dct[chunkhdr.id] = chunk
+
+            # calculate size
+            # (quick hackish trick with version)
+            self.version = chunkhdr.version
+            try:
+                size = chunk.get_size(self)
+            finally:
+                self.version = self.header.version
+            # take into account header copy
+            if chunkhdr_copy:
+                size += chunkhdr_copy.get_size(self)
+            chunk_size = self._chunk_sizes[chunknum]
+            # check with number of bytes read
+            if size != stream.tell() - chunkhdr.offset:
+                logger.error("""\
 get_size returns wrong size when reading %s at 0x%08X
 actual bytes read is %i, get_size yields %i (expected %i bytes)"""
-                                    % (chunk.__class__.__name__,
-                                       chunkhdr.offset,
-                                       size,
-                                       stream.tell() - chunkhdr.offset,
-                                       chunk_sizes[chunknum]))
-                    # check for padding bytes
-                    if chunk_sizes[chunknum] & 3 == 0:
-                        padlen = ((4 - size & 3) & 3)
-                        #assert(stream.read(padlen) == '\x00' * padlen)
-                        size += padlen
-                    # check size
-                    if size != chunk_sizes[chunknum]:
-                        logger.warn("""\
+                            % (chunk.__class__.__name__,
+                               chunkhdr.offset,
+                               size,
+                               stream.tell() - chunkhdr.offset,
+                               chunk_size))
+            # check for padding bytes
+            if chunk_size & 3 == 0:
+                padlen = ((4 - size & 3) & 3)
+                #assert(stream.read(padlen) == '\x00' * padlen)
+                size += padlen
+            # check size
+            if size != chunk_size:
+                logger.warn("""\
 chunk size mismatch when reading %s at 0x%08X
 %i bytes available, but actual bytes read is %i"""
-                                    % (chunk.__class__.__name__,
-                                       chunkhdr.offset,
-                                       chunk_sizes[chunknum], size))
+                            % (chunk.__class__.__name__,
+                               chunkhdr.offset,
+                               chunk_size, size))
 
-            # fix links
-            for chunk, chunkversion in zip(self.chunks, self.versions):
-                # (quick hackish trick with version)
-                self.version = chunkversion
-                try:
-                    #print(chunk.__class__)
-                    chunk.fix_links(self)
-                finally:
-                    self.version = self.header.version
+        def _fix_chunk_links(self, chunknum):
+            """Resolve the links of a chunk which has been read by
+            :meth:`_read_chunk`.
+            """
+            # (quick hackish trick with version)
+            self.version = self.versions[chunknum]
+            self._link_stack = self._chunk_links.pop(chunknum)
+            try:
+                self._chunks[chunknum].fix_links(self)
+            finally:
+                self.version = self.header.version
             if self._link_stack != []:
                 raise CgfFormat.CgfError(
                     'not all links have been popped from the stack (bug?)')
@@ -873,7 +965,8 @@ chunk size mismatch when reading %s at 0x%08X
             """
             logger = logging.getLogger("pyffi.cgf.data")
             # is it a caf file? these are missing chunk headers on controllers
-            is_caf = (str(stream.name)[-4:].lower() == ".caf")
+            is_caf = (str(getattr(stream, "name", ""))[-4:].lower()
+                      == ".caf")
 
             # variable to track number of padding bytes
             total_padding = 0
@@ -97,6 +97,7 @@ import pyffi.object_models.common
 from pyffi.object_models.xml.basic import BasicBase
 import pyffi.object_models
 from pyffi.utils.graph import EdgeFilter
+import pyffi.utils.dxt
 
 class DdsFormat(pyffi.object_models.xml.FileFormat):
     """This class implements the DDS format."""
@@ -262,6 +263,198 @@ class DdsFormat(pyffi.object_models.xml.FileFormat):
             # next the pixel data
             self.pixeldata.write(stream, data=self)
 
+        def get_format(self):
+            """Return the compression format of the pixel data.
+
+            :return: ``"DXT1"``, ``"DXT3"``, or ``"DXT5"`` for
+                compressed textures, ``None`` for uncompressed
+                textures with 8 bits per channel.
+            :raise ValueError: If the pixel format is not supported.
+            """
+            pixel_format = self.header.pixel_format
+            if pixel_format.flags.four_c_c:
+                for fmt in ("DXT1", "DXT3", "DXT5"):
+                    if pixel_format.four_c_c == getattr(
+                        DdsFormat.FourCC, fmt):
+                        return fmt
+            elif (pixel_format.flags.rgb
+                  and pixel_format.bit_count in (24, 32)
+                  and all(offset is not None
+                          for offset in self._get_channel_offsets()[:3])):
+                return None
+            raise ValueError("unsupported pixel format")
+
+        def _get_channel_offsets(self):
+            """Return for each channel of an uncompressed texture the
+            byte offset within a pixel, or ``None`` if the channel is
+            absent or does not occupy a single byte.
+            """
+            pixel_format = self.header.pixel_format
+            offsets = []
+            for mask in (pixel_format.r_mask, pixel_format.g_mask,
+                         pixel_format.b_mask, pixel_format.a_mask):
+                shift = (mask & -mask).bit_length() - 1
+                if mask and shift % 8 == 0 and mask == 0xff << shift:
+                    offsets.append(shift // 8)
+                else:
+                    offsets.append(None)
+            return offsets
+
+        def _get_level_size(self, width, height, fmt):
+            """Return the number of bytes of a single mipmap level."""
+            if fmt:
+                return pyffi.utils.dxt.get_size(width, height, fmt)
+            else:
+                return width * height * (
+                    self.header.pixel_format.bit_count // 8)
+
+        def get_num_mipmaps(self):
+            """Return the number of mipmap levels in the pixel data,
+            the first level included.
+
+            >>> data = DdsFormat.Data()
+            >>> stream = open('tests/dds/test.dds', 'rb')
+            >>> data.read(stream)
+            >>> stream.close()
+            >>> data.get_num_mipmaps()
+            6
+
+            :return: The number of levels.
+            :rtype: ``int``
+            """
+            header = self.header
+            if header.flags.mipmap_count:
+                return max(1, header.mipmap_count)
+            return 1
+
+        def get_mipmaps(self, num_levels=None):
+            """Decode the pixel data of all mipmap levels, or of the
+            first C{num_levels} levels.
+
+            >>> data = DdsFormat.Data()
+            >>> stream = open('tests/dds/test.dds', 'rb')
+            >>> data.read(stream)
+            >>> stream.close()
+            >>> [(width, height, len(rgba))
+            ...  for width, height, rgba in data.get_mipmaps()]
+            ... # doctest: +NORMALIZE_WHITESPACE
+            [(60, 20, 4800), (30, 10, 1200), (15, 5, 300), (7, 2, 56),
+             (3, 1, 12), (1, 1, 4)]
+            >>> [(width, height) for width, height, rgba
+            ...  in data.get_mipmaps(num_levels=1)]
+            [(60, 20)]
+
+            :param num_levels: The number of levels to decode, or
+                ``None`` for all levels.
+            :type num_levels: ``int``
+            :return: The width, height, and RGBA pixels of each level,
+                rows from top to bottom.
+            :rtype: ``list`` of ``tuple``
+            """
+            header = self.header
+            fmt = self.get_format()
+            if num_levels is None:
+                num_levels = self.get_num_mipmaps()
+            buf = self.pixeldata.get_value()
+            levels = []
+            pos = 0
+            for width, height in pyffi.utils.dxt.get_level_sizes(
+                header.width, header.height, num_levels):
+                size = self._get_level_size(width, height, fmt)
+                if pos + size > len(buf):
+                    raise ValueError(
+                        "pixel data too short for %i mipmaps" % num_levels)
+                if fmt:
+                    rgba = pyffi.utils.dxt.decode(
+                        buf[pos:pos + size], width, height, fmt)
+                else:
+                    raw = buf[pos:pos + size]
+                    pixel_bytes = header.pixel_format.bit_count // 8
+                    rgba = bytearray(4 * width * height)
+                    for channel, offset in enumerate(
+                        self._get_channel_offsets()):
+                        if offset is not None:
+                            rgba[channel::4] = raw[offset::pixel_bytes]
+                        elif channel == 3:
+                            rgba[channel::4] = b"\xff" * (width * height)
+                    rgba = bytes(rgba)
+                levels.append((width, height, rgba))
+                pos += size
+            return levels
+
+        def set_mipmaps(self, levels, fmt=None, keep_levels=0):
+            """Encode the pixel data of all mipmap levels, and update
+            the header accordingly.
+
+            :param levels: The width, height, and RGBA pixels of each
+                level, as returned by :meth:`get_mipmaps`.
+            :type levels: ``list`` of ``tuple``
+            :param fmt: The new compression format, ``"DXT1"``,
+                ``"DXT3"``, or ``"DXT5"``, or ``None`` to keep the
+                current format.
+            :type fmt: ``str``
+            :param keep_levels: Number of levels whose current pixel
+                data is kept as it is, rather than encoded again from
+                C{levels}, which avoids losing quality on compressed
+                textures. Only possible if the format is kept.
+            :type keep_levels: ``int``
+            """
+            header = self.header
+            pixel_format = header.pixel_format
+            kept = b""
+            if keep_levels:
+                if fmt is not None:
+                    raise ValueError("cannot keep levels in a new format")
+                kept_fmt = self.get_format()
+                kept_size = sum(
+                    self._get_level_size(width, height, kept_fmt)
+                    for width, height, rgba in levels[:keep_levels])
+                kept = self.pixeldata.get_value()[:kept_size]
+                if len(kept) != kept_size:
+                    raise ValueError(
+                        "pixel data too short for %i mipmaps" % keep_levels)
+            if fmt is None:
+                fmt = self.get_format()
+            else:
+                pixel_format.flags.four_c_c = 1
+                pixel_format.flags.rgb = 0
+                pixel_format.flags.alpha_pixels = 0
+                pixel_format.four_c_c = getattr(DdsFormat.FourCC, fmt)
+                pixel_format.bit_count = 0
+                pixel_format.r_mask = 0
+                pixel_format.g_mask = 0
+                pixel_format.b_mask = 0
+                pixel_format.a_mask = 0
+            chunks = [kept]
+            for width, height, rgba in levels[keep_levels:]:
+                if fmt:
+                    chunks.append(pyffi.utils.dxt.encode(
+                        rgba, width, height, fmt))
+                else:
+                    pixel_bytes = pixel_format.bit_count // 8
+                    raw = bytearray(pixel_bytes * width * height)
+                    for channel, offset in enumerate(
+                        self._get_channel_offsets()):
+                        if offset is not None:
+                            raw[offset::pixel_bytes] = rgba[channel::4]
+                    chunks.append(bytes(raw))
+            width, height = levels[0][:2]
+            header.width = width
+            header.height = height
+            header.mipmap_count = len(levels)
+            header.flags.mipmap_count = int(len(levels) > 1)
+            header.caps_1.mipmap = int(len(levels) > 1)
+            header.caps_1.complex = int(len(levels) > 1)
+            if fmt:
+                header.flags.linear_size = 1
+                header.flags.pitch = 0
+                header.linear_size = self._get_level_size(width, height, fmt)
+            else:
+                header.flags.linear_size = 0
+                header.flags.pitch = 1
+                header.linear_size = width * (pixel_format.bit_count // 8)
+            self.pixeldata.set_value(b"".join(chunks))
+
         # DetailNode
 
         def get_detail_child_nodes(self, edge_filter=EdgeFilter()):
@@ -112,6 +112,7 @@ import pyffi.object_models.common
 from pyffi.object_models.xml.basic import BasicBase
 import pyffi.object_models
 from pyffi.utils.graph import EdgeFilter
+import pyffi.utils.morph
 
 class EgmFormat(pyffi.object_models.xml.FileFormat):
     """This class implements the EGM format."""
@@ -329,6 +330,37 @@ class EgmFormat(pyffi.object_models.xml.FileFormat):
             for morph in self.sym_morphs + self.asym_morphs:
                 morph.apply_scale(scale)
 
+        def get_morphed_vertices(self, vertices, sym_weights=(),
+                                 asym_weights=()):
+            """Return the vertices of the base model with the morphs
+            applied, each multiplied by its weight. If numpy is available,
+            all morphs are added in a single pass, and an array of shape
+            ``(num_vertices, 3)`` is returned; otherwise, a list of tuples
+            is returned.
+
+            >>> data = EgmFormat.Data(num_vertices=2)
+            >>> data.add_sym_morph().set_relative_vertices(
+            ...     [(1, 0, 0), (0, 2, 0)])
+            >>> data.add_asym_morph().set_relative_vertices(
+            ...     [(0, 0, 4), (0, 0, -4)])
+            >>> for vert in data.get_morphed_vertices(
+            ...     [(0, 0, 0), (1, 1, 1)], [0.5], [0.25]):
+            ...     print([round(float(x), 3) for x in vert])
+            [0.5, 0.0, 1.0]
+            [1.0, 2.0, 0.0]
+
+            :param vertices: The vertices of the base model.
+            :param sym_weights: The weight of each symmetric morph; missing
+                weights are zero.
+            :param asym_weights: The weight of each asymmetric morph;
+                missing weights are zero.
+            :return: The morphed vertices.
+            """
+            return pyffi.utils.morph.get_morphed_vertices(
+                vertices,
+                list(zip(sym_weights, self.sym_morphs))
+                + list(zip(asym_weights, self.asym_morphs)))
+
         # DetailNode
 
         def get_detail_child_nodes(self, edge_filter=EdgeFilter()):
@@ -351,7 +383,7 @@ class EgmFormat(pyffi.object_models.xml.FileFormat):
             for morph in self.asym_morphs:
                 yield "Asym Morph"
 
-    class MorphRecord:
+    class MorphRecord(pyffi.utils.morph.MorphRecord):
         """
         >>> # create morph with 3 vertices.
         >>> morph = EgmFormat.MorphRecord(argument=3)
@@ -365,44 +397,29 @@ class EgmFormat(pyffi.object_models.xml.FileFormat):
         [3000, 5000, 2000]
         [1000, 3000, 2000]
         [-8999, 3000, -999]
+        >>> morph.set_relative_vertices_array(
+        ...     [(3, 5, 2), (1, 3, 2), (-9, 3, -1)])
+        >>> for vert in morph.get_relative_vertices_array():
+        ...     print([int(1000 * x + 0.5) for x in vert])
+        [3000, 5000, 2000]
+        [1000, 3000, 2000]
+        [-8999, 3000, -999]
+        >>> morph.apply_scale(2)
+        >>> for vert in morph.get_relative_vertices():
+        ...     print([int(1000 * x + 0.5) for x in vert])
+        [6000, 10000, 4000]
+        [2000, 6000, 4000]
+        [-17999, 6000, -1999]
+        >>> # the shorts of a morph read from a file come from one buffer
+        >>> data = EgmFormat.Data()
+        >>> data.read(open('tests/egm/mmouthxivilai.egm', 'rb'))
+        >>> morph = data.sym_morphs[0]
+        >>> list(morph.get_short_vertices()[:3])
+        [17249, 783, 512]
+        >>> # which follows changes to the vertices
+        >>> morph.vertices[0].x = 5
+        >>> list(morph.get_short_vertices()[:3])
+        [5, 783, 512]
         """
-        def get_relative_vertices(self):
-            for vert in self.vertices:
-                yield (vert.x * self.scale,
-                       vert.y * self.scale,
-                       vert.z * self.scale)
-
-        def set_relative_vertices(self, vertices):
-            # copy to list
-            vertices = list(vertices)
-            # check length
-            if len(vertices) != self.arg:
-                raise ValueError("expected %i vertices, but got %i"
-                                 % (self.arg, len(vertices)))
-            # get extreme values of morph
-            max_value = max(max(abs(value) for value in vert)
-                            for vert in vertices)
-            # calculate scale
-            self.scale = max_value / 32767.0
-            inv_scale = 1 / self.scale
-            # set vertices
-            for vert, self_vert in zip(vertices, self.vertices):
-                self_vert.x = int(vert[0] * inv_scale)
-                self_vert.y = int(vert[1] * inv_scale)
-                self_vert.z = int(vert[2] * inv_scale)
-
-        def apply_scale(self, scale):
-            """Apply scale factor to data.
-
-            >>> # create morph with 3 vertices.
-            >>> morph = EgmFormat.MorphRecord(argument=3)
-            >>> morph.set_relative_vertices(
-            ...     [(3, 5, 2), (1, 3, 2), (-9, 3, -1)])
-            >>> morph.apply_scale(2)
-            >>> for vert in morph.get_relative_vertices():
-            ...     print([int(1000 * x + 0.5) for x in vert])
-            [6000, 10000, 4000]
-            [2000, 6000, 4000]
-            [-17999, 6000, -1999]
-            """
-            self.scale *= scale
+        # StructBase.read comes first in the generated class
+        read = pyffi.utils.morph.MorphRecord.read
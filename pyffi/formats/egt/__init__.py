@@ -78,11 +78,17 @@ Create an EGT file from scratch and write to file
 #
 # ***** END LICENSE BLOCK *****
 
+import array
 from itertools import chain
 import struct
 import os
 import re
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 import pyffi.object_models.xml
 import pyffi.object_models.common
 from pyffi.object_models.xml.basic import BasicBase
@@ -184,6 +190,58 @@ class EgtFormat(pyffi.object_models.xml.FileFormat):
         def get_detail_display(self):
             return self.__str__()
 
+    class BytePlane(BasicBase):
+        """A plane of signed bytes, one for every pixel of a texture. The
+        number of pixels is given by the argument. Implemented as basic type,
+        so the plane is read and written as a single buffer, rather than as a
+        byte object per pixel.
+
+        The value is a numpy ``int8`` array if numpy is available, and an
+        ``array.array`` of type ``'b'`` otherwise.
+        """
+        def __init__(self, argument=None, **kwargs):
+            BasicBase.__init__(self, argument=argument, **kwargs)
+            self.arg = argument if argument else 0
+            self.set_value(bytes(self.arg))
+
+        def get_value(self):
+            return self._value
+
+        def set_value(self, value):
+            if isinstance(value, bytes):
+                if numpy is not None:
+                    value = numpy.frombuffer(value, dtype=numpy.int8).copy()
+                else:
+                    value = array.array("b", value)
+            elif numpy is not None:
+                value = numpy.array(value, dtype=numpy.int8).ravel()
+            else:
+                value = array.array("b", value)
+            self._value = value
+
+        def get_size(self, data=None):
+            return self.arg
+
+        def get_hash(self, data=None):
+            return self._value.tobytes()
+
+        def read(self, stream, data):
+            buf = stream.read(self.arg)
+            if len(buf) != self.arg:
+                raise ValueError(
+                    "expected %i bytes, but got %i" % (self.arg, len(buf)))
+            self.set_value(buf)
+
+        def write(self, stream, data):
+            if len(self._value) != self.arg:
+                raise ValueError(
+                    "expected %i pixels, but got %i"
+                    % (self.arg, len(self._value)))
+            stream.write(self._value.tobytes())
+
+        def __str__(self):
+            return "< %i Bytes >" % len(self._value)
+
     @staticmethod
     def version_number(version_str):
         """Converts version segtng into an integer.
@@ -271,11 +329,89 @@ class EgtFormat(pyffi.object_models.xml.FileFormat):
             pyffi.object_models.xml.struct_.StructBase.write(
                 self, stream, self)
 
+        def get_morph_images(self):
+            """Return the red, green, and blue offsets of all morphs at
+            once. Rows of pixels are stored one after the other.
+
+            :return: If numpy is available, an ``int8`` array of shape
+                ``(num_textures, 3, height, width)``; otherwise, nested lists
+                of the same shape.
+            """
+            if numpy is not None:
+                return numpy.array(
+                    [texture.get_channels() for texture in self.textures]
+                    ).reshape(self.num_textures, 3, self.height, self.width)
+            return [[[list(plane[row * self.width:(row + 1) * self.width])
+                      for row in range(self.height)]
+                     for plane in texture.get_channels()]
+                    for texture in self.textures]
+
+        def get_morphed_offsets(self, weights):
+            """Return the red, green, and blue offsets of a face with the
+            given morph weights, that is, the sum of the offsets of every
+            morph multiplied by its weight. The texture flags are not taken
+            into account.
+
+            >>> data = EgtFormat.Data()
+            >>> data.width = data.height = 32
+            >>> data.num_textures = 2
+            >>> data.textures.update_size()
+            >>> data.textures[0].r = [10] * 1024
+            >>> data.textures[1].r = [-4] * 1024
+            >>> data.textures[1].b = [100] * 1024
+            >>> offsets = data.get_morphed_offsets([0.5, 2.0])
+            >>> [float(offsets[i][0][0]) for i in range(3)]
+            [-3.0, 0.0, 200.0]
+
+            :param weights: The weight of every morph; missing weights are
+                zero.
+            :return: If numpy is available, a float array of shape
+                ``(3, height, width)``; otherwise, nested lists of the same
+                shape.
+            """
+            weights = list(weights)[:self.num_textures]
+            textures = list(self.textures)[:len(weights)]
+            if numpy is not None:
+                images = numpy.array(
+                    [texture.get_channels() for texture in textures],
+                    dtype=float)
+                offsets = numpy.tensordot(weights, images, axes=1) \
+                    if textures else numpy.zeros((3, self.width * self.height))
+                return offsets.reshape(3, self.height, self.width)
+            offsets = [[0.0] * (self.width * self.height) for i in range(3)]
+            for weight, texture in zip(weights, textures):
+                if not weight:
+                    continue
+                for channel, plane in zip(offsets, texture.get_channels()):
+                    for i, value in enumerate(plane):
+                        channel[i] += weight * value
+            return [[channel[row * self.width:(row + 1) * self.width]
+                     for row in range(self.height)]
+                    for channel in offsets]
+
         # GlobalNode
 
         def get_global_child_nodes(self, edge_filter=EdgeFilter()):
             return (texture for texture in self.textures)
 
+    class Texture:
+        def get_channels(self):
+            """Return the red, green, and blue offsets of all pixels.
+
+            >>> texture = EgtFormat.Texture(argument=4)
+            >>> texture.r = [1, 2, 3, 4]
+            >>> texture.g = [-1, -2, -3, -4]
+            >>> [[int(x) for x in channel] for channel in texture.get_channels()]
+            [[1, 2, 3, 4], [-1, -2, -3, -4], [0, 0, 0, 0]]
+
+            :return: If numpy is available, an ``int8`` array of shape
+                ``(3, num_pixels)``; otherwise, a list of three
+                ``array.array`` planes.
+            """
+            if numpy is not None:
+                return numpy.array([self.r, self.g, self.b])
+            return [self.r, self.g, self.b]
+
 if __name__=='__main__':
     import doctest
     doctest.testmod()
@@ -320,7 +320,9 @@ end
 #
 # ***** END LICENSE BLOCK *****
 
+import hashlib
 from itertools import repeat, chain
+import io
 import logging
 import math # math.pi
 import os
@@ -340,12 +342,20 @@ from pyffi.utils.mathutils import * # XXX todo get rid of from XXX import *
 import pyffi.utils.mopp
 import pyffi.utils.tristrip
 import pyffi.utils.quickhull
+import pyffi.utils.bspline
+import pyffi.utils.dxt
+import pyffi.utils.transforms
+import pyffi.utils.weld
 # XXX convert the following to absolute imports
 from pyffi.object_models.editable import EditableBoolComboBox
 from pyffi.utils.graph import EdgeFilter
 from pyffi.object_models.xml.basic import BasicBase
 from pyffi.object_models.xml.struct_ import StructBase
+from pyffi.object_models.xml import tracking
 
+# if not None, Ref.get_hash adds the reference to this list instead of
+# hashing the block it refers to (see NiObject.get_digest)
+_digest_refs = None
 
 
 class NifFormat(FileFormat):
@@ -456,6 +466,9 @@ class NifFormat(FileFormat):
         _is_template = True
         _has_links = True
         _has_refs = True
+        # set by the block index of the tree (see tracking.watch)
+        _watcher = None
+
         def __init__(self, **kwargs):
             BasicBase.__init__(self, **kwargs)
             self._template = kwargs.get("template")
@@ -465,6 +478,9 @@ class NifFormat(FileFormat):
             return self._value
 
         def set_value(self, value):
+            # the tree may change, so signal this to the block index
+            if self._watcher is not None:
+                self._watcher.touch()
             if value is None:
                 self._value = None
             else:
@@ -478,6 +494,9 @@ class NifFormat(FileFormat):
             return 4
 
         def get_hash(self, data=None):
+            if _digest_refs is not None:
+                _digest_refs.append(self)
+                return None
             if self.get_value():
                 return self.get_value().get_hash(data)
             else:
@@ -485,6 +504,8 @@ class NifFormat(FileFormat):
 
         def read(self, stream, data):
             self.set_value(None) # fix_links will set this field
+            if data._raw_refs is not None:
+                data._raw_refs.append((stream.tell(), self))
             block_index, = struct.unpack(data._byte_order + 'i',
                                          stream.read(4))
             data._link_stack.append(block_index)
@@ -537,6 +558,8 @@ class NifFormat(FileFormat):
                 return []
 
         def get_refs(self, data=None):
+            if tracking.watching is not None:
+                self._watcher = tracking.watching
             val = self.get_value()
             if val is not None:
                 return [val]
@@ -840,6 +863,14 @@ class NifFormat(FileFormat):
 
     class string(SizedString):
         _has_strings = True
+        # set by the block index for block names
+        _watcher = None
+
+        def set_value(self, value):
+            # names may change, so signal this to the block index
+            if self._watcher is not None:
+                self._watcher.touch()
+            NifFormat.SizedString.set_value(self, value)
 
         def get_size(self, data=None):
             ver = data.version if data else -1
@@ -849,6 +880,7 @@ class NifFormat(FileFormat):
                 return 4 + len(self._value)
 
         def read(self, stream, data):
+            pos = stream.tell()
             n, = struct.unpack(data._byte_order + 'i', stream.read(4))
             if data.version >= 0x14010003:
                 if n == -1:
@@ -863,6 +895,8 @@ class NifFormat(FileFormat):
                     raise ValueError('string too long (0x%08X at 0x%08X)'
                                      % (n, stream.tell()))
                 self._value = stream.read(n)
+            if data._raw_strings is not None:
+                data._raw_strings.append((pos, self, self._value))
 
         def write(self, stream, data):
             if data.version >= 0x14010003:
@@ -985,6 +1019,237 @@ class NifFormat(FileFormat):
             size2 = len(self._value)
             return "< %ix%i Bytes >" % (size2, size1)
 
+    # bit of every block type, by name, and mask of every block type and
+    # its subclasses (see _init_block_type_masks)
+    _block_types = None
+    _block_type_bits = None
+    _subclass_masks = None
+    # mask of the block types which can occur in the tree below a block
+    # of every block type (see _init_reachable_masks)
+    _reachable_masks = None
+
+    @classmethod
+    def _init_block_type_masks(cls):
+        """Assign a bit to every block type, and calculate the mask of
+        every block type along with all of its subclasses."""
+        # customized block types are listed by their generated base
+        # class _Name, but callers use the public class Name
+        block_types = []
+        for block_type in cls.xml_struct:
+            if block_type.__name__.startswith("_"):
+                block_type = getattr(cls, block_type.__name__[1:])
+            if issubclass(block_type, cls.NiObject):
+                block_types.append(block_type)
+        block_type_bits = {}
+        subclass_masks = {}
+        for i, block_type in enumerate(block_types):
+            bit = 1 << i
+            block_type_bits[block_type.__name__] = bit
+            for base in block_type.__mro__:
+                if issubclass(base, cls.NiObject):
+                    subclass_masks[base] = subclass_masks.get(base, 0) | bit
+        cls._block_types = block_types
+        cls._subclass_masks = subclass_masks
+        cls._block_type_bits = block_type_bits
+
+    @classmethod
+    def get_block_type_bit(cls, block_type_name):
+        """Get the bit of a block type, as used in the masks returned
+        by L{get_subclass_mask} and L{Header.get_block_type_mask}.
+
+        :param block_type_name: The name of the block type, as stored in
+            the header.
+        :type block_type_name: ``str``
+        :return: The bit, or ``-1`` (all bits set) if the block type is
+            not known.
+        :rtype: ``int``
+        """
+        if cls._block_type_bits is None:
+            cls._init_block_type_masks()
+        # NiDataStreams are special
+        if block_type_name.startswith("NiDataStream\x01"):
+            block_type_name = "NiDataStream"
+        return cls._block_type_bits.get(block_type_name, -1)
+
+    @classmethod
+    def get_subclass_mask(cls, block_types):
+        """Get the mask of the given block types along with all their
+        subclasses.
+
+        >>> mask = NifFormat.get_subclass_mask(NifFormat.NiNode)
+        >>> bool(mask & NifFormat.get_block_type_bit("NiBillboardNode"))
+        True
+        >>> bool(mask & NifFormat.get_block_type_bit("NiTriShape"))
+        False
+        >>> mask = NifFormat.get_subclass_mask(NifFormat.NiTriBasedGeom)
+        >>> bool(mask & NifFormat.get_block_type_bit("NiTriStrips"))
+        True
+
+        :param block_types: A block type, or a tuple of block types.
+        :type block_types: ``type`` or ``tuple`` of ``type``
+        :return: The mask.
+        :rtype: ``int``
+        """
+        if cls._subclass_masks is None:
+            cls._init_block_type_masks()
+        if not isinstance(block_types, tuple):
+            return cls._subclass_masks.get(block_types, 0)
+        mask = 0
+        for block_type in block_types:
+            mask |= cls._subclass_masks.get(block_type, 0)
+        return mask
+
+    @classmethod
+    def _get_ref_types(cls, struct_type, template, visited):
+        """Yield the template types of all references (not pointers)
+        of a structure, including those of nested structures, as they
+        are followed by L{StructBase.get_refs}. Yields ``None`` if the
+        type cannot be determined."""
+        if (struct_type, template) in visited:
+            return
+        visited.add((struct_type, template))
+        for attr in struct_type._attribute_list:
+            if attr.type_ is type(None):
+                # template type: recurse only if it is known
+                attr_type = template
+                if attr_type is None:
+                    yield None
+                    continue
+            else:
+                attr_type = attr.type_
+            # same check as in get_refs
+            if not attr_type._has_links:
+                continue
+            attr_template = (attr.template if attr.template is not type(None)
+                             else template)
+            if issubclass(attr_type, cls.Ptr):
+                # pointers are not followed
+                continue
+            elif issubclass(attr_type, cls.Ref):
+                yield attr_template
+            elif issubclass(attr_type, StructBase):
+                for ref_type in cls._get_ref_types(
+                    attr_type, attr_template, visited):
+                    yield ref_type
+
+    @classmethod
+    def _init_reachable_masks(cls):
+        """Calculate, from the references of every block type as
+        described in the xml, which block types can occur in the tree
+        below a block of every block type."""
+        if cls._block_types is None:
+            cls._init_block_type_masks()
+        all_mask = cls._subclass_masks[cls.NiObject]
+        # block types referred to directly
+        masks = []
+        for block_type in cls._block_types:
+            mask = 0
+            for ref_type in cls._get_ref_types(block_type, None, set()):
+                if ref_type is None or ref_type not in cls._subclass_masks:
+                    mask = all_mask
+                    break
+                mask |= cls._subclass_masks[ref_type]
+            masks.append(mask)
+        # transitive closure
+        for k, block_type in enumerate(cls._block_types):
+            bit = 1 << k
+            mask_k = masks[k]
+            for i, mask_i in enumerate(masks):
+                if mask_i & bit:
+                    masks[i] = mask_i | mask_k
+        cls._reachable_masks = dict(
+            (block_type, (1 << i) | mask)
+            for i, (block_type, mask) in enumerate(
+                zip(cls._block_types, masks)))
+
+    @classmethod
+    def get_reachable_mask(cls, block_type):
+        """Get the mask of all block types (see L{get_subclass_mask})
+        which can occur in the tree below, and including, a block of
+        the given type. It is calculated once, from the types of the
+        references in the xml.
+
+        >>> mask = NifFormat.get_reachable_mask(NifFormat.NiNode)
+        >>> bool(mask & NifFormat.get_subclass_mask(NifFormat.NiTriShape))
+        True
+        >>> mask = NifFormat.get_reachable_mask(NifFormat.NiTriStripsData)
+        >>> bool(mask & NifFormat.get_subclass_mask(NifFormat.NiTriShape))
+        False
+
+        :param block_type: The block type.
+        :type block_type: ``type``
+        :return: The mask, or ``-1`` (all bits set) if the block type is
+            not known.
+        :rtype: ``int``
+        """
+        if cls._reachable_masks is None:
+            cls._init_reachable_masks()
+        return cls._reachable_masks.get(block_type, -1)
+
+    @staticmethod
+    def get_transforms(blocks, relative_to=None):
+        """Get the transforms of many blocks at once, as for instance
+        L{NiAVObject.get_transform}, for use with the batch functions
+        of L{pyffi.utils.transforms}.
+
+        :param blocks: Blocks with scale, rotation, and translation,
+            such as NiAVObject, NiSkinData, or SkinData blocks.
+        :param relative_to: If not ``None``, the blocks must be
+            NiAVObject blocks, and their transforms are calculated
+            relative to this block.
+        :return: The transforms, as a numpy array of shape ``(N, 4, 4)``
+            if numpy is available, otherwise as a list of tuples.
+        """
+        compose = (
+            pyffi.utils.transforms.compose_scale_rotation_translation)
+        mul44 = pyffi.utils.transforms.mul44
+        local = {}
+        def get_local(block):
+            try:
+                return local[block]
+            except KeyError:
+                mat = local[block] = compose(
+                    block.scale, block.rotation.as_tuple(),
+                    block.translation.as_tuple())
+                return mat
+        result = []
+        for block in blocks:
+            mat = get_local(block)
+            if relative_to:
+                chain = relative_to.find_chain(
+                    block, block_type=NifFormat.NiAVObject)
+                if not chain:
+                    raise ValueError(
+                        'cannot find a chain of NiAVObject blocks '
+                        'between %s and %s.' % (block.name, relative_to.name))
+                for parent in reversed(chain[1:-1]):
+                    mat = mul44(mat, get_local(parent))
+            result.append(mat)
+        if pyffi.utils.transforms.numpy is not None:
+            return pyffi.utils.transforms.numpy.array(
+                result, dtype=float).reshape(len(result), 4, 4)
+        return result
+
+    @staticmethod
+    def set_transforms(blocks, transforms):
+        """Set the transforms of many blocks at once, as for instance
+        L{NiAVObject.set_transform}.
+
+        :param blocks: Blocks with scale, rotation, and translation.
+        :param transforms: The transforms, as returned by
+            L{get_transforms} or the batch functions of
+            L{pyffi.utils.transforms}.
+        """
+        scales, rotations, translations = (
+            pyffi.utils.transforms.batch_decompose_scale_rotation_translation(
+                transforms))
+        for block, scale, rotation, translation in zip(
+            blocks, scales, rotations, translations):
+            block.scale = scale
+            block.rotation.set_rows(*rotation)
+            block.translation.x, block.translation.y, block.translation.z = (
+                translation)
+
     @classmethod
     def vercondFilter(cls, expression):
         if expression == "Version":
@@ -1063,6 +1328,21 @@ class NifFormat(FileFormat):
         :type header: L{NifFormat.Header}
         :ivar blocks: List of blocks.
         :type blocks: ``list`` of L{NifFormat.NiObject}
+        :ivar block_offsets: Offset and size of each block in L{blocks},
+            relative to the start of the nif, as found on the last
+            L{read} or L{write}.
+        :type block_offsets: ``list`` of ``(int, int)``
+        :ivar block_type_mask: Mask of all block types in the header (see
+            L{NifFormat.get_subclass_mask}), updated whenever the header is
+            read or written, or ``None`` if the header does not store
+            block types.
+        :type block_type_mask: ``int``
+        :ivar passthrough: Whether L{read} keeps the raw bytes of each
+            block, so L{write} can copy blocks which have not been
+            changed since verbatim, rather than writing them field by
+            field. Changes are tracked through attribute setters; see
+            L{discard_raw} for changes that bypass them.
+        :type passthrough: ``bool``
         :ivar modification: Neo Steam ("neosteam") or Ndoors ("ndoors") or Joymaster Interactive Howling Sword ("jmihs1") or Laxe Lore ("laxelore") style nif?
         :type modification: ``str``
         """
@@ -1072,6 +1352,21 @@ class NifFormat(FileFormat):
         _string_list = None
         _block_index_dct = None
 
+        block_type_mask = None
+        passthrough = False
+        _raw_blocks = None
+        _raw_context = None
+        _raw_refs = None
+        _raw_strings = None
+
+        _index_generation = None
+        _index_roots = None
+        _index_blocks = None
+        _index_ids = None
+        _index_types = None
+        _index_names = None
+        _index_parents = None
+
         class VersionUInt(pyffi.object_models.common.UInt):
             def set_value(self, value):
                 if value is None:
@@ -1110,6 +1405,10 @@ class NifFormat(FileFormat):
             self.roots = []
             # empty list of blocks
             self.blocks = []
+            self.block_offsets = []
+            # counts modifications of the references and names in the
+            # tree, so the block index knows when it is out of date
+            self._tree_watcher = tracking.RefWatcher()
             # not a neosteam or ndoors nif
             self.modification = None
 
@@ -1233,6 +1532,160 @@ class NifFormat(FileFormat):
                     root.replace_global_node(oldbranch, newbranch,
                                            edge_filter=edge_filter)
 
+        # block index
+
+        def invalidate_block_index(self):
+            """Force the block index to be rebuilt on next query. The index
+            is rebuilt automatically whenever a reference in the tree or
+            a block name is set, when an array of references is resized,
+            or when :attr:`roots` changes, so you only need to call this
+            after modifying the tree in some other way, for instance
+            after changing a block that is shared with another
+            :class:`Data` which indexed it later.
+            """
+            self._index_generation = None
+
+        def _update_block_index(self):
+            """Build the block index, if it is out of date."""
+            watcher = self._tree_watcher
+            if (self._index_generation == watcher.generation
+                and self._index_roots is not None
+                and len(self._index_roots) == len(self.roots)
+                and all(root is index_root for root, index_root
+                        in zip(self.roots, self._index_roots))):
+                # index is up to date
+                return
+            blocks = [] # all blocks, in tree order
+            names = {} # maps name to list of blocks
+            parents = {} # maps id of block to list of parent blocks
+            visited = set()
+            stack = [root for root in reversed(self.roots)
+                     if root is not None]
+            # references which are walked now touch the watcher when set
+            with tracking.watch(watcher):
+                while stack:
+                    block = stack.pop()
+                    if id(block) in visited:
+                        continue
+                    visited.add(id(block))
+                    blocks.append(block)
+                    name = getattr(block, "name", None)
+                    if isinstance(name, bytes):
+                        names.setdefault(name, []).append(block)
+                        block._name_value_._watcher = watcher
+                    children = block.get_refs()
+                    for child in children:
+                        parents.setdefault(id(child), []).append(block)
+                    stack.extend(reversed(children))
+            self._index_blocks = blocks
+            self._index_ids = visited
+            self._index_types = {}
+            self._index_names = names
+            self._index_parents = parents
+            self._index_roots = list(self.roots)
+            self._index_generation = watcher.generation
+
+        def blocks_of_type(self, block_type):
+            """Return all blocks in the tree which are an instance of the
+            given block type (so including subclasses). The result is
+            computed once per block type, and cached until the tree changes.
+
+            >>> from pyffi.formats.nif import NifFormat
+            >>> data = NifFormat.Data()
+            >>> root = NifFormat.NiNode()
+            >>> root.name = "Scene Root"
+            >>> geom = NifFormat.NiTriShape()
+            >>> geom.name = "Cube"
+            >>> root.add_child(geom)
+            >>> data.roots = [root]
+            >>> [block.name for block in data.blocks_of_type(NifFormat.NiAVObject)]
+            [b'Scene Root', b'Cube']
+            >>> [block.name for block in data.blocks_of_type(NifFormat.NiNode)]
+            [b'Scene Root']
+            >>> data.blocks_of_type(NifFormat.NiSkinInstance)
+            []
+            >>> geom.skin_instance = NifFormat.NiSkinInstance()
+            >>> [block.__class__.__name__
+            ...  for block in data.blocks_of_type(NifFormat.NiSkinInstance)]
+            ['NiSkinInstance']
+            >>> root.num_children = 0
+            >>> root.children.update_size()
+            >>> [block.name for block in data.blocks_of_type(NifFormat.NiAVObject)]
+            [b'Scene Root']
+
+            :param block_type: The block type, or a tuple of block types.
+            :type block_type: ``type`` or ``tuple`` of ``type``
+            :return: The blocks, in the order in which they are found when
+                walking the tree from the roots.
+            :rtype: ``list`` of L{NifFormat.NiObject}
+            """
+            self._update_block_index()
+            try:
+                blocks = self._index_types[block_type]
+            except KeyError:
+                blocks = [block for block in self._index_blocks
+                          if isinstance(block, block_type)]
+                self._index_types[block_type] = blocks
+            return blocks[:]
+
+        def find_by_name(self, block_name, block_type=None):
+            """Return all blocks in the tree with the given name.
+
+            >>> from pyffi.formats.nif import NifFormat
+            >>> data = NifFormat.Data()
+            >>> root = NifFormat.NiNode()
+            >>> root.name = "Scene Root"
+            >>> geom = NifFormat.NiTriShape()
+            >>> geom.name = "Cube"
+            >>> root.add_child(geom)
+            >>> data.roots = [root]
+            >>> data.find_by_name("Cube") == [geom]
+            True
+            >>> data.find_by_name("Cube", NifFormat.NiNode)
+            []
+            >>> geom.name = "Sphere"
+            >>> data.find_by_name("Cube")
+            []
+            >>> data.find_by_name(b"Sphere") == [geom]
+            True
+
+            :param block_name: The name.
+            :type block_name: ``str`` or ``bytes``
+            :param block_type: If not ``None``, only return blocks of this
+                type.
+            :type block_type: ``type`` or ``tuple`` of ``type``
+            :return: The blocks, in tree order.
+            :rtype: ``list`` of L{NifFormat.NiObject}
+            """
+            self._update_block_index()
+            blocks = self._index_names.get(
+                pyffi.object_models.common._as_bytes(block_name), [])
+            if block_type is None:
+                return blocks[:]
+            else:
+                return [block for block in blocks
+                        if isinstance(block, block_type)]
+
+        def get_parents(self, block):
+            """Return all blocks in the tree which have a reference to the
+            given block.
+
+            :param block: The block.
+            :type block: L{NifFormat.NiObject}
+            :return: The parents of the block.
+            :rtype: ``list`` of L{NifFormat.NiObject}
+            """
+            self._update_block_index()
+            return self._index_parents.get(id(block), [])[:]
+
+        def _is_indexed(self, block):
+            """Check whether the block is in the tree, and hence, covered
+            by the block index."""
+            self._update_block_index()
+            return id(block) in self._index_ids
+
+        # DetailNode
+
         def get_detail_child_nodes(self, edge_filter=EdgeFilter()):
             yield self._version_value_
             yield self._user_version_value_
@@ -1260,6 +1713,7 @@ class NifFormat(FileFormat):
             try:
                 self.inspect_version_only(stream)
                 self.header.read(stream, data=self)
+                self._update_block_type_mask()
             finally:
                 stream.seek(pos)
 
@@ -1270,11 +1724,13 @@ class NifFormat(FileFormat):
             :type stream: ``file``
             """
             logger = logging.getLogger("pyffi.nif.data")
+            start_pos = stream.tell()
             # read header
             logger.debug("Reading header at 0x%08X" % stream.tell())
             self.inspect_version_only(stream)
             logger.debug("Version 0x%08X" % self.version)
             self.header.read(stream, data=self)
+            self._update_block_type_mask()
 
             # list of root blocks
             # for versions < 3.3.0.13 this list is updated through the
@@ -1288,7 +1744,13 @@ class NifFormat(FileFormat):
             self._string_list = [s for s in self.header.strings]
             self._block_dct = {} # maps block index to actual block
             self.blocks = [] # records all blocks as read from file in order
+            self.block_offsets = [] # offset and size of each block
             block_num = 0 # the current block numner
+            # raw bytes of each block, and position of its refs and strings
+            self._raw_blocks = {} if self.passthrough else None
+            self._raw_context = self._get_raw_context()
+            self._raw_refs = None
+            self._raw_strings = None
 
             while True:
                 if self.version < 0x0303000D:
@@ -1350,23 +1812,32 @@ class NifFormat(FileFormat):
                             raise NifFormat.NifError(
                                 'duplicate block index (0x%08X at 0x%08X)'
                                 %(block_index, stream.tell()))
-                # create the block
-                try:
-                    block = getattr(NifFormat, block_type)()
-                except AttributeError:
-                    raise ValueError(
-                        "Unknown block type '%s'." % block_type)
-                logger.debug("Reading %s block at 0x%08X"
-                             % (block_type, stream.tell()))
-                # read the block
-                try:
-                    block.read(stream, self)
-                except:
-                    logger.exception("Reading %s failed" % block.__class__)
-                    #logger.error("link stack: %s" % self._link_stack)
-                    #logger.error("block that failed:")
-                    #logger.error("%s" % block)
-                    raise
+                # track changes to the block
+                tracker = tracking.ChangeTracker()
+                if self._raw_blocks is not None:
+                    self._raw_refs = []
+                    self._raw_strings = []
+                with tracking.track(tracker):
+                    # create the block
+                    try:
+                        block = getattr(NifFormat, block_type)()
+                    except AttributeError:
+                        raise ValueError(
+                            "Unknown block type '%s'." % block_type)
+                    tracker.owner = block
+                    logger.debug("Reading %s block at 0x%08X"
+                                 % (block_type, stream.tell()))
+                    block_pos = stream.tell()
+                    # read the block
+                    try:
+                        block.read(stream, self)
+                    except:
+                        logger.exception(
+                            "Reading %s failed" % block.__class__)
+                        #logger.error("link stack: %s" % self._link_stack)
+                        #logger.error("block that failed:")
+                        #logger.error("%s" % block)
+                        raise
                 # complete NiDataStream data
                 if block_type == "NiDataStream":
                     block.usage = data_stream_usage
@@ -1375,6 +1846,7 @@ class NifFormat(FileFormat):
                 self._block_dct[block_index] = block
                 self.blocks.append(block)
                 # check block size
+                block_complete = True
                 if self.version >= 0x14020007:
                     logger.debug("Checking block size")
                     calculated_size = block.get_size(data=self)
@@ -1387,6 +1859,22 @@ class NifFormat(FileFormat):
                                      % (extra_size, block.__class__.__name__))
                         # skip bytes that were missed
                         stream.seek(extra_size, 1)
+                        # these bytes cannot be accounted for
+                        block_complete = False
+                self.block_offsets.append(
+                    (block_pos - start_pos, stream.tell() - block_pos))
+                # keep raw bytes
+                if self._raw_blocks is not None and block_complete:
+                    end_pos = stream.tell()
+                    stream.seek(block_pos)
+                    self._raw_blocks[block] = (
+                        tracker, stream.read(end_pos - block_pos),
+                        [(pos - block_pos, ref)
+                         for pos, ref in self._raw_refs],
+                        [(pos - block_pos, string, value)
+                         for pos, string, value in self._raw_strings])
+                self._raw_refs = None
+                self._raw_strings = None
                 # add block to roots if flagged as such
                 if is_root:
                     self.roots.append(block)
@@ -1409,6 +1897,9 @@ class NifFormat(FileFormat):
             for block in self.blocks:
                 block.fix_links(self)
             ftr.fix_links(self)
+            # blocks are unchanged at this point
+            for block in self.blocks:
+                block._tracker.changed = False
             # the link stack should be empty now
             if self._link_stack:
                 raise NifFormat.NifError('not all links have been popped from the stack (bug?)')
@@ -1428,6 +1919,7 @@ class NifFormat(FileFormat):
             :type verbose: int
             """
             logger = logging.getLogger("pyffi.nif.data")
+            start_pos = stream.tell()
             # set up index and type dictionary
             self.blocks = [] # list of all blocks to be written
             self._block_index_dct = {} # maps block to block index
@@ -1438,9 +1930,16 @@ class NifFormat(FileFormat):
                 self._makeBlockList(root,
                                     self._block_index_dct,
                                     block_type_list, block_type_dct)
-                for block in root.tree():
+            # unchanged blocks are copied rather than written
+            raw_blocks = self._get_raw_blocks()
+            for block in self.blocks:
+                if block in raw_blocks:
                     self._string_list.extend(
-                        block.get_strings(self))
+                        string._value
+                        for pos, string, value in raw_blocks[block][2]
+                        if string._value)
+                else:
+                    self._string_list.extend(block.get_strings(self))
             self._string_list = list(set(self._string_list)) # ensure unique elements
             #print(self._string_list) # debug
 
@@ -1455,6 +1954,7 @@ class NifFormat(FileFormat):
             self.header.block_type_index.update_size()
             for i, block in enumerate(self.blocks):
                 self.header.block_type_index[i] = block_type_dct[block]
+            self._update_block_type_mask()
             self.header.num_strings = len(self._string_list)
             if self._string_list:
                 self.header.max_string_length = max([len(s) for s in self._string_list])
@@ -1465,7 +1965,10 @@ class NifFormat(FileFormat):
                 self.header.strings[i] = s
             self.header.block_size.update_size()
             for i, block in enumerate(self.blocks):
-                self.header.block_size[i] = block.get_size(data=self)
+                if block in raw_blocks:
+                    self.header.block_size[i] = len(raw_blocks[block][0])
+                else:
+                    self.header.block_size[i] = block.get_size(data=self)
             #if verbose >= 2:
             #    print(hdr)
 
@@ -1480,6 +1983,7 @@ class NifFormat(FileFormat):
             logger.debug("Writing header")
             #logger.debug("%s" % self.header)
             self.header.write(stream, self)
+            self.block_offsets = []
             for block in self.blocks:
                 # signal top level object if block is a root object
                 if self.version < 0x0303000D and block in self.roots:
@@ -1503,13 +2007,94 @@ class NifFormat(FileFormat):
                     stream.write(struct.pack(self._byte_order + 'i',
                                              self._block_index_dct[block]))
                 # write block
-                block.write(stream, self)
+                block_pos = stream.tell()
+                if block in raw_blocks:
+                    self._write_raw_block(stream, *raw_blocks[block])
+                else:
+                    block.write(stream, self)
+                self.block_offsets.append(
+                    (block_pos - start_pos, stream.tell() - block_pos))
             if self.version < 0x0303000D:
                 s = NifFormat.SizedString()
                 s.set_value("End Of File")
                 s.write(stream)
             ftr.write(stream, self)
 
+        def _update_block_type_mask(self):
+            """Update L{block_type_mask} from the header."""
+            try:
+                self.block_type_mask = self.header.get_block_type_mask()
+            except ValueError:
+                self.block_type_mask = None
+
+        def _get_raw_context(self):
+            """Everything besides the block itself that determines how
+            a block is stored."""
+            return (self.version, self.user_version, self.user_version2,
+                    self._byte_order, self.modification)
+
+        def _get_raw_blocks(self):
+            """Get the raw bytes, as kept by L{read}, of all blocks in
+            L{blocks} which have not changed since.
+
+            :return: Dictionary mapping blocks to their raw bytes, and
+                the position of their references and strings.
+            :rtype: ``dict``
+            """
+            if (not self._raw_blocks
+                or self._raw_context != self._get_raw_context()):
+                return {}
+            # before 20.1.0.3, strings are stored in the block itself
+            inline_strings = (self.version < 0x14010003)
+            raw_blocks = {}
+            for block in self.blocks:
+                try:
+                    tracker, raw, refs, strings = self._raw_blocks[block]
+                except KeyError:
+                    continue
+                if tracker.changed:
+                    continue
+                if inline_strings and any(string._value != value
+                                          for pos, string, value in strings):
+                    continue
+                raw_blocks[block] = (raw, refs, strings)
+            return raw_blocks
+
+        def _write_raw_block(self, stream, raw, refs, strings):
+            """Write the raw bytes of an unchanged block, with its
+            references, and its strings if these are stored in the
+            header, updated to the new block and string indices."""
+            if self.version < 0x14010003:
+                strings = []
+            if not(refs or strings):
+                stream.write(raw)
+                return
+            buf = io.BytesIO(raw)
+            for pos, ref in refs:
+                buf.seek(pos)
+                ref.write(buf, self)
+            for pos, string, value in strings:
+                buf.seek(pos)
+                string.write(buf, self)
+            stream.write(buf.getvalue())
+
+        def discard_raw(self, block=None):
+            """Forget the raw bytes of a block, or of all blocks, as
+            kept by L{read} if L{passthrough} is set, so the block is
+            written field by field. This is needed after changes which
+            do not go through attribute setters, such as modifying a
+            value in place, or calling C{set_value} directly.
+
+            :param block: The block, or ``None`` for all blocks.
+            :type block: L{NifFormat.NiObject}
+            """
+            if not self._raw_blocks:
+                return
+            if block is None:
+                self._raw_blocks = {}
+            else:
+                self._raw_blocks.pop(block, None)
+
         def _makeBlockList(
             self, root, block_index_dct, block_type_list, block_type_dct):
             """This is a helper function for write to set up the list of all blocks,
@@ -1542,7 +2127,7 @@ class NifFormat(FileFormat):
                         and not isinstance(block, NifFormat.bhkConstraint))
 
             # block already listed? if so, return
-            if root in self.blocks:
+            if root in block_index_dct:
                 return
             # add block type to block type dictionary
             block_type = root.__class__.__name__
@@ -1617,22 +2202,30 @@ class NifFormat(FileFormat):
                 block type, or a subclass of it. ``False`` otherwise.
             :rtype: ``bool``
             """
+            return bool(self.get_block_type_mask()
+                        & NifFormat.get_subclass_mask(block_type))
+
+        def get_block_type_mask(self):
+            """Get the mask of all block types in the header, to check
+            for the presence of many block types at once (see
+            L{NifFormat.get_subclass_mask}). Unknown block types set all
+            bits.
+
+            :raise ``ValueError``: If number of block types is zero
+                (only nif versions 10.0.1.0 and up store block types
+                in header).
+
+            :return: The mask.
+            :rtype: ``int``
+            """
             # check if we can check the block types at all
             if self.num_block_types == 0:
                 raise ValueError("header does not store any block types")
-            # quick first check, without hierarchy, using simple string comparisons
-            if block_type.__name__.encode() in self.block_types:
-                return True
-            # slower check, using isinstance
-            for data_block_type in self.block_types:
-                data_block_type = data_block_type.decode("ascii")
-                # NiDataStreams are special
-                if data_block_type.startswith("NiDataStream\x01"):
-                    data_block_type = "NiDataStream"
-                if issubclass(getattr(NifFormat, data_block_type), block_type):
-                    return True
-            # requested block type is not in nif
-            return False
+            mask = 0
+            for block_type in self.block_types:
+                mask |= NifFormat.get_block_type_bit(
+                    block_type.decode("ascii"))
+            return mask
 
     class Matrix33:
         def as_list(self):
@@ -1651,6 +2244,12 @@ class NifFormat(FileFormat):
                 (self.m_31, self.m_32, self.m_33)
                 )
 
+        def set_rows(self, row0, row1, row2):
+            """Set matrix from rows."""
+            self.m_11, self.m_12, self.m_13 = row0
+            self.m_21, self.m_22, self.m_23 = row1
+            self.m_31, self.m_32, self.m_33 = row2
+
         def __str__(self):
             return (
                 "[ %6.3f %6.3f %6.3f ]\n"
@@ -1835,7 +2434,10 @@ class NifFormat(FileFormat):
             """Get inverse (assuming is_scale_rotation is true!)."""
             # transpose inverts rotation but keeps the scale
             # dividing by scale^2 inverts the scale as well
-            return self.get_transpose() / (self.m_11**2 + self.m_12**2 + self.m_13**2)
+            mat = NifFormat.Matrix33()
+            mat.set_rows(
+                *pyffi.utils.transforms.inverse33_fast(self.as_tuple()))
+            return mat
 
         def __mul__(self, rhs):
             if isinstance(rhs, (float, int)):
@@ -1856,15 +2458,8 @@ class NifFormat(FileFormat):
                     "please use left multiplication (vector*matrix)")
             elif isinstance(rhs, NifFormat.Matrix33):
                 mat = NifFormat.Matrix33()
-                mat.m_11 = self.m_11 * rhs.m_11 + self.m_12 * rhs.m_21 + self.m_13 * rhs.m_31
-                mat.m_12 = self.m_11 * rhs.m_12 + self.m_12 * rhs.m_22 + self.m_13 * rhs.m_32
-                mat.m_13 = self.m_11 * rhs.m_13 + self.m_12 * rhs.m_23 + self.m_13 * rhs.m_33
-                mat.m_21 = self.m_21 * rhs.m_11 + self.m_22 * rhs.m_21 + self.m_23 * rhs.m_31
-                mat.m_22 = self.m_21 * rhs.m_12 + self.m_22 * rhs.m_22 + self.m_23 * rhs.m_32
-                mat.m_23 = self.m_21 * rhs.m_13 + self.m_22 * rhs.m_23 + self.m_23 * rhs.m_33
-                mat.m_31 = self.m_31 * rhs.m_11 + self.m_32 * rhs.m_21 + self.m_33 * rhs.m_31
-                mat.m_32 = self.m_31 * rhs.m_12 + self.m_32 * rhs.m_22 + self.m_33 * rhs.m_32
-                mat.m_33 = self.m_31 * rhs.m_13 + self.m_32 * rhs.m_23 + self.m_33 * rhs.m_33
+                mat.set_rows(*pyffi.utils.transforms.mul33(
+                    self.as_tuple(), rhs.as_tuple()))
                 return mat
             else:
                 raise TypeError(
@@ -2288,12 +2883,8 @@ class NifFormat(FileFormat):
         def apply_scale(self, scale):
             """Apply scale factor on data."""
             if abs(scale - 1.0) < NifFormat.EPSILON: return
-            for v in self.vertices:
-                v.x *= scale
-                v.y *= scale
-                v.z *= scale
-            for n in self.normals:
-                n.w *= scale
+            self.vertices.scale_items(scale, names=("x", "y", "z"))
+            self.normals.scale_items(scale, names=("w",))
 
         def get_mass_center_inertia(self, density = 1, solid = True):
             """Return mass, center, and inertia tensor."""
@@ -2304,6 +2895,39 @@ class NifFormat(FileFormat):
             return pyffi.utils.inertia.get_mass_center_inertia_polyhedron(
                 vertices, triangles, density = density, solid = solid)
 
+        def update_hull(self, vertices, precision = 0.0001):
+            """Set vertices and normals to the convex hull of the given
+            vertices. Distances below C{precision} are considered zero,
+            so coplanar faces share a single plane.
+
+            >>> from pyffi.formats.nif import NifFormat
+            >>> shape = NifFormat.bhkConvexVerticesShape()
+            >>> shape.update_hull([(x, y, z) for x in (0, 1) for y in (0, 1)
+            ...                    for z in (0, 1)] + [(0.5, 0.5, 0.5)])
+            >>> shape.num_vertices, shape.num_normals
+            (8, 6)
+            >>> [round(x, 6) + 0.0 for x in shape.normals[0].as_tuple()]
+            [-1.0, 0.0, 0.0, 0.0]
+            """
+            vertices, triangles = pyffi.utils.quickhull.qhull3d(
+                vertices, precision = precision)
+            planes = pyffi.utils.quickhull.get_planes(
+                vertices, triangles, precision = precision)
+            self.num_vertices = len(vertices)
+            self.vertices.update_size()
+            for vert, (x, y, z) in zip(self.vertices, sorted(vertices)):
+                vert.x = x
+                vert.y = y
+                vert.z = z
+                vert.w = 0.0
+            self.num_normals = len(planes)
+            self.normals.update_size()
+            for normal, (x, y, z, w) in zip(self.normals, sorted(planes)):
+                normal.x = x
+                normal.y = y
+                normal.z = z
+                normal.w = w
+
     class bhkLimitedHingeConstraint:
         def apply_scale(self, scale):
             """Scale data."""
@@ -2326,15 +2950,8 @@ class NifFormat(FileFormat):
             subshapes_mci = [ subshape.get_mass_center_inertia(density = density,
                                                             solid = solid)
                               for subshape in self.sub_shapes ]
-            total_mass = 0
-            total_center = (0, 0, 0)
-            total_inertia = ((0, 0, 0), (0, 0, 0), (0, 0, 0))
-            for mass, center, inertia in subshapes_mci:
-                total_mass += mass
-                total_center = vecAdd(total_center,
-                                      vecscalarMul(center, mass / total_mass))
-                total_inertia = matAdd(total_inertia, inertia)
-            return total_mass, total_center, total_inertia
+            return pyffi.utils.inertia.get_mass_center_inertia_compound(
+                subshapes_mci)
 
         def add_shape(self, shape, front = False):
             """Add shape to list."""
@@ -2833,15 +3450,8 @@ class NifFormat(FileFormat):
                                                                  density = density, solid = solid)
                         for sphere in self.spheres ),
                       ( sphere.center.as_tuple() for sphere in self.spheres ) ) ]
-            total_mass = 0
-            total_center = (0, 0, 0)
-            total_inertia = ((0, 0, 0), (0, 0, 0), (0, 0, 0))
-            for mass, center, inertia in subshapes_mci:
-                total_mass += mass
-                total_center = vecAdd(total_center,
-                                      vecscalarMul(center, mass / total_mass))
-                total_inertia = matAdd(total_inertia, inertia)
-            return total_mass, total_center, total_inertia
+            return pyffi.utils.inertia.get_mass_center_inertia_compound(
+                subshapes_mci)
 
     class bhkNiTriStripsShape:
         def get_interchangeable_packed_shape(self):
@@ -2899,16 +3509,9 @@ class NifFormat(FileFormat):
                         [ triangle for triangle in data.get_triangles() ],
                         density = density, solid = solid))
 
-            # now calculate mass, center, and inertia
-            total_mass = 0
-            total_center = (0, 0, 0)
-            total_inertia = ((0, 0, 0), (0, 0, 0), (0, 0, 0))
-            for mass, center, inertia in subshapes_mci:
-                total_mass += mass
-                total_center = vecAdd(total_center,
-                                      vecscalarMul(center, mass / total_mass))
-                total_inertia = matAdd(total_inertia, inertia)
-            return total_mass, total_center, total_inertia
+            # now combine mass, center, and inertia
+            return pyffi.utils.inertia.get_mass_center_inertia_compound(
+                subshapes_mci)
 
     class bhkPackedNiTriStripsShape:
         def get_mass_center_inertia(self, density = 1, solid = True):
@@ -3002,6 +3605,39 @@ class NifFormat(FileFormat):
                 yield (matid, tuple(float_to_int(value * vertexfactor)
                                     for value in vert.as_list()))
 
+        def get_vertex_unique_map(self, vertexprecision=3):
+            """Return a map and inverse map to identify unique vertices,
+            as :func:`pyffi.utils.unique_map` would return on
+            :meth:`get_vertex_hash_generator`, but processing all
+            vertices in bulk (see :mod:`pyffi.utils.weld`).
+
+            >>> shape = NifFormat.bhkPackedNiTriStripsShape()
+            >>> data = NifFormat.hkPackedNiTriStripsData()
+            >>> shape.data = data
+            >>> shape.num_sub_shapes = 2
+            >>> shape.sub_shapes.update_size()
+            >>> data.num_vertices = 3
+            >>> shape.sub_shapes[0].num_vertices = 2
+            >>> shape.sub_shapes[1].num_vertices = 1
+            >>> data.vertices.update_size()
+            >>> shape.get_vertex_unique_map()
+            ([0, 0, 1], [0, 2])
+
+            :param vertexprecision: Precision to be used for vertices.
+            :type vertexprecision: float
+            :return: A map from old to new vertex index, and its
+                inverse.
+            """
+            vertices = self.data.vertices
+            matids = [(i,) for i, sub_shape in enumerate(self.sub_shapes)
+                      for j in range(sub_shape.num_vertices)]
+            # zip in get_vertex_hash_generator stops at the shortest
+            num_vertices = min(len(matids), len(vertices))
+            return pyffi.utils.weld.unique_map_quantized(
+                [(matids[:num_vertices], None),
+                 ([(v.x, v.y, v.z) for v in vertices[:num_vertices]],
+                  10 ** vertexprecision)])
+
         def get_triangle_hash_generator(self):
             """Generator which produces a tuple of integers, or None
             in degenerate case, for each triangle to ease detection of
@@ -3295,10 +3931,7 @@ class NifFormat(FileFormat):
             """Apply scale factor on data."""
             if abs(scale - 1.0) < NifFormat.EPSILON:
                 return
-            for vert in self.vertices:
-                vert.x *= scale
-                vert.y *= scale
-                vert.z *= scale
+            self.vertices.scale_items(scale, names=("x", "y", "z"))
 
     class InertiaMatrix:
         def as_list(self):
@@ -3608,54 +4241,17 @@ class NifFormat(FileFormat):
 
         def get_inverse(self, fast=True):
             """Calculates inverse (fast assumes is_scale_rotation_translation is True)."""
-            def adjoint(m, ii, jj):
-                result = []
-                for i, row in enumerate(m):
-                    if i == ii: continue
-                    result.append([])
-                    for j, x in enumerate(row):
-                        if j == jj: continue
-                        result[-1].append(x)
-                return result
-            def determinant(m):
-                if len(m) == 2:
-                    return m[0][0]*m[1][1] - m[1][0]*m[0][1]
-                result = 0.0
-                for i in range(len(m)):
-                    det = determinant(adjoint(m, i, 0))
-                    if i & 1:
-                        result -= m[i][0] * det
-                    else:
-                        result += m[i][0] * det
-                return result
-
             if fast:
-                m = self.get_matrix_33().get_inverse()
-                t = -(self.get_translation() * m)
-
-                n = NifFormat.Matrix44()
-                n.m_14 = 0.0
-                n.m_24 = 0.0
-                n.m_34 = 0.0
-                n.m_44 = 1.0
-                n.set_matrix_33(m)
-                n.set_translation(t)
-                return n
+                rows = pyffi.utils.transforms.inverse44_fast(self.as_tuple())
             else:
-                m = self.as_list()
-                nn = [[0.0 for i in range(4)] for j in range(4)]
-                det = determinant(m)
-                if abs(det) < NifFormat.EPSILON:
+                try:
+                    rows = pyffi.utils.transforms.inverse44(
+                        self.as_tuple(), NifFormat.EPSILON)
+                except ZeroDivisionError:
                     raise ZeroDivisionError('cannot invert matrix:\n%s'%self)
-                for i in range(4):
-                    for j in range(4):
-                        if (i+j) & 1:
-                            nn[j][i] = -determinant(adjoint(m, i, j)) / det
-                        else:
-                            nn[j][i] = determinant(adjoint(m, i, j)) / det
-                n = NifFormat.Matrix44()
-                n.set_rows(*nn)
-                return n
+            n = NifFormat.Matrix44()
+            n.set_rows(*rows)
+            return n
 
         def __mul__(self, x):
             if isinstance(x, (float, int)):
@@ -3683,22 +4279,8 @@ class NifFormat(FileFormat):
                 raise TypeError("matrix*vector not supported; please use left multiplication (vector*matrix)")
             elif isinstance(x, NifFormat.Matrix44):
                 m = NifFormat.Matrix44()
-                m.m_11 = self.m_11 * x.m_11  +  self.m_12 * x.m_21  +  self.m_13 * x.m_31  +  self.m_14 * x.m_41
-                m.m_12 = self.m_11 * x.m_12  +  self.m_12 * x.m_22  +  self.m_13 * x.m_32  +  self.m_14 * x.m_42
-                m.m_13 = self.m_11 * x.m_13  +  self.m_12 * x.m_23  +  self.m_13 * x.m_33  +  self.m_14 * x.m_43
-                m.m_14 = self.m_11 * x.m_14  +  self.m_12 * x.m_24  +  self.m_13 * x.m_34  +  self.m_14 * x.m_44
-                m.m_21 = self.m_21 * x.m_11  +  self.m_22 * x.m_21  +  self.m_23 * x.m_31  +  self.m_24 * x.m_41
-                m.m_22 = self.m_21 * x.m_12  +  self.m_22 * x.m_22  +  self.m_23 * x.m_32  +  self.m_24 * x.m_42
-                m.m_23 = self.m_21 * x.m_13  +  self.m_22 * x.m_23  +  self.m_23 * x.m_33  +  self.m_24 * x.m_43
-                m.m_24 = self.m_21 * x.m_14  +  self.m_22 * x.m_24  +  self.m_23 * x.m_34  +  self.m_24 * x.m_44
-                m.m_31 = self.m_31 * x.m_11  +  self.m_32 * x.m_21  +  self.m_33 * x.m_31  +  self.m_34 * x.m_41
-                m.m_32 = self.m_31 * x.m_12  +  self.m_32 * x.m_22  +  self.m_33 * x.m_32  +  self.m_34 * x.m_42
-                m.m_33 = self.m_31 * x.m_13  +  self.m_32 * x.m_23  +  self.m_33 * x.m_33  +  self.m_34 * x.m_43
-                m.m_34 = self.m_31 * x.m_14  +  self.m_32 * x.m_24  +  self.m_33 * x.m_34  +  self.m_34 * x.m_44
-                m.m_41 = self.m_41 * x.m_11  +  self.m_42 * x.m_21  +  self.m_43 * x.m_31  +  self.m_44 * x.m_41
-                m.m_42 = self.m_41 * x.m_12  +  self.m_42 * x.m_22  +  self.m_43 * x.m_32  +  self.m_44 * x.m_42
-                m.m_43 = self.m_41 * x.m_13  +  self.m_42 * x.m_23  +  self.m_43 * x.m_33  +  self.m_44 * x.m_43
-                m.m_44 = self.m_41 * x.m_14  +  self.m_42 * x.m_24  +  self.m_43 * x.m_34  +  self.m_44 * x.m_44
+                m.set_rows(*pyffi.utils.transforms.mul44(
+                    self.as_tuple(), x.as_tuple()))
                 return m
             else:
                 raise TypeError("do not know how to multiply Matrix44 with %s"%x.__class__)
@@ -4046,10 +4628,10 @@ class NifFormat(FileFormat):
                     or controlpoints is self.short_control_points):
                 raise ValueError("internal error while appending data")
             # parse the data
-            for element in range(num_elements):
-                yield tuple(
-                    controlpoints[offset + element * element_size + index]
-                    for index in range(element_size))
+            values = controlpoints.get_values(
+                offset, offset + num_elements * element_size)
+            for index in range(0, len(values), element_size):
+                yield tuple(values[index:index + element_size])
 
         def _appendData(self, data, controlpoints):
             """Helper function for append_float_data and append_short_data. For internal
@@ -4073,9 +4655,8 @@ class NifFormat(FileFormat):
             # update size
             controlpoints.update_size()
             # store the data
-            for element, datum in enumerate(data):
-                for index, value in enumerate(datum):
-                    controlpoints[offset + element * element_size + index] = value
+            controlpoints.set_values(
+                [value for datum in data for value in datum], offset)
             # return the offset
             return offset
 
@@ -4102,8 +4683,14 @@ class NifFormat(FileFormat):
             :param multiplier: Value multiplier.
             :return: A list of C{num_elements} tuples of size C{element_size}.
             """
-            for key in self.get_short_data(offset, num_elements, element_size):
-                yield tuple(bias + x * multiplier / 32767.0 for x in key)
+            points = pyffi.utils.bspline.decode_comp(
+                self.short_control_points.get_values(
+                    offset, offset + num_elements * element_size),
+                element_size, bias, multiplier)
+            if pyffi.utils.bspline.numpy is not None:
+                points = points.tolist()
+            for point in points:
+                yield tuple(point)
 
         def append_short_data(self, data):
             """Append data.
@@ -4121,23 +4708,10 @@ class NifFormat(FileFormat):
                 integers. (Note: cannot be an interator; maybe this restriction
                 will be removed in a future version.)
             :return: The offset, bias, and multiplier."""
-            # get extremes
-            maxvalue = max(max(datum) for datum in data)
-            minvalue = min(min(datum) for datum in data)
-            # get bias and multiplier
-            bias = 0.5 * (maxvalue + minvalue)
-            if maxvalue > minvalue:
-                multiplier = 0.5 * (maxvalue - minvalue)
-            else:
-                # no need to compress in this case
-                multiplier = 1.0
-
-            # compress points into shorts
-            shortdata = []
-            for datum in data:
-                shortdata.append(tuple(int(32767 * (x - bias) / multiplier)
-                                       for x in datum))
-            return (self._appendData(shortdata, self.short_control_points),
+            shorts, bias, multiplier = pyffi.utils.bspline.encode_comp(data)
+            # element boundaries do not matter for storing, so append the
+            # values as a single element
+            return (self._appendData([shorts], self.short_control_points),
                     bias, multiplier)
 
         def get_float_data(self, offset, num_elements, element_size):
@@ -4172,6 +4746,19 @@ class NifFormat(FileFormat):
                 yield self.start_time + (i * (self.stop_time - self.start_time)
                                         / (self.basis_data.num_control_points - 1))
 
+        def sample_keys(self, keys, times):
+            """Evaluate the spline through the given keys at the given
+            times, all at once.
+
+            :param keys: The keys, as returned by for instance
+                C{get_translations}.
+            :param times: The times at which to sample.
+            :return: The sampled keys, one per time; an array if numpy
+                is available.
+            """
+            return pyffi.utils.bspline.evaluate(
+                list(keys), times, self.start_time, self.stop_time)
+
         def _getFloatKeys(self, offset, element_size):
             """Helper function to get iterator to various keys. Internal use only."""
             # are there keys?
@@ -4219,10 +4806,9 @@ class NifFormat(FileFormat):
                 offset = self.translation_offset
                 num_elements = self.basis_data.num_control_points
                 element_size = 3
-                controlpoints = self.spline_data.float_control_points
-                for element in range(num_elements):
-                    for index in range(element_size):
-                        controlpoints[offset + element * element_size + index] *= scale
+                self.spline_data.float_control_points.scale_items(
+                    scale, start=offset,
+                    stop=offset + num_elements * element_size)
 
     class NiControllerSequence:
         def add_controlled_block(self):
@@ -4330,10 +4916,7 @@ class NifFormat(FileFormat):
         def apply_scale(self, scale):
             """Apply scale factor on data."""
             if abs(scale - 1.0) < NifFormat.EPSILON: return
-            for v in self.vertices:
-                v.x *= scale
-                v.y *= scale
-                v.z *= scale
+            self.vertices.scale_items(scale, names=("x", "y", "z"))
             self.center.x *= scale
             self.center.y *= scale
             self.center.z *= scale
@@ -4394,6 +4977,63 @@ class NifFormat(FileFormat):
                                         vcols[i].b, vcols[i].a]])
                 yield tuple(h)
 
+        def get_vertex_unique_map(
+            self,
+            vertexprecision=3, normalprecision=3,
+            uvprecision=5, vcolprecision=3):
+            """Return a map and inverse map to identify unique vertices,
+            as :func:`pyffi.utils.unique_map` would return on
+            :meth:`get_vertex_hash_generator`, but processing all
+            vertices in bulk (see :mod:`pyffi.utils.weld`).
+
+            >>> from pyffi.formats.nif import NifFormat
+            >>> geomdata = NifFormat.NiGeometryData()
+            >>> geomdata.num_vertices = 3
+            >>> geomdata.has_vertices = True
+            >>> geomdata.vertices.update_size()
+            >>> geomdata.vertices[0].x = 1.0
+            >>> geomdata.vertices[2].x = 1.0001
+            >>> geomdata.get_vertex_unique_map()
+            ([0, 1, 0], [0, 1])
+
+            :param vertexprecision: Precision to be used for vertices.
+            :type vertexprecision: float
+            :param normalprecision: Precision to be used for normals.
+            :type normalprecision: float
+            :param uvprecision: Precision to be used for uvs.
+            :type uvprecision: float
+            :param vcolprecision: Precision to be used for vertex colors.
+            :type vcolprecision: float
+            :return: A map from old to new vertex index, and its
+                inverse.
+            """
+            num_vertices = self.num_vertices
+            columns = []
+            if self.has_vertices:
+                columns.append(
+                    ([(v.x, v.y, v.z)
+                      for v in self.vertices[:num_vertices]],
+                     10 ** vertexprecision))
+            if self.has_normals:
+                columns.append(
+                    ([(n.x, n.y, n.z)
+                      for n in self.normals[:num_vertices]],
+                     10 ** normalprecision))
+            for uvset in self.uv_sets:
+                columns.append(
+                    ([(uv.u, uv.v) for uv in uvset[:num_vertices]],
+                     10 ** uvprecision))
+            if self.has_vertex_colors:
+                columns.append(
+                    ([(c.r, c.g, c.b, c.a)
+                      for c in self.vertex_colors[:num_vertices]],
+                     10 ** vcolprecision))
+            if not columns:
+                # no data to compare: all vertices are identical
+                return pyffi.utils.unique_map(
+                    () for i in range(num_vertices))
+            return pyffi.utils.weld.unique_map_quantized(columns)
+
     class NiGeometry:
         """
         >>> from pyffi.formats.nif import NifFormat
@@ -4677,8 +5317,12 @@ class NifFormat(FileFormat):
             skindata.set_transform(geomtransform.get_inverse())
 
             # calculate bone offsets
-            for i, bone in enumerate(skininst.bones):
-                 skindata.bone_list[i].set_transform(geomtransform * bone.get_transform(skelroot).get_inverse())
+            bone_transforms = NifFormat.get_transforms(skininst.bones, skelroot)
+            NifFormat.set_transforms(
+                skindata.bone_list,
+                pyffi.utils.transforms.batch_mul(
+                    [geomtransform.as_tuple()] * len(bone_transforms),
+                    pyffi.utils.transforms.batch_inverse(bone_transforms)))
 
         def get_skin_partition(self):
             """Return the skin partition block."""
@@ -4710,17 +5354,10 @@ class NifFormat(FileFormat):
     class NiKeyframeData:
         def apply_scale(self, scale):
             """Apply scale factor on data."""
-            for key in self.translations.keys:
-                key.value.x *= scale
-                key.value.y *= scale
-                key.value.z *= scale
-                #key.forward.x *= scale
-                #key.forward.y *= scale
-                #key.forward.z *= scale
-                #key.backward.x *= scale
-                #key.backward.y *= scale
-                #key.backward.z *= scale
-                # what to do with TBC?
+            self.translations.keys.scale_items(
+                scale, names=("value.x", "value.y", "value.z"))
+            # XXX forward and backward tangents are not scaled
+            # XXX what to do with TBC?
 
     class NiMaterialColorController:
         def get_target_color(self):
@@ -4736,10 +5373,7 @@ class NifFormat(FileFormat):
         def apply_scale(self, scale):
             """Apply scale factor on data."""
             for morph in self.morphs:
-                for v in morph.vectors:
-                    v.x *= scale
-                    v.y *= scale
-                    v.z *= scale
+                morph.vectors.scale_items(scale, names=("x", "y", "z"))
 
     class NiNode:
         """
@@ -5375,13 +6009,18 @@ class NifFormat(FileFormat):
                 # calculate geometry transform
                 geomtransform = geom.get_transform(self)
                 # check skin data fields (also see NiGeometry.update_bind_position)
-                for i, bone in enumerate(skininst.bones):
-                    diff = ((skindata.bone_list[i].get_transform().get_inverse(fast=False)
-                             * geomtransform)
-                            - bone.get_transform(self))
+                offsets = pyffi.utils.transforms.batch_inverse(
+                    NifFormat.get_transforms(skindata.bone_list), fast=False)
+                expected = pyffi.utils.transforms.batch_mul(
+                    offsets, [geomtransform.as_tuple()] * len(offsets))
+                actual = NifFormat.get_transforms(skininst.bones, self)
+                for bone, expected_mat, actual_mat in zip(
+                    skininst.bones, expected, actual):
                     # calculate error (sup norm)
-                    diff_error = max(max(abs(elem) for elem in row)
-                                     for row in diff.as_list())
+                    diff_error = float(max(
+                        abs(elem1 - elem2)
+                        for row1, row2 in zip(expected_mat, actual_mat)
+                        for elem1, elem2 in zip(row1, row2)))
                     if diff_error > 1e-3:
                         logger.warning(
                             "Failed to set bind position of bone %s for geometry %s (error is %f)"
@@ -5540,7 +6179,31 @@ class NifFormat(FileFormat):
             self.add_extra_data(extra)
 
     class NiObject:
-        def find(self, block_name = None, block_type = None):
+        def find(self, block_name = None, block_type = None, data = None):
+            """Find a block in the tree starting from (and including) C{self}
+            which matches the given name and/or type.
+
+            :param block_name: The name the block should have.
+            :param block_type: The type the block should have.
+            :param data: If given, the block index of this nif data is used
+                to avoid walking the tree.
+            :type data: L{NifFormat.Data}
+            :return: The block, or ``None`` if not found."""
+            if (data is not None and (block_name or block_type)
+                and data._is_indexed(self)):
+                # look up candidates in the block index
+                if block_name:
+                    candidates = data.find_by_name(block_name, block_type)
+                else:
+                    candidates = data.blocks_of_type(block_type)
+                candidates = [block for block in candidates
+                              if self._is_ancestor_of(block, data)]
+                if not candidates:
+                    return None
+                elif len(candidates) == 1:
+                    return candidates[0]
+                # more than one match: let the recursive search below
+                # decide which one comes first
             # does this block match the search criteria?
             if block_name and block_type:
                 if isinstance(self, block_type):
@@ -5563,16 +6226,42 @@ class NifFormat(FileFormat):
 
             return None
 
-        def find_chain(self, block, block_type = None):
+        def find_chain(self, block, block_type = None, data = None):
             """Finds a chain of blocks going from C{self} to C{block}. If found,
             self is the first element and block is the last element. If no branch
             found, returns an empty list. Does not check whether there is more
             than one branch; if so, the first one found is returned.
 
             :param block: The block to find a chain to.
-            :param block_type: The type that blocks should have in this chain."""
+            :param block_type: The type that blocks should have in this chain.
+            :param data: If given, the parent links in the block index of
+                this nif data are followed up from C{block}, instead of
+                searching the whole tree down from C{self}.
+            :type data: L{NifFormat.Data}"""
 
             if self is block: return [self]
+            if data is not None and data._is_indexed(self):
+                # breadth first search going up the tree
+                # maps id of visited block to its child in the chain
+                chain_child = {id(block): None}
+                blocks = [block]
+                while blocks:
+                    next_blocks = []
+                    for child in blocks:
+                        if block_type and not isinstance(child, block_type):
+                            continue
+                        for parent in data.get_parents(child):
+                            if id(parent) in chain_child:
+                                continue
+                            chain_child[id(parent)] = child
+                            if parent is self:
+                                chain = [self]
+                                while chain[-1] is not block:
+                                    chain.append(chain_child[id(chain[-1])])
+                                return chain
+                            next_blocks.append(parent)
+                    blocks = next_blocks
+                return []
             for child in self.get_refs():
                 if block_type and not isinstance(child, block_type): continue
                 child_chain = child.find_chain(block, block_type)
@@ -5581,6 +6270,22 @@ class NifFormat(FileFormat):
 
             return []
 
+        def _is_ancestor_of(self, block, data):
+            """Check whether C{block} is in the tree starting from (and
+            including) C{self}, using the parent links from the block index
+            of C{data}."""
+            blocks = [block]
+            visited = set()
+            while blocks:
+                child = blocks.pop()
+                if child is self:
+                    return True
+                if id(child) in visited:
+                    continue
+                visited.add(id(child))
+                blocks.extend(data.get_parents(child))
+            return False
+
         def apply_scale(self, scale):
             """Scale data in this block. This implementation does nothing.
             Override this method if it contains geometry data that can be
@@ -5631,6 +6336,61 @@ class NifFormat(FileFormat):
                     raise ValueError('cyclic references detected')
                 children.append(child)
 
+        def get_digest(self, data=None):
+            """Get a digest of L{get_hash}: blocks which have the same
+            hash have the same digest. The digest of the block itself,
+            without the blocks it refers to, is cached until the block
+            changes, so this is much faster than L{get_hash} when it is
+            called repeatedly on the same tree.
+
+            >>> from pyffi.formats.nif import NifFormat
+            >>> node1 = NifFormat.NiNode()
+            >>> node2 = NifFormat.NiNode()
+            >>> child = NifFormat.NiNode()
+            >>> node1.add_child(child)
+            >>> node2.add_child(NifFormat.NiNode())
+            >>> node1.get_digest() == node2.get_digest()
+            True
+            >>> child.name = "child"
+            >>> node1.get_digest() == node2.get_digest()
+            False
+
+            :param data: The nif data, for the version.
+            :type data: L{NifFormat.Data}
+            :return: The digest.
+            :rtype: ``bytes``
+            """
+            global _digest_refs
+            tracker = self._tracker
+            if tracker is not None and tracker.owner is self:
+                key = ("digest",) + tracking.get_context(data)
+                entry = tracker.cache.get(key)
+            else:
+                key = None
+                entry = None
+            if entry is None:
+                # hash the block, collecting its references on the way
+                refs = []
+                _digest_refs, old_digest_refs = refs, _digest_refs
+                try:
+                    hsh = self.get_hash(data)
+                finally:
+                    _digest_refs = old_digest_refs
+                entry = (hashlib.sha1(repr(hsh).encode()).digest(), refs)
+                if key is not None:
+                    tracker.cache[key] = entry
+            block_digest, refs = entry
+            # combine with the digests of the blocks it refers to
+            digest = hashlib.sha1(block_digest)
+            for ref in refs:
+                block = ref.get_value()
+                if block is None:
+                    digest.update(b"\x00")
+                else:
+                    digest.update(b"\x01")
+                    digest.update(block.get_digest(data))
+            return digest.digest()
+
         def is_interchangeable(self, other):
             """Are the two blocks interchangeable?
 
@@ -5639,121 +6399,279 @@ class NifFormat(FileFormat):
             if isinstance(self, (NifFormat.NiProperty, NifFormat.NiSourceTexture)):
                 # use hash for properties and source textures
                 return ((self.__class__ is other.__class__)
-                        and (self.get_hash() == other.get_hash()))
+                        and (self.get_digest() == other.get_digest()))
             else:
                 # for blocks with references: quick check only
                 return self is other
 
     class ATextureRenderData:
+        # compression format of each compressed pixel format
+        _DXT_FORMATS = {
+            "PX_FMT_DXT1": "DXT1",
+            "PX_FMT_DXT5": "DXT5",
+            "PX_FMT_DXT5_ALT": "DXT5",
+            }
+
+        def _get_dxt_format(self):
+            """Return the compression format of the pixel data, or
+            ``None`` if it is not compressed.
+            """
+            for name, fmt in self._DXT_FORMATS.items():
+                if self.pixel_format == getattr(NifFormat.PixelFormat, name):
+                    return fmt
+            return None
+
+        class PixelBytes(BasicBase):
+            """Raw pixel data of a texture, for all of its faces. The number
+            of bytes is given by the argument. Implemented as basic type, so
+            the pixel data is read and written as a single buffer, rather than
+            as a byte object per pixel, and to prevent data being dumped by
+            __str__.
+
+            >>> pixels = NifFormat.ATextureRenderData.PixelBytes(argument=4)
+            >>> pixels.get_value()
+            b'\\x00\\x00\\x00\\x00'
+            >>> pixels.set_value(bytearray(b"abcd"))
+            >>> stream = io.BytesIO()
+            >>> pixels.write(stream, data=NifFormat.Data())
+            >>> stream.getvalue()
+            b'abcd'
+            >>> pixels.arg = 5
+            >>> pixels.write(stream, data=NifFormat.Data())
+            Traceback (most recent call last):
+                ...
+            ValueError: expected 5 bytes, but got 4
+            """
+            def __init__(self, argument=None, **kwargs):
+                BasicBase.__init__(self, argument=argument, **kwargs)
+                self.arg = argument if argument else 0
+                self.set_value(bytes(self.arg))
+
+            def get_value(self):
+                return self._value
+
+            def set_value(self, value):
+                self._value = bytes(value)
+
+            def get_size(self, data=None):
+                return len(self._value)
+
+            def get_hash(self, data=None):
+                return self._value
+
+            def read(self, stream, data):
+                buf = stream.read(self.arg)
+                if len(buf) != self.arg:
+                    raise ValueError(
+                        "expected %i bytes, but got %i" % (self.arg, len(buf)))
+                self._value = buf
+
+            def write(self, stream, data):
+                if len(self._value) != self.arg:
+                    raise ValueError(
+                        "expected %i bytes, but got %i"
+                        % (self.arg, len(self._value)))
+                stream.write(self._value)
+
+            def __str__(self):
+                return "< %i Bytes >" % len(self._value)
+
+        def __init_subclass__(cls):
+            # nif.xml describes the pixel data as a matrix of bytes; read
+            # and write it as a single buffer instead, by changing the
+            # attribute before the struct metaclass creates its property
+            for attr in cls.__dict__.get("_attrs", []):
+                if attr.name == "pixel_data":
+                    attr.type_ = cls.PixelBytes
+                    attr.arg = "_pixel_data_size"
+                    attr.arr1 = None
+                    attr.arr2 = None
+
+        @property
+        def _pixel_data_size(self):
+            """Number of bytes of the pixel data of all faces."""
+            return self.num_faces * self.num_pixels
+
         def save_as_dds(self, stream):
-            """Save image as DDS file."""
-            # set up header and pixel data
+            """Save image as DDS file. The header is written first,
+            followed by the pixel data of all mipmaps in a single write.
+
+            :param stream: The stream to write to.
+            :type stream: ``file``
+            """
             data = pyffi.formats.dds.DdsFormat.Data()
             header = data.header
-            pixeldata = data.pixeldata
+            fmt = self._get_dxt_format()
+            if fmt is None and self.pixel_format not in (
+                NifFormat.PixelFormat.PX_FMT_RGB8,
+                NifFormat.PixelFormat.PX_FMT_RGBA8):
+                raise ValueError(
+                    "cannot save pixel format %i as DDS" % self.pixel_format)
 
             # create header, depending on the format
-            if self.pixel_format in (NifFormat.PixelFormat.PX_FMT_RGB8,
-                                     NifFormat.PixelFormat.PX_FMT_RGBA8):
-                # uncompressed RGB(A)
-                header.flags.caps = 1
-                header.flags.height = 1
-                header.flags.width = 1
-                header.flags.pixel_format = 1
-                header.flags.mipmap_count = 1
+            header.flags.caps = 1
+            header.flags.height = 1
+            header.flags.width = 1
+            header.flags.pixel_format = 1
+            header.flags.mipmap_count = 1
+            header.height = self.mipmaps[0].height
+            header.width = self.mipmaps[0].width
+            header.mipmap_count = len(self.mipmaps)
+            header.caps_1.complex = 1
+            header.caps_1.texture = 1
+            header.caps_1.mipmap = 1
+            pixel_format = header.pixel_format
+            if fmt:
+                # format used in Megami Tensei: Imagine
+                pixel_format.flags.four_c_c = 1
+                pixel_format.four_c_c = getattr(
+                    pyffi.formats.dds.DdsFormat.FourCC, fmt)
+                pixel_format.bit_count = 0
+                pixel_format.r_mask = 0
+                pixel_format.g_mask = 0
+                pixel_format.b_mask = 0
+                pixel_format.a_mask = 0
+                sizes = [pyffi.utils.dxt.get_size(mipmap.width, mipmap.height,
+                                                  fmt)
+                         for mipmap in self.mipmaps]
                 header.flags.linear_size = 1
-                header.height = self.mipmaps[0].height
-                header.width = self.mipmaps[0].width
-                header.linear_size = len(self.pixel_data)
-                header.mipmap_count = len(self.mipmaps)
-                header.pixel_format.flags.rgb = 1
-                header.pixel_format.bit_count = self.bits_per_pixel
+                header.linear_size = sizes[0]
+            else:
+                # uncompressed RGB(A)
+                pixel_format.flags.rgb = 1
+                pixel_format.four_c_c = \
+                    pyffi.formats.dds.DdsFormat.FourCC.LINEAR
+                pixel_format.bit_count = self.bits_per_pixel
                 if not self.channels:
-                    header.pixel_format.r_mask = self.red_mask
-                    header.pixel_format.g_mask = self.green_mask
-                    header.pixel_format.b_mask = self.blue_mask
-                    header.pixel_format.a_mask = self.alpha_mask
+                    pixel_format.r_mask = self.red_mask
+                    pixel_format.g_mask = self.green_mask
+                    pixel_format.b_mask = self.blue_mask
+                    pixel_format.a_mask = self.alpha_mask
                 else:
                     bit_pos = 0
                     for i, channel in enumerate(self.channels):
                         mask = (2 ** channel.bits_per_channel - 1) << bit_pos
                         if channel.type == NifFormat.ChannelType.CHNL_RED:
-                            header.pixel_format.r_mask = mask
+                            pixel_format.r_mask = mask
                         elif channel.type == NifFormat.ChannelType.CHNL_GREEN:
-                            header.pixel_format.g_mask = mask
+                            pixel_format.g_mask = mask
                         elif channel.type == NifFormat.ChannelType.CHNL_BLUE:
-                            header.pixel_format.b_mask = mask
+                            pixel_format.b_mask = mask
                         elif channel.type == NifFormat.ChannelType.CHNL_ALPHA:
-                            header.pixel_format.a_mask = mask
+                            pixel_format.a_mask = mask
                         bit_pos += channel.bits_per_channel
-                header.caps_1.complex = 1
-                header.caps_1.texture = 1
-                header.caps_1.mipmap = 1
-                if self.pixel_data:
-                    # used in older nif versions
-                    pixeldata.set_value(self.pixel_data)
-                else:
-                    # used in newer nif versions
-                    pixeldata.set_value(''.join(self.pixel_data_matrix))
-            elif self.pixel_format == NifFormat.PixelFormat.PX_FMT_DXT1:
-                # format used in Megami Tensei: Imagine
-                header.flags.caps = 1
-                header.flags.height = 1
-                header.flags.width = 1
-                header.flags.pixel_format = 1
-                header.flags.mipmap_count = 1
-                header.flags.linear_size = 0
-                header.height = self.mipmaps[0].height
-                header.width = self.mipmaps[0].width
-                header.linear_size = 0
-                header.mipmap_count = len(self.mipmaps)
-                header.pixel_format.flags.fourcc = 1
-                header.pixel_format.fourcc = pyffi.formats.dds.DdsFormat.FourCC.DXT1
-                header.pixel_format.bit_count = 0
-                header.pixel_format.r_mask = 0
-                header.pixel_format.g_mask = 0
-                header.pixel_format.b_mask = 0
-                header.pixel_format.a_mask = 0
-                header.caps_1.complex = 1
-                header.caps_1.texture = 1
-                header.caps_1.mipmap = 1
-                if isinstance(self,
-                              NifFormat.NiPersistentSrcTextureRendererData):
-                    pixeldata.set_value(
-                        ''.join(
-                            ''.join([chr(x) for x in tex])
-                            for tex in self.pixel_data))
-                else:
-                    pixeldata.set_value(''.join(self.pixel_data_matrix))
-            elif self.pixel_format in (NifFormat.PixelFormat.PX_FMT_DXT5,
-                                       NifFormat.PixelFormat.PX_FMT_DXT5_ALT):
-                # format used in Megami Tensei: Imagine
-                header.flags.caps = 1
-                header.flags.height = 1
-                header.flags.width = 1
-                header.flags.pixel_format = 1
-                header.flags.mipmap_count = 1
-                header.flags.linear_size = 0
-                header.height = self.mipmaps[0].height
-                header.width = self.mipmaps[0].width
-                header.linear_size = 0
-                header.mipmap_count = len(self.mipmaps)
-                header.pixel_format.flags.fourcc = 1
-                header.pixel_format.fourcc = pyffi.formats.dds.DdsFormat.FourCC.DXT5
-                header.pixel_format.bit_count = 0
-                header.pixel_format.r_mask = 0
-                header.pixel_format.g_mask = 0
-                header.pixel_format.b_mask = 0
-                header.pixel_format.a_mask = 0
-                header.caps_1.complex = 1
-                header.caps_1.texture = 1
-                header.caps_1.mipmap = 1
-                pixeldata.set_value(''.join(self.pixel_data_matrix))
+                pixel_format.flags.alpha_pixels = int(bool(pixel_format.a_mask))
+                pixel_bytes = self.bits_per_pixel // 8
+                sizes = [mipmap.width * mipmap.height * pixel_bytes
+                         for mipmap in self.mipmaps]
+                header.flags.pitch = 1
+                header.linear_size = self.mipmaps[0].width * pixel_bytes
+
+            # the mipmaps are stored one after the other in the dds file,
+            # and usually also in the nif file
+            buf = memoryview(self.pixel_data)
+            pos = self.mipmaps[0].offset
+            if all(mipmap.offset == pos + sum(sizes[:i])
+                   for i, mipmap in enumerate(self.mipmaps)):
+                chunk = buf[pos:pos + sum(sizes)]
             else:
+                chunk = b"".join(buf[mipmap.offset:mipmap.offset + size]
+                                 for mipmap, size in zip(self.mipmaps, sizes))
+            if len(chunk) != sum(sizes):
                 raise ValueError(
-                    "cannot save pixel format %i as DDS" % self.pixel_format)
+                    "pixel data too short for %i mipmaps" % len(self.mipmaps))
+            header.write(stream, data=data)
+            stream.write(chunk)
+
+        def load_from_dds(self, stream):
+            """Load image from a DDS file. Compressed textures keep their
+            compression; uncompressed textures are converted to RGB or
+            RGBA with 8 bits per channel.
+
+            >>> block = NifFormat.NiPixelData()
+            >>> stream = open('tests/dds/test.dds', 'rb')
+            >>> block.load_from_dds(stream)
+            >>> [(mipmap.width, mipmap.height, mipmap.offset)
+            ...  for mipmap in block.mipmaps] # doctest: +NORMALIZE_WHITESPACE
+            [(60, 20, 0), (30, 10, 600), (15, 5, 792), (7, 2, 856),
+             (3, 1, 872), (1, 1, 880)]
+            >>> output = io.BytesIO()
+            >>> block.save_as_dds(output)
+            >>> _ = stream.seek(128)
+            >>> output.getvalue()[128:] == stream.read()
+            True
+            >>> stream.close()
 
-            data.write(stream)
+            :param stream: The stream to read from.
+            :type stream: ``file``
+            """
+            data = pyffi.formats.dds.DdsFormat.Data()
+            data.read(stream)
+            fmt = data.get_format()
+            header = data.header
+            num_levels = header.mipmap_count if header.flags.mipmap_count \
+                else 1
+            sizes = list(pyffi.utils.dxt.get_level_sizes(
+                header.width, header.height, max(1, num_levels)))
+            if fmt:
+                if fmt not in self._DXT_FORMATS.values():
+                    raise ValueError("cannot load %s pixel data" % fmt)
+                pixel_format = "PX_FMT_" + fmt
+                pixel_bytes = 0
+                level_sizes = [pyffi.utils.dxt.get_size(width, height, fmt)
+                               for width, height in sizes]
+                buf = data.pixeldata.get_value()[:sum(level_sizes)]
+                if len(buf) != sum(level_sizes):
+                    raise ValueError(
+                        "pixel data too short for %i mipmaps" % num_levels)
+                channels = [("CHNL_COMPRESSED", "CC_COMPRESSED", 0)]
+            else:
+                has_alpha = data._get_channel_offsets()[3] is not None
+                pixel_format = "PX_FMT_RGBA8" if has_alpha else "PX_FMT_RGB8"
+                pixel_bytes = 4 if has_alpha else 3
+                levels = data.get_mipmaps()
+                level_sizes = [pixel_bytes * width * height
+                               for width, height in sizes]
+                buf = bytearray(sum(level_sizes))
+                pos = 0
+                for (width, height, rgba), size in zip(levels, level_sizes):
+                    # rgba has rows from top to bottom, like the nif
+                    for channel in range(pixel_bytes):
+                        buf[pos + channel:pos + size:pixel_bytes] = \
+                            rgba[channel::4]
+                    pos += size
+                channels = [(name, "CC_FIXED", 8) for name in
+                            ("CHNL_RED", "CHNL_GREEN", "CHNL_BLUE",
+                             "CHNL_ALPHA")[:pixel_bytes]]
+
+            self.pixel_format = getattr(NifFormat.PixelFormat, pixel_format)
+            self.bits_per_pixel = 8 * pixel_bytes
+            self.bytes_per_pixel = pixel_bytes
+            masks = [0xff << (8 * i) if i < pixel_bytes else 0
+                     for i in range(4)]
+            self.red_mask, self.green_mask, self.blue_mask, self.alpha_mask \
+                = masks
+            for i, channel in enumerate(self.channels):
+                if i < len(channels):
+                    type_, convention, bits = channels[i]
+                else:
+                    type_, convention, bits = "CHNL_EMPTY", "CC_EMPTY", 0
+                channel.type = getattr(NifFormat.ChannelType, type_)
+                channel.convention = getattr(
+                    NifFormat.ChannelConvention, convention)
+                channel.bits_per_channel = bits
+            self.num_mipmaps = len(sizes)
+            self.mipmaps.update_size()
+            pos = 0
+            for mipmap, (width, height), size in zip(
+                self.mipmaps, sizes, level_sizes):
+                mipmap.width = width
+                mipmap.height = height
+                mipmap.offset = pos
+                pos += size
+            self.num_pixels = len(buf)
+            self.num_faces = 1
+            self.pixel_data = buf
 
     class NiSkinData:
         def get_transform(self):
@@ -5835,14 +6753,12 @@ class NifFormat(FileFormat):
             self.translation.y *= scale
             self.translation.z *= scale
 
-            for skindata in self.bone_list:
-                skindata.translation.x *= scale
-                skindata.translation.y *= scale
-                skindata.translation.z *= scale
-                skindata.bounding_sphere_offset.x *= scale
-                skindata.bounding_sphere_offset.y *= scale
-                skindata.bounding_sphere_offset.z *= scale
-                skindata.bounding_sphere_radius *= scale
+            self.bone_list.scale_items(
+                scale, names=("translation.x", "translation.y",
+                              "translation.z", "bounding_sphere_offset.x",
+                              "bounding_sphere_offset.y",
+                              "bounding_sphere_offset.z",
+                              "bounding_sphere_radius"))
 
     class NiTransformInterpolator:
         def apply_scale(self, scale):
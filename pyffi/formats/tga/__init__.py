@@ -43,6 +43,30 @@ Create a TGA file from scratch and write to file
 >>> stream = TemporaryFile()
 >>> data.write(stream)
 >>> stream.close()
+
+Access the pixels in bulk
+^^^^^^^^^^^^^^^^^^^^^^^^^
+
+>>> data = TgaFormat.Data()
+>>> data.header.image_type = TgaFormat.ImageType.RLE_RGB
+>>> data.set_pixels([[(0, 0, 255)] * 3,
+...                  [(0, 255, 0), (0, 255, 0), (255, 0, 0)]])
+>>> data.header.width, data.header.height, data.header.pixel_size
+(3, 2, 24)
+>>> from io import BytesIO
+>>> stream = BytesIO()
+>>> data.write(stream)
+>>> stream.getvalue()[18:] # bottom row first
+b'\\x81\\x00\\xff\\x00\\x00\\xff\\x00\\x00\\x82\\x00\\x00\\xff'
+>>> data = TgaFormat.Data()
+>>> _ = stream.seek(0)
+>>> data.read(stream)
+>>> [[tuple(int(value) for value in pixel) for pixel in row]
+...  for row in data.get_pixels()]
+[[(0, 0, 255), (0, 0, 255), (0, 0, 255)], [(0, 255, 0), (0, 255, 0), (255, 0, 0)]]
+>>> # packets are only created on access
+>>> [packet.header.count for packet in data.image.children]
+[1, 0, 2]
 """
 
 # ***** BEGIN LICENSE BLOCK *****
@@ -84,6 +108,11 @@ Create a TGA file from scratch and write to file
 
 import struct, os, re
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 import pyffi.object_models.xml
 import pyffi.object_models.common
 import pyffi.object_models.xml.basic
@@ -92,6 +121,173 @@ import pyffi.object_models
 import pyffi.utils.graph
 from pyffi.utils.graph import EdgeFilter
 
+def _decode_rle(buf, num_pixels, pixel_bytes):
+    """Decode RLE packets from the start of a buffer, until they cover
+    the given number of pixels. The packet headers must be parsed in
+    sequence, but each packet is expanded with a single slice.
+
+    >>> _decode_rle(b"\\x81\\x05\\x01\\x06\\x07\\xff", 4, 1)
+    (b'\\x05\\x05\\x06\\x07', 5)
+
+    :param buf: The buffer.
+    :type buf: ``bytes``
+    :param num_pixels: The number of pixels.
+    :type num_pixels: ``int``
+    :param pixel_bytes: The number of bytes per pixel.
+    :type pixel_bytes: ``int``
+    :return: The pixel data, and the number of bytes that the packets
+        occupy.
+    """
+    chunks = []
+    append = chunks.append
+    pos = 0
+    count = 0
+    try:
+        while count < num_pixels:
+            header = buf[pos]
+            if header & 128:
+                num = header - 127
+                end = pos + 1 + pixel_bytes
+                append(buf[pos + 1:end] * num)
+            else:
+                num = header + 1
+                end = pos + 1 + num * pixel_bytes
+                append(buf[pos + 1:end])
+            pos = end
+            count += num
+    except IndexError:
+        raise ValueError("unexpected end of RLE image data")
+    size = num_pixels * pixel_bytes
+    pixel_data = b"".join(chunks)
+    if pos > len(buf) or len(pixel_data) < size:
+        raise ValueError("unexpected end of RLE image data")
+    return pixel_data[:size], pos
+
+def _get_packets(pixel_data, width, pixel_bytes):
+    """Return the RLE packets for the given pixel data, as lists of
+    start pixel, number of pixels, and whether the packet is compressed.
+    """
+    num_pixels = len(pixel_data) // pixel_bytes
+    starts = []
+    nums = []
+    is_compressed = []
+    def add_raw(start, stop):
+        while start < stop:
+            end = min(stop, start + 128, (start // width + 1) * width)
+            starts.append(start)
+            nums.append(end - start)
+            is_compressed.append(False)
+            start = end
+    pos = 0
+    start = 0
+    while start < num_pixels:
+        # find the run of identical pixels within the row
+        pixel = pixel_data[start * pixel_bytes:(start + 1) * pixel_bytes]
+        stop = start + 1
+        row_end = (start // width + 1) * width
+        while (stop < row_end and pixel == pixel_data[
+                stop * pixel_bytes:(stop + 1) * pixel_bytes]):
+            stop += 1
+        if stop - start >= 2:
+            add_raw(pos, start)
+            while stop - start >= 2:
+                num = min(stop - start, 128)
+                starts.append(start)
+                nums.append(num)
+                is_compressed.append(True)
+                start += num
+            # a single remaining pixel goes into the next raw packet
+            pos = start
+        start = stop
+    add_raw(pos, num_pixels)
+    return starts, nums, is_compressed
+
+def _encode_rle_numpy(pixel_data, width, pixel_bytes):
+    """Implementation of :func:`_encode_rle` using numpy."""
+    pixels = numpy.frombuffer(pixel_data, dtype=numpy.uint8).reshape(
+        -1, pixel_bytes)
+    # find all runs of identical pixels within each row
+    is_start = numpy.ones(len(pixels), dtype=bool)
+    numpy.any(pixels[1:] != pixels[:-1], axis=1, out=is_start[1:])
+    is_start[::width] = True
+    starts = numpy.flatnonzero(is_start)
+    lengths = numpy.diff(numpy.append(starts, len(pixels)))
+    # cut runs into pieces of at most 128 pixels
+    num_pieces = (lengths + 127) // 128
+    run = numpy.repeat(numpy.arange(len(starts)), num_pieces)
+    offset = 128 * (numpy.arange(len(run))
+                    - numpy.repeat(numpy.cumsum(num_pieces) - num_pieces,
+                                   num_pieces))
+    starts = starts[run] + offset
+    lengths = numpy.minimum(lengths[run] - offset, 128)
+    # pieces of two or more pixels become compressed packets, all single
+    # pixels are grouped into raw packets, which never cross rows and
+    # have at most 128 pixels
+    is_compressed = lengths >= 2
+    is_single = ~is_compressed
+    is_group_start = is_single & (starts % width == 0)
+    is_group_start[0] |= is_single[0]
+    is_group_start[1:] |= is_single[1:] & is_compressed[:-1]
+    singles = numpy.flatnonzero(is_single)
+    index = numpy.arange(len(singles))
+    group_start = numpy.maximum.accumulate(
+        numpy.where(is_group_start[singles], index, 0))
+    is_raw_start = ((index - group_start) % 128) == 0
+    raw_starts = numpy.flatnonzero(is_raw_start)
+    raw_nums = numpy.diff(numpy.append(raw_starts, len(singles)))
+    # every piece contributes exactly one pixel, preceded by a header
+    # if it starts a packet
+    headers = numpy.where(is_compressed, 127 + lengths, 0)
+    headers[singles[raw_starts]] = raw_nums - 1
+    has_header = is_compressed.copy()
+    has_header[singles[raw_starts]] = True
+    pos = numpy.arange(len(starts)) * pixel_bytes + numpy.cumsum(has_header)
+    result = numpy.empty(len(starts) * pixel_bytes + numpy.count_nonzero(
+        has_header), dtype=numpy.uint8)
+    result[pos[has_header] - 1] = headers[has_header]
+    result[pos[:, numpy.newaxis] + numpy.arange(pixel_bytes)] = pixels[starts]
+    return result.tobytes()
+
+def _encode_rle(pixel_data, width, pixel_bytes, use_numpy=True):
+    """Encode pixel data as RLE packets. Runs of two or more identical
+    pixels become compressed packets, all other pixels are stored in raw
+    packets. Packets never cross rows.
+
+    >>> _encode_rle(b"\\x05\\x05\\x05\\x06\\x07\\x07", 3, 1)
+    b'\\x82\\x05\\x00\\x06\\x81\\x07'
+    >>> _encode_rle(b"\\x05\\x05\\x05\\x06\\x07\\x07", 3, 1, use_numpy=False)
+    b'\\x82\\x05\\x00\\x06\\x81\\x07'
+    >>> _encode_rle(bytes(129) + b"\\x01\\x02", 131, 1)
+    b'\\xff\\x00\\x02\\x00\\x01\\x02'
+
+    :param pixel_data: The pixel data.
+    :type pixel_data: ``bytes``
+    :param width: The number of pixels per row.
+    :type width: ``int``
+    :param pixel_bytes: The number of bytes per pixel.
+    :type pixel_bytes: ``int``
+    :param use_numpy: Whether to use numpy, if it is available.
+    :type use_numpy: ``bool``
+    :return: The packets.
+    :rtype: ``bytes``
+    """
+    if not pixel_data:
+        return b""
+    if use_numpy and numpy is not None:
+        return _encode_rle_numpy(pixel_data, width, pixel_bytes)
+    chunks = []
+    for start, num, is_compressed in zip(
+        *_get_packets(pixel_data, width, pixel_bytes)):
+        if is_compressed:
+            chunks.append(bytes((127 + num,)))
+            chunks.append(
+                pixel_data[start * pixel_bytes:(start + 1) * pixel_bytes])
+        else:
+            chunks.append(bytes((num - 1,)))
+            chunks.append(
+                pixel_data[start * pixel_bytes:(start + num) * pixel_bytes])
+    return b"".join(chunks)
+
 class TgaFormat(pyffi.object_models.xml.FileFormat):
     """This class implements the TGA format."""
     xml_file_name = 'tga.xml'
@@ -170,36 +366,157 @@ class TgaFormat(pyffi.object_models.xml.FileFormat):
             return self.__str__()
 
     class Image(pyffi.utils.graph.GlobalNode):
+        """The image data. The pixels are kept in a single buffer, in the
+        order in which they are stored in the file. RLE compressed images
+        are decoded when read, and encoded when written; the packets that
+        were read are written again as long as the pixels do not change.
+
+        The children, either individual pixels or RLE packets, are only
+        created when they are accessed. Once created, they are written
+        instead of the buffer, so they can be modified.
+        """
         def __init__(self):
-            # children are either individual pixels, or RLE packets
-            self.children = []
+            self._pixel_data = b""
+            self._pixel_size = 0
+            self._width = 0
+            self._is_rle = False
+            # RLE packets as read from the file, while still valid
+            self._rle_data = None
+            # pixel or packet structures, created on first access
+            self._children = None
+
+        @property
+        def children(self):
+            if self._children is None:
+                self._children = self._get_children()
+            return self._children
+
+        @children.setter
+        def children(self, children):
+            self._children = children
+
+        def _get_children(self):
+            """Create pixel or packet structures from the buffer."""
+            pixel_bytes = self._pixel_size // 8
+            if not pixel_bytes:
+                return []
+            children = []
+            if not self._is_rle:
+                for pos in range(0, len(self._pixel_data), pixel_bytes):
+                    pixel = TgaFormat.Pixel(argument=self._pixel_size)
+                    pixel.data.set_values(
+                        self._pixel_data[pos:pos + pixel_bytes])
+                    children.append(pixel)
+                return children
+            if self._rle_data is None:
+                self._rle_data = _encode_rle(
+                    self._pixel_data, self._width, pixel_bytes)
+            buf = self._rle_data
+            pos = 0
+            while pos < len(buf):
+                packet = TgaFormat.RLEPixels(argument=self._pixel_size)
+                packet.header.count = buf[pos] & 127
+                packet.header.is_compressed = buf[pos] >> 7
+                pos += 1
+                if packet.header.is_compressed:
+                    packet.compressed_pixels.data.set_values(
+                        buf[pos:pos + pixel_bytes])
+                    pos += pixel_bytes
+                else:
+                    packet.uncompressed_pixels.update_size()
+                    for pixel in packet.uncompressed_pixels:
+                        pixel.data.set_values(buf[pos:pos + pixel_bytes])
+                        pos += pixel_bytes
+                children.append(packet)
+            return children
+
+        def get_pixel_data(self):
+            """Get the pixel data, uncompressed, in the order in which
+            the pixels are stored in the file.
+
+            :return: The pixel data.
+            :rtype: ``bytes``
+            """
+            if self._children is None:
+                return self._pixel_data
+            # the children may have been modified
+            if not self._is_rle:
+                return bytes(value for pixel in self._children
+                             for value in pixel.data.get_values())
+            chunks = []
+            for packet in self._children:
+                if packet.header.is_compressed:
+                    chunks.append(
+                        bytes(packet.compressed_pixels.data.get_values())
+                        * (packet.header.count + 1))
+                else:
+                    chunks.extend(bytes(pixel.data.get_values())
+                                  for pixel in packet.uncompressed_pixels)
+            return b"".join(chunks)[:len(self._pixel_data)]
+
+        def set_pixel_data(self, pixel_data, header):
+            """Set the pixel data.
+
+            :param pixel_data: The pixel data, uncompressed, in the order
+                in which the pixels are stored in the file.
+            :type pixel_data: ``bytes``
+            :param header: The header which describes the pixel data.
+            :type header: L{TgaFormat.Header}
+            """
+            pixel_data = bytes(pixel_data)
+            size = header.width * header.height * (header.pixel_size // 8)
+            if len(pixel_data) != size:
+                raise ValueError(
+                    "expected %i bytes of pixel data, but got %i"
+                    % (size, len(pixel_data)))
+            self._pixel_data = pixel_data
+            self._pixel_size = header.pixel_size
+            self._width = header.width
+            self._is_rle = header.image_type not in (
+                TgaFormat.ImageType.INDEXED,
+                TgaFormat.ImageType.RGB,
+                TgaFormat.ImageType.GREY)
+            self._rle_data = None
+            self._children = None
 
         def read(self, stream, data):
-            data = data
-            if data.header.image_type in (TgaFormat.ImageType.INDEXED,
-                                          TgaFormat.ImageType.RGB,
-                                          TgaFormat.ImageType.GREY):
-                self.children = [
-                    TgaFormat.Pixel(argument=data.header.pixel_size)
-                    for i in range(data.header.width
-                                    * data.header.height)]
-                for pixel in self.children:
-                    pixel.read(stream, data)
+            header = data.header
+            pixel_bytes = header.pixel_size // 8
+            num_pixels = header.width * header.height
+            if header.image_type in (TgaFormat.ImageType.INDEXED,
+                                     TgaFormat.ImageType.RGB,
+                                     TgaFormat.ImageType.GREY):
+                pixel_data = stream.read(num_pixels * pixel_bytes)
+                self.set_pixel_data(pixel_data, header)
             else:
-                self.children = []
-                count = 0
-                while count < data.header.width * data.header.height:
-                    pixel = TgaFormat.RLEPixels(
-                        argument=data.header.pixel_size)
-                    pixel.read(stream, data)
-                    self.children.append(pixel)
-                    count += pixel.header.count + 1
+                # read everything, and go back to the end of the packets
+                pos = stream.tell()
+                buf = stream.read()
+                pixel_data, size = _decode_rle(buf, num_pixels, pixel_bytes)
+                stream.seek(pos + size)
+                self.set_pixel_data(pixel_data, header)
+                self._rle_data = buf[:size]
 
         def write(self, stream, data):
-            data = data
-            for child in self.children:
-                child.arg = data.header.pixel_size
-                child.write(stream, data)
+            header = data.header
+            if self._children is not None:
+                for child in self._children:
+                    child.arg = header.pixel_size
+                    child.write(stream, data)
+            elif header.image_type in (TgaFormat.ImageType.INDEXED,
+                                       TgaFormat.ImageType.RGB,
+                                       TgaFormat.ImageType.GREY):
+                stream.write(self._pixel_data)
+            else:
+                if (self._rle_data is None
+                    or self._width != header.width
+                    or self._pixel_size != header.pixel_size):
+                    self._rle_data = _encode_rle(
+                        self._pixel_data, header.width,
+                        header.pixel_size // 8)
+                    self._width = header.width
+                    self._pixel_size = header.pixel_size
+                stream.write(self._rle_data)
 
         def get_detail_child_nodes(self, edge_filter=EdgeFilter()):
             for child in self.children:
@@ -288,6 +605,76 @@ class TgaFormat(pyffi.object_models.xml.FileFormat):
             if self.footer:
                 self.footer.write(stream, self)
 
+        def get_pixels(self):
+            """Get the pixels, as rows from top to bottom, each row from
+            left to right, regardless of the origin of the image. The
+            channels of each pixel are in the order in which they are
+            stored in the file, that is, BGR or BGRA for color images.
+
+            :return: If numpy is available, an array of shape
+                (height, width, channels), otherwise a list of rows of
+                pixel tuples.
+            """
+            header = self.header
+            pixel_bytes = header.pixel_size // 8
+            pixel_data = self.image.get_pixel_data()
+            if numpy is not None:
+                pixels = numpy.frombuffer(
+                    pixel_data, dtype=numpy.uint8).reshape(
+                        header.height, header.width, pixel_bytes)
+                if not header.flags.origin_upper:
+                    pixels = pixels[::-1]
+                if header.flags.origin_right:
+                    pixels = pixels[:, ::-1]
+                return pixels.copy()
+            row_bytes = header.width * pixel_bytes
+            pixels = [[tuple(pixel_data[pos:pos + pixel_bytes])
+                       for pos in range(start, start + row_bytes, pixel_bytes)]
+                      for start in range(0, len(pixel_data), row_bytes)]
+            if not header.flags.origin_upper:
+                pixels.reverse()
+            if header.flags.origin_right:
+                for row in pixels:
+                    row.reverse()
+            return pixels
+
+        def set_pixels(self, pixels):
+            """Set the pixels, and update width, height, and pixel size
+            in the header. The image type and origin are kept.
+
+            :param pixels: The pixels, as rows from top to bottom, each
+                row from left to right, in the same format as returned
+                by :meth:`get_pixels`. A two dimensional numpy array is
+                taken as a grey image.
+            """
+            header = self.header
+            if numpy is not None and isinstance(pixels, numpy.ndarray):
+                if pixels.ndim == 2:
+                    pixels = pixels[:, :, numpy.newaxis]
+                height, width, pixel_bytes = pixels.shape
+                if not header.flags.origin_upper:
+                    pixels = pixels[::-1]
+                if header.flags.origin_right:
+                    pixels = pixels[:, ::-1]
+                pixel_data = numpy.ascontiguousarray(
+                    pixels, dtype=numpy.uint8).tobytes()
+            else:
+                rows = [list(row) for row in pixels]
+                height = len(rows)
+                width = len(rows[0]) if rows else 0
+                pixel_bytes = len(rows[0][0]) if width else 0
+                if not header.flags.origin_upper:
+                    rows.reverse()
+                if header.flags.origin_right:
+                    for row in rows:
+                        row.reverse()
+                pixel_data = bytes(value for row in rows
+                                   for pixel in row for value in pixel)
+            header.width = width
+            header.height = height
+            header.pixel_size = 8 * pixel_bytes
+            self.image.set_pixel_data(pixel_data, header)
+
         def get_global_child_nodes(self, edge_filter=EdgeFilter()):
             yield self.header
             yield self.image
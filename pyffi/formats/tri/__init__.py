@@ -92,6 +92,7 @@ Create an TRI file from scratch and write to file
 # ***** END LICENSE BLOCK *****
 
 from itertools import chain
+import operator
 import struct
 import os
 import re
@@ -101,6 +102,7 @@ import pyffi.object_models.common
 from pyffi.object_models.xml.basic import BasicBase
 import pyffi.object_models
 from pyffi.utils.graph import EdgeFilter
+import pyffi.utils.morph
 
 class TriFormat(pyffi.object_models.xml.FileFormat):
     """This class implements the TRI format."""
@@ -354,7 +356,15 @@ class TriFormat(pyffi.object_models.xml.FileFormat):
             """Add a morph."""
             self.num_morphs += 1
             self.morphs.update_size()
-            return self.morphs[-1]
+            morph = self.morphs[-1]
+            # the morph may have been created for another number of vertices
+            morph.arg = self.num_vertices
+            morph.vertices.update_size()
+            if name is not None:
+                morph.name = name
+            if relative_vertices is not None:
+                morph.set_relative_vertices(relative_vertices)
+            return morph
 
         def add_modifier(self, name=None, relative_vertices=None):
             """Add a modifier."""
@@ -362,14 +372,43 @@ class TriFormat(pyffi.object_models.xml.FileFormat):
             self.modifiers.update_size()
             return self.modifiers[-1]
 
+        def get_morphed_vertices(self, weights):
+            """Return the vertices of the base model with the morphs
+            applied, each multiplied by its weight. If numpy is available,
+            all morphs are added in a single pass, and an array of shape
+            ``(num_vertices, 3)`` is returned; otherwise, a list of tuples
+            is returned.
+
+            >>> header = TriFormat.Header()
+            >>> header.num_vertices = 2
+            >>> header.vertices.update_size()
+            >>> header.vertices[1].x = 1.0
+            >>> morph = header.add_morph(
+            ...     relative_vertices=[(1, 0, 0), (0, 2, 0)])
+            >>> morph = header.add_morph(
+            ...     relative_vertices=[(0, 0, 4), (0, 0, -4)])
+            >>> for vert in header.get_morphed_vertices([0.5, 0.25]):
+            ...     print([round(float(x), 3) for x in vert])
+            [0.5, 0.0, 1.0]
+            [1.0, 1.0, -1.0]
+
+            :param weights: The weight of each morph; missing weights are
+                zero.
+            :return: The morphed vertices.
+            """
+            get_xyz = operator.attrgetter("_x_value_", "_y_value_", "_z_value_")
+            vertices = [tuple(basic.get_value() for basic in get_xyz(vert))
+                        for vert in self.vertices]
+            return pyffi.utils.morph.get_morphed_vertices(
+                vertices, zip(weights, self.morphs))
+
         # GlobalNode
 
         def get_global_child_nodes(self, edge_filter=EdgeFilter()):
             return ([morph for morph in self.morphs]
                     + [morph for morph in self.modifiers])
 
-    # XXX copied from pyffi.formats.egm.EgmFormat.MorphRecord
-    class MorphRecord:
+    class MorphRecord(pyffi.utils.morph.MorphRecord):
         """
         >>> # create morph with 3 vertices.
         >>> morph = TriFormat.MorphRecord(argument=3)
@@ -383,47 +422,22 @@ class TriFormat(pyffi.object_models.xml.FileFormat):
         [3000, 5000, 2000]
         [1000, 3000, 2000]
         [-8999, 3000, -999]
+        >>> morph.set_relative_vertices_array(
+        ...     [(3, 5, 2), (1, 3, 2), (-9, 3, -1)])
+        >>> for vert in morph.get_relative_vertices_array():
+        ...     print([int(1000 * x + 0.5) for x in vert])
+        [3000, 5000, 2000]
+        [1000, 3000, 2000]
+        [-8999, 3000, -999]
+        >>> morph.apply_scale(2)
+        >>> for vert in morph.get_relative_vertices():
+        ...     print([int(1000 * x + 0.5) for x in vert])
+        [6000, 10000, 4000]
+        [2000, 6000, 4000]
+        [-17999, 6000, -1999]
         """
-        def get_relative_vertices(self):
-            for vert in self.vertices:
-                yield (vert.x * self.scale,
-                       vert.y * self.scale,
-                       vert.z * self.scale)
-
-        def set_relative_vertices(self, vertices):
-            # copy to list
-            vertices = list(vertices)
-            # check length
-            if len(vertices) != self.arg:
-                raise ValueError("expected %i vertices, but got %i"
-                                 % (self.arg, len(vertices)))
-            # get extreme values of morph
-            max_value = max(max(abs(value) for value in vert)
-                            for vert in vertices)
-            # calculate scale
-            self.scale = max_value / 32767.0
-            inv_scale = 1 / self.scale
-            # set vertices
-            for vert, self_vert in zip(vertices, self.vertices):
-                self_vert.x = int(vert[0] * inv_scale)
-                self_vert.y = int(vert[1] * inv_scale)
-                self_vert.z = int(vert[2] * inv_scale)
-
-        def apply_scale(self, scale):
-            """Apply scale factor to data.
-
-            >>> # create morph with 3 vertices.
-            >>> morph = TriFormat.MorphRecord(argument=3)
-            >>> morph.set_relative_vertices(
-            ...     [(3, 5, 2), (1, 3, 2), (-9, 3, -1)])
-            >>> morph.apply_scale(2)
-            >>> for vert in morph.get_relative_vertices():
-            ...     print([int(1000 * x + 0.5) for x in vert])
-            [6000, 10000, 4000]
-            [2000, 6000, 4000]
-            [-17999, 6000, -1999]
-            """
-            self.scale *= scale
+        # StructBase.read comes first in the generated class
+        read = pyffi.utils.morph.MorphRecord.read
 
 if __name__=='__main__':
     import doctest
@@ -41,16 +41,24 @@
 
 # note: some imports are defined at the end to avoid problems with circularity
 
+import operator
 import weakref
 
+from pyffi.object_models.xml import tracking
 from pyffi.utils.graph import DetailNode, EdgeFilter
 
 class _ListWrap(list, DetailNode):
     """A wrapper for list, which uses get_value and set_value for
     getting and setting items of the basic type."""
 
+    _tracker = None
+    _watcher = None
+
     def __init__(self, element_type, parent = None):
         self._parent = weakref.ref(parent) if parent else None
+        # changes are signalled to the tracker
+        if tracking.current is not None:
+            self._tracker = tracking.current
         self._elementType = element_type
         # we link to the unbound methods (that is, self.__class__.xxx
         # instead of self.xxx) to avoid circular references!!
@@ -102,6 +110,8 @@ class _ListWrap(list, DetailNode):
 
     def set_basic_item(self, index, value):
         """Item setter which calls C{set_value()} on the C{index}'d item."""
+        if self._tracker is not None:
+            self._tracker.touch()
         return list.__getitem__(self, index).set_value(value)
 
     def get_item(self, index):
@@ -109,6 +119,113 @@ class _ListWrap(list, DetailNode):
         elements."""
         return list.__getitem__(self, index)
 
+    def scale_items(self, scale, names=None, start=0, stop=None):
+        """Multiply items C{start} up to C{stop} by C{scale}, in place.
+        If C{names} is given, then the items must be structures, and
+        their basic attributes C{names} are multiplied instead; names
+        may be dotted to get to attributes of nested structures. This
+        is equivalent to, but much faster than, ``item *= scale`` or
+        ``item.name *= scale`` for every item, as the values are
+        accessed directly, and the change is signalled only once.
+
+        >>> from pyffi.object_models.common import Float, UInt
+        >>> from pyffi.object_models.xml import StructAttribute as Attr
+        >>> from pyffi.object_models.xml.struct_ import StructBase
+        >>> class SimpleFormat(object):
+        ...     Float = Float
+        ...     UInt = UInt
+        ...     @staticmethod
+        ...     def name_attribute(name):
+        ...         return name
+        >>> class X(StructBase):
+        ...     _attrs = [
+        ...         Attr(SimpleFormat, dict(name='a', type='Float')),
+        ...         Attr(SimpleFormat, dict(name='b', type='Float'))]
+        >>> SimpleFormat.X = X
+        >>> class Y(StructBase):
+        ...     _attrs = [
+        ...         Attr(SimpleFormat, dict(name='n', type='UInt')),
+        ...         Attr(SimpleFormat, dict(name='x', type='X', arr1='n')),
+        ...         Attr(SimpleFormat, dict(name='f', type='Float', arr1='n'))]
+        >>> y = Y()
+        >>> y.n = 3
+        >>> y.x.update_size()
+        >>> y.f.update_size()
+        >>> for i in range(3):
+        ...     y.x[i].a, y.x[i].b = i, -i
+        ...     y.f[i] = i
+        >>> y.x.scale_items(2.0, names=["a"])
+        >>> [(x.a, x.b) for x in y.x]
+        [(0.0, 0.0), (2.0, -1.0), (4.0, -2.0)]
+        >>> y.f.scale_items(0.5, start=1)
+        >>> list(y.f)
+        [0.0, 0.5, 1.0]
+
+        :param scale: The scale factor.
+        :type scale: ``float``
+        :param names: The names of the attributes to scale, or ``None``
+            if the items are basic values.
+        :type names: ``list`` of ``str``
+        :param start: Index of the first item to scale.
+        :type start: ``int``
+        :param stop: Index just beyond the last item to scale, or
+            ``None`` for all remaining items.
+        :type stop: ``int``
+        """
+        if self._tracker is not None:
+            self._tracker.touch()
+        items = list.__getitem__(self, slice(start, stop))
+        if names is None:
+            basics = items
+        else:
+            getters = [
+                operator.attrgetter(".".join(
+                    "_%s_value_" % part for part in name.split(".")))
+                for name in names]
+            basics = [getter(item) for item in items for getter in getters]
+        for basic in basics:
+            basic.set_value(basic.get_value() * scale)
+
+    def get_values(self, start=0, stop=None):
+        """Return the values of items C{start} up to C{stop}, which
+        must be basic values, as a list. This is equivalent to, but
+        faster than, ``list(self)[start:stop]``.
+
+        :param start: Index of the first item.
+        :type start: ``int``
+        :param stop: Index just beyond the last item, or ``None`` for
+            all remaining items.
+        :type stop: ``int``
+        :return: The values.
+        :rtype: ``list``
+        """
+        return [basic.get_value()
+                for basic in list.__getitem__(self, slice(start, stop))]
+
+    def set_values(self, values, start=0):
+        """Set the values of the items from C{start} onwards, which
+        must be basic values, to C{values}. The change is signalled
+        only once.
+
+        >>> from pyffi.object_models.common import Short
+        >>> arr = _ListWrap(Short)
+        >>> arr.extend(Short() for i in range(5))
+        >>> arr.set_values([3, -4, 5], start=1)
+        >>> arr.get_values()
+        [0, 3, -4, 5, 0]
+        >>> arr.get_values(2, 4)
+        [-4, 5]
+
+        :param values: The values.
+        :param start: Index of the first item to set.
+        :type start: ``int``
+        """
+        if self._tracker is not None:
+            self._tracker.touch()
+        for basic, value in zip(
+            list.__getitem__(self, slice(start, None)), values):
+            basic.set_value(value)
+
     # DetailNode
 
     def get_detail_child_nodes(self, edge_filter=EdgeFilter()):
@@ -252,6 +369,20 @@ class Array(_ListWrap):
         """Update the array size. Call this function whenever the size
         parameters change in C{parent}."""
         ## TODO also update row numbers
+        if self._tracker is not None:
+            self._tracker.touch()
+        if self._watcher is not None:
+            # references may be added or dropped
+            self._watcher.touch()
+        if self._tracker is not None and tracking.current is None:
+            # new elements are tracked along with the array
+            with tracking.track(self._tracker):
+                self._resize()
+        else:
+            self._resize()
+
+    def _resize(self):
+        """Add or remove elements to match the size parameters."""
         old_size = len(self)
         new_size = self._len1()
         if self._count2 == None:
@@ -371,6 +502,8 @@ describing number of elements (%i)"%(elemlist.__len__(),len2i))
         links = []
         if not self._elementType._has_links:
             return links
+        if tracking.watching is not None:
+            self._watcher = tracking.watching
         for elem in self._elementList():
             links.extend(elem.get_refs(data))
         return links
@@ -46,6 +46,7 @@ from functools import partial
 import struct
 
 from pyffi.object_models.editable import EditableSpinBox # for Bits
+from pyffi.object_models.xml import tracking
 from pyffi.utils.graph import DetailNode, EdgeFilter
 
 class _MetaBitStructBase(type):
@@ -190,6 +191,7 @@ class BitStructBase(DetailNode, metaclass=_MetaBitStructBase):
     _numbytes = 1 # default width of a bitstruct
     _games = {}
     arg = None # default argument
+    _tracker = None
 
     # initialize all attributes
     def __init__(self, template = None, argument = None, parent = None):
@@ -211,6 +213,9 @@ class BitStructBase(DetailNode, metaclass=_MetaBitStructBase):
         self.arg = argument
         # save parent (note: disabled for performance)
         #self._parent = weakref.ref(parent) if parent else None
+        # changes are signalled to the tracker instead
+        if tracking.current is not None:
+            self._tracker = tracking.current
         # initialize item list
         # this list is used for instance by qskope to display the structure
         # in a tree view
@@ -435,6 +440,8 @@ class BitStructBase(DetailNode, metaclass=_MetaBitStructBase):
     def set_attribute(self, value, name):
         """Set the value of a basic attribute."""
         getattr(self, "_" + name + "_value_").set_value(value)
+        if self._tracker is not None:
+            self._tracker.touch()
 
     def tree(self):
         """A generator for parsing all blocks in the tree (starting from and
@@ -46,6 +46,7 @@ from functools import partial
 
 from pyffi.utils.graph import DetailNode, GlobalNode, EdgeFilter
 import pyffi.object_models.common
+from pyffi.object_models.xml import tracking
 
 class _MetaStructBase(type):
     """This metaclass checks for the presence of _attrs and _is_template
@@ -222,6 +223,7 @@ class StructBase(GlobalNode, metaclass=_MetaStructBase):
     _attrs = []
     _games = {}
     arg = None
+    _tracker = None
 
     # initialize all attributes
     def __init__(self, template = None, argument = None, parent = None):
@@ -243,6 +245,9 @@ class StructBase(GlobalNode, metaclass=_MetaStructBase):
         self.arg = argument
         # save parent (note: disabled for performance)
         #self._parent = weakref.ref(parent) if parent else None
+        # changes are signalled to the tracker instead
+        if tracking.current is not None:
+            self._tracker = tracking.current
         # initialize item list
         # this list is used for instance by qskope to display the structure
         # in a tree view
@@ -449,6 +454,17 @@ class StructBase(GlobalNode, metaclass=_MetaStructBase):
 
     def get_size(self, data=None):
         """Calculate the structure size in bytes."""
+        # the size of the owner of a tracker is cached until it changes
+        tracker = self._tracker
+        if (tracking.use_cache and tracker is not None
+            and tracker.owner is self):
+            key = ("size",) + tracking.get_context(data)
+            try:
+                return tracker.cache[key]
+            except KeyError:
+                pass
+        else:
+            key = None
         # calculate size
         size = 0
         for attr in self._get_filtered_attribute_list(data):
@@ -456,6 +472,8 @@ class StructBase(GlobalNode, metaclass=_MetaStructBase):
             if attr.is_abstract:
                 continue
             size += getattr(self, "_%s_value_" % attr.name).get_size(data)
+        if key is not None:
+            tracker.cache[key] = size
         return size
 
     def get_hash(self, data=None):
@@ -589,6 +607,8 @@ class StructBase(GlobalNode, metaclass=_MetaStructBase):
                                value.__class__.__name__))
         # set it
         setattr(self, "_" + name + "_value_", value)
+        if self._tracker is not None:
+            self._tracker.touch()
 
     def get_basic_attribute(self, name):
         """Get a basic attribute."""
@@ -599,6 +619,8 @@ class StructBase(GlobalNode, metaclass=_MetaStructBase):
     def set_basic_attribute(self, value, name):
         """Set the value of a basic attribute."""
         getattr(self, "_" + name + "_value_").set_value(value)
+        if self._tracker is not None:
+            self._tracker.touch()
 
     def get_template_attribute(self, name):
         """Get a template attribute."""
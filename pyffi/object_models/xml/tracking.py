@@ -0,0 +1,210 @@
+"""Tracks modifications of structures, arrays, and bitstructs.
+
+Structures do not keep a reference to their parent (for performance),
+so a modification deep down in a block cannot be propagated upwards.
+Instead, every L{StructBase}, L{Array}, and L{BitStructBase} instance
+which is created while a L{ChangeTracker} is active (see L{track})
+keeps a reference to that tracker, and flags it as changed whenever
+one of its attributes or items is set. Formats use this to find
+out whether a block read from a file may have been modified since,
+and the L{owner} of the tracker uses it to cache its size.
+
+>>> from pyffi.object_models.common import UInt
+>>> from pyffi.object_models.xml import StructAttribute as Attr
+>>> from pyffi.object_models.xml.struct_ import StructBase
+>>> class SimpleFormat(object):
+...     UInt = UInt
+...     @staticmethod
+...     def name_attribute(name):
+...         return name
+>>> class X(StructBase):
+...     _attrs = [
+...         Attr(SimpleFormat, dict(name='a', type='UInt')),
+...         Attr(SimpleFormat, dict(name='b', type='UInt', arr1='a'))]
+>>> SimpleFormat.X = X
+>>> class Y(StructBase):
+...     _attrs = [Attr(SimpleFormat, dict(name='x', type='X'))]
+>>> tracker = ChangeTracker()
+>>> with track(tracker):
+...     y = Y()
+>>> tracker.owner = y
+>>> tracker.changed
+False
+>>> y.x.a = 2
+>>> tracker.changed
+True
+>>> tracker.changed = False
+>>> y.x.b.update_size()
+>>> tracker.changed
+True
+>>> tracker.changed = False
+>>> y.x.b[1] = 5
+>>> tracker.changed
+True
+>>> y.get_size()
+12
+>>> list(tracker.cache.values())
+[12]
+>>> y.x.a = 1 # invalidates the cached size
+>>> tracker.cache
+{}
+>>> y.x.b.update_size()
+>>> y.get_size()
+8
+>>> tracker.changed = False
+>>> Y().x.a = 3 # created outside track, so not tracked
+>>> tracker.changed
+False
+"""
+
+# --------------------------------------------------------------------------
+# ***** BEGIN LICENSE BLOCK *****
+#
+# Copyright (c) 2007-2009, Python File Format Interface
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#
+#    * Redistributions in binary form must reproduce the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer in the documentation and/or other materials provided
+#      with the distribution.
+#
+#    * Neither the name of the Python File Format Interface
+#      project nor the names of its contributors may be used to endorse
+#      or promote products derived from this software without specific
+#      prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# ***** END LICENSE BLOCK *****
+# --------------------------------------------------------------------------
+
+from contextlib import contextmanager
+
+current = None
+"""The active L{ChangeTracker}, or ``None``."""
+
+use_cache = True
+"""Whether owners of a tracker may cache their size. Set this to
+``False`` to recompute sizes every time, for instance to rule out the
+cache when debugging."""
+
+class ChangeTracker(object):
+    """Flags whether any of the instances that refer to it has been
+    modified, and holds values computed from them until then.
+
+    Values that are modified in place, or basic attributes whose
+    C{set_value} is called directly, bypass the tracker.
+
+    :ivar changed: Whether any instance has been modified.
+    :type changed: ``bool``
+    :ivar owner: The instance which contains all others, such as
+        a block, or ``None``.
+    :ivar cache: Values computed from the owner, cleared on every
+        change.
+    :type cache: ``dict``
+    """
+    __slots__ = ["changed", "owner", "cache"]
+
+    def __init__(self):
+        self.changed = False
+        self.owner = None
+        self.cache = {}
+
+    def touch(self):
+        """Signal that an instance has been modified."""
+        self.changed = True
+        if self.cache:
+            self.cache.clear()
+
+class RefWatcher(object):
+    """Counts modifications of the references in a tree of blocks, so
+    an index of the tree can tell whether it is out of date. Unlike
+    L{ChangeTracker}, it is attached when the references are walked
+    (see L{watch}), so it follows the tree rather than the blocks
+    that were created together.
+
+    >>> watcher = RefWatcher()
+    >>> watcher.generation
+    0
+    >>> watcher.touch()
+    >>> watcher.generation
+    1
+
+    :ivar generation: Number of modifications so far.
+    :type generation: ``int``
+    """
+    __slots__ = ["generation"]
+
+    def __init__(self):
+        self.generation = 0
+
+    def touch(self):
+        """Signal that a reference has been modified."""
+        self.generation += 1
+
+watching = None
+"""The active L{RefWatcher}, or ``None``."""
+
+def get_context(data):
+    """Get the key under which values which depend on the version of
+    C{data} are cached.
+
+    :param data: The data, or ``None``.
+    :return: The key.
+    :rtype: ``tuple``
+    """
+    if data is None:
+        return (None, None, None)
+    return (data.version, data.user_version,
+            getattr(data, "user_version2", None))
+
+@contextmanager
+def track(tracker):
+    """Attach C{tracker} to all structures, arrays, and bitstructs
+    created in this context.
+
+    :param tracker: The tracker.
+    :type tracker: L{ChangeTracker}
+    """
+    global current
+    previous = current
+    current = tracker
+    try:
+        yield tracker
+    finally:
+        current = previous
+
+@contextmanager
+def watch(watcher):
+    """Attach C{watcher} to all references, and arrays of references,
+    whose C{get_refs} is called in this context. They touch the
+    watcher when they are set or resized.
+
+    :param watcher: The watcher.
+    :type watcher: L{RefWatcher}
+    """
+    global watching
+    previous = watching
+    watching = watcher
+    try:
+        yield watcher
+    finally:
+        watching = previous
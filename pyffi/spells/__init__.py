@@ -136,9 +136,13 @@ the file format class of the files it can toast.
 # --------------------------------------------------------------------------
 
 from configparser import ConfigParser
+from contextlib import contextmanager
 from copy import deepcopy
+import cProfile # for --profile
+import csv # for --stats
 from io import StringIO
 import gc
+import json # for --stats
 
 import logging # Logger
 try:
@@ -146,6 +150,7 @@ try:
 except ImportError:
     # < py26
     multiprocessing = None
+import marshal # for writing profiles
 import optparse
 import os # remove
 import os.path # getsize, split, join
@@ -154,6 +159,12 @@ import shlex # shlex.split for parsing option lists in ini files
 import subprocess
 import sys # sys.stdout
 import tempfile
+import time # for --stats
+try:
+    import resource # peak memory, for --stats
+except ImportError:
+    # not supported on this platform
+    resource = None
 
 import pyffi # for pyffi.__version__
 import pyffi.object_models # pyffi.object_models.FileFormat
@@ -444,7 +455,8 @@ class SpellGroupSeriesBase(SpellGroupBase):
     def recurse(self, branch=None):
         """Recurse spells in series."""
         for spell in self.spells:
-            spell.recurse(branch)
+            with self.toaster.stats_phase("recurse %s" % spell.SPELLNAME):
+                spell.recurse(branch)
 
     # the following functions must NEVER be called in series of spells
     # everything is handled by the recurse function
@@ -577,6 +589,108 @@ class fake_logger:
         cls._log("DEBUG", msg)
 
 
+@contextmanager
+def _null_phase():
+    """Phase of a file which is not being timed."""
+    yield
+
+class FileStats(object):
+    """Timings and other statistics of toasting a single file, as
+    gathered when the ``stats`` option of the :class:`Toaster` is set.
+    """
+
+    FIELDS = ["file", "spell", "failed", "total",
+              "bytes_read", "bytes_written", "blocks", "peak_memory"]
+    """Names of the fields which are exported for every file (besides
+    the timings of each phase)."""
+
+    def __init__(self, filename, spellname, profile=False):
+        """Start gathering statistics.
+
+        :param filename: Name of the file.
+        :type filename: ``str``
+        :param spellname: Name of the spell which is cast.
+        :type spellname: ``str``
+        :param profile: Whether to run the profiler as well.
+        :type profile: ``bool``
+        """
+        self.file = filename
+        self.spell = spellname
+        self.failed = False
+        self.total = 0.0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.blocks = 0
+        self.peak_memory = 0
+        self.phases = {}
+        """Maps name of each phase to the time spent in it, in seconds."""
+        self.phase_names = []
+        """Names of all phases, in order."""
+        self.profile = None
+        """Profiler statistics, as a ``dict`` (see :mod:`pstats`)."""
+        self._profiler = cProfile.Profile() if profile else None
+        self._start = time.time()
+        if self._profiler:
+            self._profiler.enable()
+
+    @contextmanager
+    def phase(self, name):
+        """Context manager which times a phase (if a phase is run
+        more than once, all timings are added).
+
+        >>> stats = FileStats("test.nif", "dump")
+        >>> with stats.phase("read"):
+        ...     pass
+        >>> stats.phase_names
+        ['read']
+        >>> stats.phases["read"] < 1
+        True
+        """
+        start = time.time()
+        try:
+            yield
+        finally:
+            if name not in self.phases:
+                self.phase_names.append(name)
+                self.phases[name] = 0.0
+            self.phases[name] += time.time() - start
+
+    def finish(self):
+        """Stop gathering statistics."""
+        if self._profiler:
+            self._profiler.disable()
+            self._profiler.create_stats()
+            self.profile = self._profiler.stats
+            # profiler cannot be pickled, so get rid of it
+            self._profiler = None
+        self.total = time.time() - self._start
+        if resource:
+            # peak memory of the process so far
+            self.peak_memory = resource.getrusage(
+                resource.RUSAGE_SELF).ru_maxrss
+
+    def as_dict(self):
+        """Return statistics as a ``dict``, for exporting.
+
+        >>> stats = FileStats("test.nif", "dump")
+        >>> with stats.phase("read"):
+        ...     stats.bytes_read = 100
+        >>> for key, value in sorted(stats.as_dict().items()):
+        ...     print(key, value if key != "read" else "...")
+        blocks 0
+        bytes_read 100
+        bytes_written 0
+        failed False
+        file test.nif
+        peak_memory 0
+        read ...
+        spell dump
+        total 0.0
+        """
+        result = dict((field, getattr(self, field)) for field in self.FIELDS)
+        result.update(self.phases)
+        return result
+
 def _toaster_job(args):
     """For multiprocessing. This function creates a new toaster, with the
     given options and spells, and calls the toaster on filename.
@@ -599,8 +713,8 @@ def _toaster_job(args):
 
     # toast entry code
     if not toaster.spellclass.toastentry(toaster):
-        self.msg("spell does not apply! quiting early...")
-        return
+        toaster.msg("spell does not apply! quiting early...")
+        return []
 
     # toast single file
     stream = open(filename, mode='rb' if toaster.spellclass.READONLY else 'r+b')
@@ -609,6 +723,9 @@ def _toaster_job(args):
     # toast exit code
     toaster.spellclass.toastexit(toaster)
 
+    # statistics are gathered by the main process
+    return toaster.stats
+
 class Toaster(object):
     """Toaster base class. Toasters run spells on large quantities of files.
     They load each file and pass the data structure to any number of spells.
@@ -638,9 +755,10 @@ class Toaster(object):
         skip=[], only=[],
         jobs=1, refresh=32,
         sourcedir="", destdir="",
-        archives=False,
+        archives=False, passthrough=False,
         resume=False,
-        inifile="")
+        inifile="",
+        stats="", profile=0)
 
     """List of spell classes of the particular :class:`Toaster` instance."""
 
@@ -665,10 +783,21 @@ class Toaster(object):
     exclude_types = []
     """Tuple of types corresponding to the exclude key of :attr:`options`."""
 
+    # maps branch types to the result of is_admissible_branch_class
+    _admissible_branch_classes = None
+
     only_regexs = []
     """Tuple of regular expressions corresponding to the only key of
     :attr:`options`."""
 
+    stats = []
+    """List of :class:`FileStats`, one for every toasted file, if the
+    stats key of :attr:`options` is set."""
+
+    file_stats = None
+    """The :class:`FileStats` of the file which is being toasted, or
+    ``None`` if no statistics are gathered."""
+
     skip_regexs = []
     """Tuple of regular expressions corresponding to the skip key of
     :attr:`options`."""
@@ -692,6 +821,7 @@ class Toaster(object):
         if options:
             self.options.update(options)
         self.indent = 0
+        self.stats = []
         # update options and spell class
         self._update_options()
         if spellnames:
@@ -719,12 +849,16 @@ class Toaster(object):
         if self.options["patchcmd"] and not(self.options["applypatch"]):
             raise ValueError(
                 "option --patch-cmd can only be used with --patch")
+        if self.options["profile"] and not(self.options["stats"]):
+            raise ValueError(
+                "option --profile can only be used with --stats")
         # multiprocessing available?
         if (multiprocessing is None) and self.options["jobs"] > 1:
             self.logger.warn(
                 "multiprocessing not supported on this platform")
             self.options["jobs"] = 1
         # update include and exclude types
+        self._admissible_branch_classes = None
         self.include_types = tuple(
             getattr(self.FILEFORMAT, block_type)
             for block_type in self.options["include"])
@@ -850,21 +984,27 @@ class Toaster(object):
         >>> toaster.is_admissible_branch_class(NifFormat.NiAlphaProperty)
         True
         """
+        # the result is cached per branch type
+        if self._admissible_branch_classes is None:
+            self._admissible_branch_classes = {}
+        elif branchtype in self._admissible_branch_classes:
+            return self._admissible_branch_classes[branchtype]
         #print("checking %s" % branchtype.__name__) # debug
         # check that block is not in exclude...
+        admissible = False
         if not issubclass(branchtype, self.exclude_types):
             # not excluded!
             # check if it is included
             if not self.include_types:
                 # if no include list is given, then assume included by default
                 # so, the block is admissible
-                return True
+                admissible = True
             elif issubclass(branchtype, self.include_types):
                 # included as well! the block is admissible
-                return True
-        # not admissible
-        #print("not admissible") # debug
-        return False
+                admissible = True
+        #print("admissible: %s" % admissible) # debug
+        self._admissible_branch_classes[branchtype] = admissible
+        return admissible
 
     @staticmethod
     def parse_inifile(option, opt, value, parser, toaster=None):
@@ -929,9 +1069,11 @@ class Toaster(object):
         interactive: False
         jobs: 1
         only: []
+        passthrough: False
         patchcmd: 
         pause: True
         prefix: 
+        profile: 0
         raisetesterror: False
         refresh: 32
         resume: True
@@ -939,6 +1081,7 @@ class Toaster(object):
         skip: ['testing quoted string', 'normal_string']
         sourcedir: tests/
         spells: False
+        stats: 
         suffix: 
         verbose: 1
         """
@@ -1062,6 +1205,13 @@ class Toaster(object):
             "--overwrite", dest="resume",
             action="store_false",
             help="overwrite existing files (also see --resume)")
+        parser.add_option(
+            "--passthrough", dest="passthrough",
+            action="store_true",
+            help=
+            "copy data which the spells did not change verbatim when"
+            " saving, rather than writing it field by field"
+            " (only for formats which support it)")
         parser.add_option(
             "--patch", dest="applypatch",
             action="store_true",
@@ -1084,6 +1234,14 @@ class Toaster(object):
             help=
             "prepend PREFIX to file name when saving modification"
             " instead of overwriting the original")
+        parser.add_option(
+            "--profile", dest="profile",
+            type="int",
+            metavar="N",
+            help=
+            "run the profiler on every file, and save the profile of the"
+            " N slowest files along with the statistics (see --stats)"
+            " [default: %default]")
         parser.add_option(
             "-r", "--raise", dest="raisetesterror",
             action="store_true",
@@ -1124,6 +1282,14 @@ class Toaster(object):
             "--spells", dest="spells",
             action="store_true",
             help="list all spells and exit")
+        parser.add_option(
+            "--stats", dest="stats",
+            type="string",
+            metavar="FILE",
+            help=
+            "write timings of every phase, bytes read and written,"
+            " number of blocks, and peak memory, for every file, to FILE"
+            " (as json if FILE ends with .json, as csv otherwise)")
         parser.add_option(
             "--suffix", dest="suffix",
             type="string",
@@ -1343,10 +1509,19 @@ may destroy them. Make a backup of your files before running this script.
                 # specify timeout, so CTRL-C works
                 # 99999999 is about 3 years, should be long enough... :-)
                 result.wait(timeout=99999999)
+                # gather statistics of all workers
+                if result.successful():
+                    for stats in result.get():
+                        self.stats.extend(stats)
+                    self._prune_profiles()
 
         # toast exit code
         self.spellclass.toastexit(self)
 
+        # export statistics
+        if self.options["stats"]:
+            self.write_stats(self.options["stats"])
+
     def toast_archives(self, top):
         """Toast all files in all archives."""
         if not self.FILEFORMAT.ARCHIVE_CLASSES:
@@ -1393,32 +1568,52 @@ may destroy them. Make a backup of your files before running this script.
                 return
 
         data = self.FILEFORMAT.Data()
+        if self.options["passthrough"]:
+            data.passthrough = True
+
+        if self.options["stats"]:
+            self.file_stats = FileStats(
+                stream.name, self.spellclass.SPELLNAME,
+                profile=bool(self.options["profile"]))
 
         self.msgblockbegin("=== %s ===" % stream.name)
         try:
             # inspect the file (reads only the header)
-            data.inspect(stream)
+            with self.stats_phase("inspect"):
+                data.inspect(stream)
 
             # create spell instance
             spell = self.spellclass(toaster=self, data=data, stream=stream)
             
             # inspect the spell instance
-            if spell._datainspect() and spell.datainspect():
+            with self.stats_phase("datainspect"):
+                inspected = spell._datainspect() and spell.datainspect()
+            if inspected:
                 # read the full file
-                data.read(stream)
+                with self.stats_phase("read"):
+                    data.read(stream)
+                if self.file_stats:
+                    self.file_stats.bytes_read = stream.tell()
+                    # do not count the data itself
+                    self.file_stats.blocks = sum(
+                        1 for branch in data.get_global_iterator()) - 1
                 
                 # cast the spell on the data tree
-                spell.recurse()
+                with self.stats_phase("recurse"):
+                    spell.recurse()
 
                 # save file back to disk if not readonly and the spell
                 # changed the file
                 if (not self.spellclass.READONLY) and spell.changed:
-                    if self.options["createpatch"]:
-                        self.writepatch(stream, data)
-                    else:
-                        self.write(stream, data)
+                    with self.stats_phase("write"):
+                        if self.options["createpatch"]:
+                            self.writepatch(stream, data)
+                        else:
+                            self.write(stream, data)
 
         except Exception:
+            if self.file_stats:
+                self.file_stats.failed = True
             self.logger.error("TEST FAILED ON %s" % stream.name)
             self.logger.error(
                 "If you were running a spell that came with PyFFI, then")
@@ -1431,6 +1626,76 @@ may destroy them. Make a backup of your files before running this script.
                 raise
         finally:
             self.msgblockend()
+            if self.file_stats:
+                self.file_stats.finish()
+                self.stats.append(self.file_stats)
+                self.file_stats = None
+                # only keep the profiles we need
+                self._prune_profiles()
+
+    def stats_phase(self, name):
+        """Return a context manager which times the given phase of the
+        file which is being toasted, if statistics are gathered.
+
+        :param name: The name of the phase.
+        :type name: ``str``
+        """
+        if self.file_stats:
+            return self.file_stats.phase(name)
+        else:
+            return _null_phase()
+
+    def _prune_profiles(self):
+        """Only keep the profiles of the slowest files."""
+        profiled = [stats for stats in self.stats if stats.profile]
+        if len(profiled) > self.options["profile"]:
+            profiled.sort(key=lambda stats: stats.total, reverse=True)
+            for stats in profiled[self.options["profile"]:]:
+                stats.profile = None
+
+    def write_stats(self, filename):
+        """Write statistics of all toasted files to a file, as json if
+        the file name ends with ``.json``, and as csv otherwise. The
+        profiles of the slowest files, if any, are written alongside,
+        to files which can be loaded with :class:`pstats.Stats`.
+
+        :param filename: The name of the file.
+        :type filename: ``str``
+        """
+        # gather phases from all files
+        phase_names = []
+        for stats in self.stats:
+            for name in stats.phase_names:
+                if name not in phase_names:
+                    phase_names.append(name)
+        if filename.lower().endswith(".json"):
+            with open(filename, "w") as statsfile:
+                json.dump([stats.as_dict() for stats in self.stats],
+                          statsfile, indent=1)
+        else:
+            with open(filename, "w", newline="") as statsfile:
+                writer = csv.DictWriter(
+                    statsfile, FileStats.FIELDS + phase_names, restval=0.0)
+                writer.writerow(dict((field, field) for field
+                                     in FileStats.FIELDS + phase_names))
+                for stats in self.stats:
+                    writer.writerow(stats.as_dict())
+        self.msg("statistics written to %s" % filename)
+        # summary
+        for name in phase_names:
+            self.msg("%s: %.3f seconds"
+                     % (name, sum(stats.phases.get(name, 0.0)
+                                  for stats in self.stats)))
+        # profiles, slowest first
+        root = os.path.splitext(filename)[0]
+        profiled = [stats for stats in self.stats if stats.profile]
+        profiled.sort(key=lambda stats: stats.total, reverse=True)
+        for i, stats in enumerate(profiled):
+            profilename = "%s.%i.prof" % (root, i)
+            with open(profilename, "wb") as profilefile:
+                # same format as pstats.Stats.dump_stats
+                marshal.dump(stats.profile, profilefile)
+            self.msg("profile of %s written to %s" % (stats.file, profilename))
 
     def open_outstream(self, stream, test_exists=False):
         """Either return a stream where result can be written to, or
@@ -1497,6 +1762,8 @@ may destroy them. Make a backup of your files before running this script.
         try:
             try:
                 data.write(outstream)
+                if self.file_stats:
+                    self.file_stats.bytes_written = outstream.tell()
             except: # not just Exception, also CTRL-C
                 self.msg("write failed!!!")
                 if stream is outstream:
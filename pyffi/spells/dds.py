@@ -2,7 +2,13 @@
 :mod:`pyffi.spells.dds` --- DirectDraw Surface spells
 =====================================================
 
-There are no spells yet.
+.. autoclass:: SpellGenerateMipmaps
+   :show-inheritance:
+   :members:
+
+.. autoclass:: SpellCompress
+   :show-inheritance:
+   :members:
 """
 
 # --------------------------------------------------------------------------
@@ -45,11 +51,122 @@ There are no spells yet.
 # --------------------------------------------------------------------------
 
 import pyffi.spells
+import pyffi.spells.check
+import pyffi.utils.dxt
 from pyffi.formats.dds import DdsFormat
 
 class DdsSpell(pyffi.spells.Spell):
     """Base class for spells for dds files."""
     pass
 
+class SpellGenerateMipmaps(DdsSpell):
+    """Regenerate the mipmaps of textures which do not have a full
+    mipmap chain, down to 1x1, from the first level. The filter, ``box``
+    (the default) or ``kaiser``, can be passed as argument. The new
+    levels of compressed textures are compressed in the same format;
+    the first level is kept as it is.
+    """
+
+    SPELLNAME = "fix_mipmaps"
+    READONLY = False
+
+    FILTER = "box"
+
+    @classmethod
+    def toastentry(cls, toaster):
+        if toaster.options["arg"]:
+            if toaster.options["arg"] not in pyffi.utils.dxt.FILTERS:
+                toaster.logger.warn(
+                    "unknown mipmap filter %s, expected one of %s"
+                    % (toaster.options["arg"],
+                       ", ".join(sorted(pyffi.utils.dxt.FILTERS))))
+                return False
+        toaster.mipmap_filter = toaster.options["arg"] or cls.FILTER
+        return True
+
+    def dataentry(self):
+        header = self.data.header
+        filter_ = getattr(self.toaster, "mipmap_filter", self.FILTER)
+        num_levels = len(pyffi.utils.dxt.get_level_sizes(
+            header.width, header.height))
+        if self.data.get_num_mipmaps() >= num_levels:
+            return False
+        try:
+            # only the first level is needed
+            levels = self.data.get_mipmaps(num_levels=1)
+        except ValueError as exc:
+            self.toaster.msg("skipped: %s" % exc)
+            return False
+        self.toaster.msg("generating %i mipmaps (%s filter)"
+                         % (num_levels - self.data.get_num_mipmaps(),
+                            filter_))
+        width, height, rgba = levels[0]
+        self.data.set_mipmaps(
+            pyffi.utils.dxt.get_mipmaps(rgba, width, height, filter_=filter_),
+            keep_levels=1)
+        self.changed = True
+        # nothing to recurse into
+        return False
+
+class SpellCompress(DdsSpell):
+    """Compress uncompressed textures, all mipmap levels included: as
+    DXT1 if the texture is opaque, and as DXT5 otherwise. The format can
+    also be passed as argument (``DXT1``, ``DXT3``, or ``DXT5``).
+    """
+
+    SPELLNAME = "opt_compress"
+    READONLY = False
+
+    FORMAT = None
+
+    @classmethod
+    def toastentry(cls, toaster):
+        if toaster.options["arg"]:
+            if toaster.options["arg"] not in pyffi.utils.dxt.BLOCK_SIZE:
+                toaster.logger.warn(
+                    "unknown format %s, expected one of %s"
+                    % (toaster.options["arg"],
+                       ", ".join(sorted(pyffi.utils.dxt.BLOCK_SIZE))))
+                return False
+        toaster.compress_format = toaster.options["arg"] or cls.FORMAT
+        return True
+
+    def dataentry(self):
+        try:
+            fmt = self.data.get_format()
+        except ValueError as exc:
+            self.toaster.msg("skipped: %s" % exc)
+            return False
+        if fmt:
+            self.toaster.msg("already compressed as %s" % fmt)
+            return False
+        levels = self.data.get_mipmaps()
+        fmt = getattr(self.toaster, "compress_format", self.FORMAT)
+        if not fmt:
+            is_opaque = all(
+                rgba[3::4] == b"\xff" * (width * height)
+                for width, height, rgba in levels)
+            fmt = "DXT1" if is_opaque else "DXT5"
+        self.toaster.msg("compressing as %s" % fmt)
+        self.data.set_mipmaps(levels, fmt)
+        self.changed = True
+        return False
+
 class DdsToaster(pyffi.spells.Toaster):
+    """Base class for dds toasters."""
     FILEFORMAT = DdsFormat
+
+    SPELLS = [
+        pyffi.spells.check.SpellRead,
+        pyffi.spells.check.SpellReadWrite,
+        SpellGenerateMipmaps,
+        SpellCompress]
+
+    EXAMPLES = """* generate missing mipmaps, with a kaiser filter, for all
+  textures in the current directory:
+
+    python ddstoaster.py fix_mipmaps --arg=kaiser .
+
+* compress all uncompressed textures in the current directory:
+
+    python ddstoaster.py opt_compress ."""
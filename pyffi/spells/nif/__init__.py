@@ -54,6 +54,22 @@ from pyffi.formats.nif import NifFormat
 class NifSpell(pyffi.spells.Spell):
     """Base class for spells for nif files."""
 
+    TARGET_BLOCK_TYPES = None
+    """A tuple of the block types this spell acts upon, or ``None`` if
+    the spell may act upon any block. If set, branches whose subtree
+    cannot contain any of these block types (as determined from the
+    references in the xml, see :meth:`NifFormat.get_reachable_mask`)
+    are not visited.
+
+    .. note::
+
+       Only set this if :meth:`branchentry` does nothing on other
+       blocks, apart from returning whether to recurse into them.
+    """
+
+    # mask of TARGET_BLOCK_TYPES, computed on first use
+    _target_mask = None
+
     def _datainspect(self):
         # list of all block types used in the header
         # (do this first, spells may depend on this being present)
@@ -75,18 +91,66 @@ class NifSpell(pyffi.spells.Spell):
 
         # old file formats have no list of block types
         # we cover that here
-        if not self.header_types:
+        if self.data.block_type_mask is None:
             return True
 
         # check that at least one block type of the header is admissible
-        return any(self.toaster.is_admissible_branch_class(header_type)
-                   for header_type in self.header_types)
+        return bool(self.data.block_type_mask & self.get_admissible_mask())
+
+    def get_admissible_mask(self):
+        """Get the mask of all block types which are admissible by the
+        include and exclude options of the toaster (see
+        :meth:`NifFormat.get_subclass_mask`).
+
+        :return: The mask.
+        :rtype: ``int``
+        """
+        if self.toaster.include_types:
+            mask = NifFormat.get_subclass_mask(
+                tuple(self.toaster.include_types))
+        else:
+            mask = -1 # all block types
+        if self.toaster.exclude_types:
+            mask &= ~NifFormat.get_subclass_mask(
+                tuple(self.toaster.exclude_types))
+        return mask
+
+    def _branchinspect(self, branch):
+        """Like :meth:`pyffi.spells.Spell._branchinspect`, but also skips
+        branches which cannot contain any of the
+        :attr:`TARGET_BLOCK_TYPES`.
+        """
+        if self.TARGET_BLOCK_TYPES is not None:
+            cls = self.__class__
+            # look in the class itself, subclasses may have other targets
+            target_mask = cls.__dict__.get("_target_mask")
+            if target_mask is None:
+                target_mask = NifFormat.get_subclass_mask(
+                    tuple(self.TARGET_BLOCK_TYPES))
+                cls._target_mask = target_mask
+            if not (NifFormat.get_reachable_mask(branch.__class__)
+                    & target_mask):
+                return False
+        return pyffi.spells.Spell._branchinspect(self, branch)
 
     def inspectblocktype(self, block_type):
         """This function heuristically checks whether the given block type
         is used in the nif file, using header information only. When in doubt,
         it returns ``True``.
 
+        >>> data = NifFormat.Data()
+        >>> stream = open('tests/nif/test_fix_detachhavoktristripsdata.nif',
+        ...               'rb')
+        >>> data.inspect(stream)
+        >>> spell = NifSpell(data=data, stream=stream)
+        >>> spell.inspectblocktype(NifFormat.NiTriStrips)
+        True
+        >>> spell.inspectblocktype(NifFormat.bhkNiTriStripsShape)
+        True
+        >>> spell.inspectblocktype(NifFormat.NiSkinInstance)
+        False
+        >>> stream.close()
+
         :param block_type: The block type.
         :type block_type: :class:`NifFormat.NiObject`
         :return: ``False`` if the nif has no block of the given type,
@@ -94,13 +158,12 @@ class NifSpell(pyffi.spells.Spell):
             cannot be determined.
         :rtype: ``bool``
         """
-        try:
-            # try via header
-            return self.data.header.has_block_type(block_type)
-        except ValueError:
+        if self.data.block_type_mask is None:
             # header does not have the information because nif version is
-            # too old
+            # too old, or the header has not been read
             return True
+        return bool(self.data.block_type_mask
+                    & NifFormat.get_subclass_mask(block_type))
 
 class SpellVisitSkeletonRoots(NifSpell):
     """Abstract base class for spells that visit all skeleton roots.
@@ -114,12 +177,11 @@ class SpellVisitSkeletonRoots(NifSpell):
     def dataentry(self):
         # make list of skeleton roots
         self._skelroots = set()
-        for branch in self.data.get_global_iterator():
-            if isinstance(branch, NifFormat.NiGeometry):
-                if branch.skin_instance:
-                    skelroot = branch.skin_instance.skeleton_root
-                    if skelroot and not(id(skelroot) in self._skelroots):
-                        self._skelroots.add(id(skelroot))
+        for branch in self.data.blocks_of_type(NifFormat.NiGeometry):
+            if branch.skin_instance:
+                skelroot = branch.skin_instance.skeleton_root
+                if skelroot and not(id(skelroot) in self._skelroots):
+                    self._skelroots.add(id(skelroot))
         # only apply spell if there are skeleton roots
         if self._skelroots:
             return True
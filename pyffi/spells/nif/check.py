@@ -40,17 +40,24 @@
 # --------------------------------------------------------------------------
 
 
+import bisect
 from contextlib import closing
+import io
 from itertools import repeat
+import os
 import tempfile
 
 from pyffi.formats.nif import NifFormat
 import pyffi.spells.nif
+import pyffi.utils
 import pyffi.utils.tristrip # for check_tristrip
 
 class SpellReadWrite(pyffi.spells.nif.NifSpell):
     """Like the original read-write spell, but with additional file size
-    check."""
+    check. The file is written to memory, and if its size differs from
+    the original, then the first block which differs is reported, and
+    the written file is saved for inspection.
+    """
 
     SPELLNAME = "check_readwrite"
 
@@ -60,37 +67,95 @@ class SpellReadWrite(pyffi.spells.nif.NifSpell):
         least one admissible block type, but for read write spells it
         makes more sense to impose all.
         """
-        return all(self.toaster.is_admissible_branch_class(header_type)
-                   for header_type in self.header_types)
+        if self.data.block_type_mask is None:
+            return True
+        return not(self.data.block_type_mask & ~self.get_admissible_mask())
 
     def dataentry(self):
-        self.toaster.msgblockbegin("writing to temporary file")
-
-        f_tmp = tempfile.TemporaryFile()
-        try:
-            self.data.write(f_tmp)
-            # comparing the files will usually be different because
-            # blocks may have been written back in a different order,
-            # so cheaply just compare file sizes
-            self.toaster.msg("comparing file sizes")
-            self.stream.seek(0, 2)
-            f_tmp.seek(0, 2)
-            if self.stream.tell() != f_tmp.tell():
-                self.toaster.msg("original size: %i" % self.stream.tell())
-                self.toaster.msg("written size:  %i" % f_tmp.tell())
-                f_tmp.seek(0)
-                f_debug = open("debug.nif", "wb")
-                f_debug.write(f_tmp.read(-1))
-                f_debug.close()
-                raise Exception('write check failed: file sizes differ (written file saved as debug.nif for inspection)')
-        finally:
-            f_tmp.close()
-    
+        self.toaster.msgblockbegin("writing to memory")
+
+        # get original file, and its blocks as they were read
+        self.stream.seek(0)
+        original = self.stream.read()
+        read_blocks = self.data.blocks[:]
+        read_offsets = self.data.block_offsets[:]
+        # preallocate buffer (round trip should give the same size)
+        f_tmp = io.BytesIO(bytes(len(original)))
+        self.data.write(f_tmp)
+        f_tmp.truncate()
+        written = f_tmp.getvalue()
+        f_tmp.close()
+        # blocks and strings may legitimately be written back in a
+        # different order, so only a difference in size is an error
+        self.toaster.msg("comparing file sizes")
+        offset = pyffi.utils.find_first_difference(original, written)
+        if offset is not None:
+            report = self.get_difference_report(
+                offset, read_blocks, read_offsets,
+                self.data.blocks, self.data.block_offsets)
+            if len(original) == len(written):
+                self.toaster.logger.debug(
+                    "contents differ: %s" % report)
+            else:
+                self.toaster.msg("original size: %i" % len(original))
+                self.toaster.msg("written size:  %i" % len(written))
+                self.toaster.msg(report)
+                # unique name in the temporary folder, so jobs do not
+                # overwrite each other's files
+                fd, debugname = tempfile.mkstemp(
+                    prefix="debug-%s-" % os.path.splitext(
+                        os.path.basename(self.stream.name))[0],
+                    suffix=".nif")
+                with open(fd, "wb") as f_debug:
+                    f_debug.write(written)
+                raise Exception(
+                    'write check failed: file sizes differ'
+                    ' (written file saved as %s for inspection)' % debugname)
+
         self.toaster.msgblockend()
 
         # spell is finished: prevent recursing into the tree
         return False
 
+    @staticmethod
+    def get_difference_report(offset, read_blocks, read_offsets,
+                              written_blocks, written_offsets):
+        """Describe where the written file first differs from the
+        original file.
+
+        :param offset: Offset of first difference.
+        :type offset: ``int``
+        :param read_blocks: Blocks, as read.
+        :type read_blocks: ``list`` of L{NifFormat.NiObject}
+        :param read_offsets: Offset and size of each block, as read.
+        :type read_offsets: ``list`` of ``(int, int)``
+        :param written_blocks: Blocks, as written.
+        :type written_blocks: ``list`` of L{NifFormat.NiObject}
+        :param written_offsets: Offset and size of each block, as written.
+        :type written_offsets: ``list`` of ``(int, int)``
+        :return: The description.
+        :rtype: ``str``
+        """
+        if not written_offsets or offset < written_offsets[0][0]:
+            return "first difference at 0x%08X, in header" % offset
+        index = bisect.bisect_right(
+            [block_offset for block_offset, size in written_offsets],
+            offset) - 1
+        block = written_blocks[index]
+        block_offset, block_size = written_offsets[index]
+        if offset >= block_offset + block_size:
+            return "first difference at 0x%08X, in footer" % offset
+        report = ("first difference at 0x%08X, in %s block %i"
+                  " (written at 0x%08X, size %i"
+                  % (offset, block.__class__.__name__, index,
+                     block_offset, block_size))
+        for read_index, read_block in enumerate(read_blocks):
+            if read_block is block:
+                report += (", read as block %i at 0x%08X, size %i"
+                           % ((read_index,) + read_offsets[read_index]))
+                break
+        return report + ")"
+
 class SpellNodeNamesByFlag(pyffi.spells.nif.NifSpell):
     """This spell goes over all nif files, and at the end, it gives a summary
     of which node names where used with particular flags."""
@@ -499,6 +564,7 @@ class SpellCheckMopp(pyffi.spells.nif.NifSpell):
     Mainly useful to check the heuristic parser and for debugging mopp codes.
     """
     SPELLNAME = "check_mopp"
+    TARGET_BLOCK_TYPES = (NifFormat.bhkMoppBvTreeShape,)
 
     def datainspect(self):
         return self.inspectblocktype(NifFormat.bhkMoppBvTreeShape)
@@ -190,15 +190,29 @@ class SpellDumpTex(NifSpell):
             return True
 
 class SpellHtmlReport(NifSpell):
-    """Make a html report of selected blocks."""
+    """Make a html report of selected blocks. Rows are written to spill
+    files, one per block type and toaster, as files are processed, and
+    are merged into a single report at the end, so memory use stays
+    bounded and the spell works with multiple jobs. The report is
+    written to the file given as argument, or else is shown in the
+    default web browser.
+    """
 
     SPELLNAME = "dump_htmlreport"
     ENTITIES = { "\n": "<br/>" }
 
     @classmethod
     def toastentry(cls, toaster):
-        # maps each block type to a list of reports for that block type
-        toaster.reports_per_blocktype = {}
+        # the process which creates the spill folder merges the report
+        # (with multiple jobs, each worker process also calls toastentry,
+        # and it gets the folder through the options)
+        toaster.report_merge = not toaster.options.get("reportdir")
+        if toaster.report_merge:
+            # store the option (so worker processes can use it)
+            toaster.options["reportdir"] = tempfile.mkdtemp(
+                prefix="pyffi-htmlreport-")
+        # maps each block type to the spill file for that block type
+        toaster.report_files = {}
         # spell always applies
         return True
 
@@ -206,27 +220,40 @@ class SpellHtmlReport(NifSpell):
         # enter every branch
         # (the base method is called in branch entry)
         return True
-        
+
+    def _get_report_file(self, branch):
+        """Get spill file for the block type of branch, starting a new
+        one if needed.
+        """
+        blocktype = branch.__class__.__name__
+        reportfile = self.toaster.report_files.get(blocktype)
+        if reportfile:
+            return reportfile
+        # every toaster gets its own spill files, so worker processes
+        # never write to the same file
+        fd, filename = tempfile.mkstemp(
+            prefix=blocktype + ".", suffix=".html",
+            dir=self.toaster.options["reportdir"])
+        reportfile = open(fd, "w", encoding="utf-8")
+        # start a new report for this block type
+        row = "<tr>"
+        row += "<th>%s</th>" % "file"
+        row +=  "<th>%s</th>" % "id"
+        for attr in branch._get_filtered_attribute_list(data=self.data):
+            row += ("<th>%s</th>"
+                    % escape(attr.displayname, self.ENTITIES))
+        row += "</tr>"
+        reportfile.write(row + "\n")
+        self.toaster.report_files[blocktype] = reportfile
+        return reportfile
+
     def branchentry(self, branch):
         # check if this branch must be checked, if not, recurse further
         if not NifSpell._branchinspect(self, branch):
             return True
-        blocktype = branch.__class__.__name__
-        reports = self.toaster.reports_per_blocktype.get(blocktype)
-        if not reports:
-            # start a new report for this block type
-            row = "<tr>"
-            row += "<th>%s</th>" % "file" 
-            row +=  "<th>%s</th>" % "id" 
-            for attr in branch._get_filtered_attribute_list(data=self.data):
-                row += ("<th>%s</th>"
-                        % escape(attr.displayname, self.ENTITIES))
-            row += "</tr>"
-            reports = [row]
-            self.toaster.reports_per_blocktype[blocktype] = reports
-        
+        reportfile = self._get_report_file(branch)
         row = "<tr>"
-        row += "<td>%s</td>" % escape(self.stream.name)
+        row += "<td>%s</td>" % escape(self.stream.name, self.ENTITIES)
         row += "<td>%s</td>" % escape("0x%08X" % id(branch), self.ENTITIES)
         for attr in branch._get_filtered_attribute_list(data=self.data):
             row += ("<td>%s</td>"
@@ -234,48 +261,103 @@ class SpellHtmlReport(NifSpell):
                                               % attr.name)),
                              self.ENTITIES))
         row += "</tr>"
-        reports.append(row)
+        reportfile.write(row + "\n")
         # keep looking for blocks of interest
         return True
 
     @classmethod
     def toastexit(cls, toaster):
-        if toaster.reports_per_blocktype:
-            rows = []
-            rows.append( "<head>" )
-            rows.append( "<title>Report</title>" )
-            rows.append( "</head>" )
-            rows.append( "<body>" )
-
-            for blocktype, reports in toaster.reports_per_blocktype.items():
-                rows.append("<h1>%s</h1>" % blocktype)
-                rows.append('<table border="1" cellspacing="0">')
-                rows.append("\n".join(reports))
-                rows.append("</table>")
-
-            rows.append("</body>")
-
-            cls.browser("\n".join(rows))
+        for reportfile in toaster.report_files.values():
+            reportfile.close()
+        toaster.report_files = {}
+        if not toaster.report_merge:
+            # worker process: the partial report is merged by the
+            # main process
+            return
+        reportdir = toaster.options.pop("reportdir")
+        try:
+            # group spill files per block type
+            filenames_per_blocktype = {}
+            for filename in sorted(os.listdir(reportdir)):
+                blocktype = filename.split(".")[0]
+                filenames_per_blocktype.setdefault(blocktype, []).append(
+                    os.path.join(reportdir, filename))
+            if not filenames_per_blocktype:
+                toaster.msg('No Report Generated')
+                return
+            if toaster.options.get("arg"):
+                htmlfilename = toaster.options["arg"]
+            else:
+                htmlfd, htmlfilename = tempfile.mkstemp(
+                    prefix="pyffi-htmlreport-", suffix=".html")
+                os.close(htmlfd)
+            with open(htmlfilename, "w", encoding="utf-8") as htmlfile:
+                cls.merge(htmlfile, filenames_per_blocktype)
+        finally:
+            for filename in os.listdir(reportdir):
+                os.remove(os.path.join(reportdir, filename))
+            os.rmdir(reportdir)
+        if (toaster.options.get("arg")
+            or not toaster.options.get("interactive")):
+            toaster.msg("report written to %s" % htmlfilename)
         else:
-            toaster.msg('No Report Generated')
+            try:
+                cls.browser(htmlfilename)
+            finally:
+                os.remove(htmlfilename)
 
     @classmethod
-    def browser(cls, htmlstr):
-        """Display html in the default web browser without creating a
-        temp file.
-        
+    def merge(cls, htmlfile, filenames_per_blocktype):
+        """Merge spill files into a single html report. Only one line is
+        held in memory at any time.
+
+        :param htmlfile: The file to write the report to.
+        :type htmlfile: file
+        :param filenames_per_blocktype: Maps each block type to the
+            names of its spill files.
+        :type filenames_per_blocktype: ``dict``
+        """
+        htmlfile.write("<head>\n")
+        htmlfile.write("<title>Report</title>\n")
+        htmlfile.write("</head>\n")
+        htmlfile.write("<body>\n")
+        for blocktype, filenames in sorted(filenames_per_blocktype.items()):
+            htmlfile.write("<h1>%s</h1>\n" % blocktype)
+            htmlfile.write('<table border="1" cellspacing="0">\n')
+            for i, filename in enumerate(filenames):
+                with open(filename, encoding="utf-8") as reportfile:
+                    header = reportfile.readline()
+                    # only keep header of first file
+                    if i == 0:
+                        htmlfile.write(header)
+                    for row in reportfile:
+                        htmlfile.write(row)
+            htmlfile.write("</table>\n")
+        htmlfile.write("</body>\n")
+
+    @classmethod
+    def browser(cls, htmlfilename):
+        """Display html file in the default web browser.
+
         Instantiates a trivial http server and calls webbrowser.open
-        with a URL to retrieve html from that server.
-        """    
+        with a URL to retrieve the html from that server.
+        """
         class RequestHandler(http.server.BaseHTTPRequestHandler):
             def do_GET(self):
                 bufferSize = 1024*1024
-                for i in range(0, len(htmlstr), bufferSize):
-                    self.wfile.write(htmlstr[i:i+bufferSize])
+                self.send_response(200)
+                self.send_header("Content-type", "text/html; charset=utf-8")
+                self.end_headers()
+                with open(htmlfilename, "rb") as htmlfile:
+                    while True:
+                        buf = htmlfile.read(bufferSize)
+                        if not buf:
+                            break
+                        self.wfile.write(buf)
 
         server = http.server.HTTPServer(('127.0.0.1', 0), RequestHandler)
         webbrowser.open('http://127.0.0.1:%s' % server.server_port)
-        server.handle_request()           
+        server.handle_request()
 
 class SpellExportPixelData(NifSpell):
     """Export embedded images as DDS files. If the toaster's 'dryrun' option is
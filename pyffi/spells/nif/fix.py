@@ -128,6 +128,7 @@ class SpellDelTangentSpace(NifSpell):
 
     SPELLNAME = "fix_deltangentspace"
     READONLY = False
+    TARGET_BLOCK_TYPES = (NifFormat.NiTriBasedGeom,)
 
     def datainspect(self):
         return self.inspectblocktype(NifFormat.NiBinaryExtraData)
@@ -215,12 +216,24 @@ class SpellFFVT3RSkinPartition(NifSpell):
 
 class SpellParseTexturePath(NifSpell):
     """Base class for spells which must parse all texture paths, with
-    hook for texture path substitution.
+    hook for texture path substitution. Texture paths are found through
+    the block type index rather than by walking the tree, and the new
+    path of every path seen is remembered for the whole run. Only the
+    number of changed paths is logged.
     """
 
     # abstract spell, so no spell name
     READONLY = False
 
+    @classmethod
+    def toastentry(cls, toaster):
+        # every spell substitutes paths differently, so each spell
+        # gets its own table, mapping old paths to new paths
+        if not hasattr(toaster, "texture_path_cache"):
+            toaster.texture_path_cache = {}
+        toaster.texture_path_cache[cls.SPELLNAME] = {}
+        return True
+
     def substitute(self, old_path):
         """Helper function to allow subclasses of this spell to
         change part of the path with minimum of code.
@@ -229,22 +242,47 @@ class SpellParseTexturePath(NifSpell):
         return old_path
 
     def datainspect(self):
-        # only run the spell if there are NiSourceTexture blocks
-        return self.inspectblocktype(NifFormat.NiSourceTexture)
+        # only run the spell if there are texture paths
+        return (self.inspectblocktype(NifFormat.NiSourceTexture)
+                or self.inspectblocktype(NifFormat.BSShaderTextureSet))
 
-    def branchinspect(self, branch):
-        # only inspect the NiAVObject branch, texturing properties and source
-        # textures
-        return isinstance(branch, (NifFormat.NiAVObject,
-                                   NifFormat.NiTexturingProperty,
-                                   NifFormat.NiSourceTexture))
-    
-    def branchentry(self, branch):
-        if isinstance(branch, NifFormat.NiSourceTexture):
-            branch.file_name = self.substitute(branch.file_name)
-            return False
-        else:
-            return True
+    def get_new_path(self, old_path):
+        """Return :meth:`substitute` of the path, from the table if
+        the path was seen before.
+        """
+        cache = self.toaster.texture_path_cache[self.SPELLNAME]
+        try:
+            return cache[old_path]
+        except KeyError:
+            new_path = cache[old_path] = self.substitute(old_path)
+            return new_path
+
+    def dataentry(self):
+        num_paths = 0
+        num_changes = 0
+        for block in self.data.blocks_of_type(NifFormat.NiSourceTexture):
+            if not block.file_name:
+                continue
+            num_paths += 1
+            new_path = self.get_new_path(block.file_name)
+            if new_path != block.file_name:
+                block.file_name = new_path
+                num_changes += 1
+        for block in self.data.blocks_of_type(NifFormat.BSShaderTextureSet):
+            for i, old_path in enumerate(block.textures):
+                if not old_path:
+                    continue
+                num_paths += 1
+                new_path = self.get_new_path(old_path)
+                if new_path != old_path:
+                    block.textures[i] = new_path
+                    num_changes += 1
+        if num_changes:
+            self.changed = True
+        self.toaster.msg("changed %i of %i texture paths"
+                         % (num_changes, num_paths))
+        # all done, no need to recurse
+        return False
 
 class SpellFixTexturePath(SpellParseTexturePath):
     r"""Fix the texture path. Transforms 0x0a into \n and 0x0d into
@@ -272,10 +310,6 @@ class SpellFixTexturePath(SpellParseTexturePath):
             # path contains textures\ at position other than starting
             # position
             new_path = new_path[textures_index:]
-        if new_path != old_path:
-            self.toaster.msg("fixed file name '%s'"
-                             % new_path.decode("utf8", "ignore"))
-            self.changed = True
         return new_path
 
 # the next spell solves issue #2065018, MiddleWolfRug01.NIF
@@ -299,8 +333,7 @@ class SpellDetachHavokTriStripsData(NifSpell):
 
     def dataentry(self):
         # build list of all NiTriStrips blocks
-        self.nitristrips = [branch for branch in self.data.get_global_iterator()
-                            if isinstance(branch, NifFormat.NiTriStrips)]
+        self.nitristrips = self.data.blocks_of_type(NifFormat.NiTriStrips)
         if self.nitristrips:
             return True
         else:
@@ -412,12 +445,11 @@ class SpellMergeSkeletonRoots(NifSpell):
     def dataentry(self):
         # make list of skeleton roots
         skelroots = []
-        for branch in self.data.get_global_iterator():
-            if isinstance(branch, NifFormat.NiGeometry):
-                if branch.skin_instance:
-                    skelroot = branch.skin_instance.skeleton_root
-                    if skelroot and not skelroot in skelroots:
-                        skelroots.append(skelroot)
+        for branch in self.data.blocks_of_type(NifFormat.NiGeometry):
+            if branch.skin_instance:
+                skelroot = branch.skin_instance.skeleton_root
+                if skelroot and not skelroot in skelroots:
+                    skelroots.append(skelroot)
         # find the 'root' skeleton roots (those that have no other skeleton
         # roots as child)
         self.skelrootlist = set()
@@ -425,7 +457,7 @@ class SpellMergeSkeletonRoots(NifSpell):
             for skelroot_other in skelroots:
                 if skelroot_other is skelroot:
                     continue
-                if skelroot_other.find_chain(skelroot):
+                if skelroot_other.find_chain(skelroot, data=self.data):
                     # skelroot_other has skelroot as child
                     # so skelroot is no longer an option
                     break
@@ -480,7 +512,7 @@ class SpellScale(NifSpell):
     def dataentry(self):
         # initialize list of blocks that have been scaled
         self.toaster.msg("scaling by factor %f" % self.toaster.scale)
-        self.scaled_branches = []
+        self.scaled_branches = set()
         return True
 
     def branchinspect(self, branch):
@@ -490,7 +522,7 @@ class SpellScale(NifSpell):
     def branchentry(self, branch):
         branch.apply_scale(self.toaster.scale)
         self.changed = True
-        self.scaled_branches.append(branch)
+        self.scaled_branches.add(branch)
         # continue recursion
         return True
 
@@ -526,6 +558,8 @@ class SpellCleanStringPalette(NifSpell):
 
     SPELLNAME = "fix_cleanstringpalette"
     READONLY = False
+    TARGET_BLOCK_TYPES = (NifFormat.NiControllerManager,
+                          NifFormat.NiControllerSequence)
 
     def substitute(self, old_string):
         """Helper function to substitute strings in the string palette,
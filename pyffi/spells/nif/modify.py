@@ -15,6 +15,10 @@ Module which contains all spells that modify a nif.
    :show-inheritance:
    :members:
 
+.. autoclass:: SpellMapTexturePath
+   :show-inheritance:
+   :members:
+
 .. autoclass:: SpellCollisionType
    :show-inheritance:
    :members:
@@ -129,7 +133,6 @@ import pyffi.spells.nif.fix
 import pyffi.spells.nif.optimize
 
 
-import os
 import re # for modify_substitutestringpalette and modify_substitutetexturepath
 
 class SpellTexturePath(
@@ -148,23 +151,14 @@ class SpellTexturePath(
                 "to apply spell")
             return False
         else:
-            toaster.texture_path = str(toaster.options["arg"])
             # standardize the path
-            toaster.texture_path = toaster.texture_path.replace("/", os.sep)
-            toaster.texture_path = toaster.texture_path.replace("\\", os.sep)
-            return True
+            toaster.texture_path = _as_bytes(
+                toaster.options["arg"]).replace(b"/", b"\\").rstrip(b"\\")
+            return super(SpellTexturePath, cls).toastentry(toaster)
 
     def substitute(self, old_path):
-        # note: replace backslashes by os.sep in filename, and
-        # when joined, revert them back, for linux
-        new_path = os.path.join(
-            self.toaster.texture_path,
-            os.path.basename(old_path.replace("\\", os.sep))
-            ).replace(os.sep, "\\")
-        if new_path != old_path:
-            self.changed = True
-            self.toaster.msg("%s -> %s" % (old_path, new_path))
-        return new_path
+        name = old_path.replace(b"/", b"\\").rpartition(b"\\")[2]
+        return self.toaster.texture_path + b"\\" + name
 
 class SpellSubstituteTexturePath(
     pyffi.spells.nif.fix.SpellFixTexturePath):
@@ -184,19 +178,11 @@ class SpellSubstituteTexturePath(
         dummy, toaster.regex, toaster.sub = arg.split(arg[0])
         toaster.sub = _as_bytes(toaster.sub)
         toaster.regex = re.compile(_as_bytes(toaster.regex))
-        return True    
+        return super(SpellSubstituteTexturePath, cls).toastentry(toaster)
 
     def substitute(self, old_path):
-        """Returns modified texture path, and reports if path was modified.
-        """
-        if not old_path:
-            # leave empty path be
-            return old_path
-        new_path = self.toaster.regex.sub(self.toaster.sub, old_path)
-        if old_path != new_path:
-            self.changed = True
-            self.toaster.msg("%s -> %s" % (old_path, new_path))
-        return new_path
+        """Returns modified texture path."""
+        return self.toaster.regex.sub(self.toaster.sub, old_path)
 
 class SpellLowResTexturePath(SpellSubstituteTexturePath):
     """Changes the texture path by replacing 'textures\\*' with 
@@ -209,7 +195,7 @@ class SpellLowResTexturePath(SpellSubstituteTexturePath):
     def toastentry(cls, toaster):
         toaster.sub = _as_bytes("textures\\\\lowres\\\\")
         toaster.regex = re.compile(_as_bytes("^textures\\\\"), re.IGNORECASE)
-        return True
+        return super(SpellSubstituteTexturePath, cls).toastentry(toaster)
 
     def substitute(self, old_path):
         if (_as_bytes('\\lowres\\') not in old_path.lower()):
@@ -217,6 +203,91 @@ class SpellLowResTexturePath(SpellSubstituteTexturePath):
         else:
             return old_path
 
+class SpellMapTexturePath(pyffi.spells.nif.fix.SpellParseTexturePath):
+    r"""Rewrites texture paths according to a file of rules, given as
+    argument (e.g. -a texturemap.txt). Every line of the file holds a
+    rule of the form::
+
+        old\prefix\ = new\prefix\
+
+    Empty lines and lines starting with # are ignored. Prefixes are
+    matched case insensitively, with / and \ treated alike. If several
+    prefixes match, then the longest one wins. All rules are compiled
+    into a single regular expression, so large rule files are cheap.
+    """
+
+    SPELLNAME = "modify_maptexturepath"
+    READONLY = False
+
+    @staticmethod
+    def normalize_path(path):
+        r"""Normalize a texture path for matching.
+
+        >>> SpellMapTexturePath.normalize_path(b'Textures/Armor\\Iron.dds')
+        b'textures\\armor\\iron.dds'
+        """
+        return path.replace(b'/', b'\\').lower()
+
+    @classmethod
+    def parse_rules(cls, lines):
+        r"""Compile rules into a regular expression which matches the
+        longest prefix of a normalized path, and a dictionary which
+        maps every normalized prefix to its replacement.
+
+        >>> regex, rules = SpellMapTexturePath.parse_rules([
+        ...     b"# comment", b"",
+        ...     b"textures\\armor\\ = textures\\newarmor\\",
+        ...     b"Textures/Armor/Iron\\ = textures\\iron\\"])
+        >>> match = regex.match(b"textures\\armor\\iron\\cuirass.dds")
+        >>> rules[match.group(0)]
+        b'textures\\iron\\'
+        >>> regex.match(b"textures\\clutter\\cup.dds") is None
+        True
+
+        :param lines: The lines of the rule file.
+        :type lines: iterable of ``bytes``
+        :return: The regular expression and the dictionary.
+        :rtype: ``tuple``
+        """
+        rules = {}
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith(b'#'):
+                continue
+            old, sep, new = line.partition(b'=')
+            if not sep:
+                raise ValueError("invalid texture path rule %r" % line)
+            rules[cls.normalize_path(old.strip())] = (
+                new.strip().replace(b'/', b'\\'))
+        # longest prefix first, so it takes precedence in the alternation
+        regex = re.compile(b'|'.join(
+            re.escape(old) for old in sorted(rules, key=len, reverse=True)))
+        return regex, rules
+
+    @classmethod
+    def toastentry(cls, toaster):
+        if not toaster.options["arg"]:
+            toaster.logger.warn(
+                "must specify file with texture path rules as argument "
+                "(e.g. -a texturemap.txt) to apply spell")
+            return False
+        with open(toaster.options["arg"], "rb") as rulefile:
+            toaster.texture_path_regex, toaster.texture_path_rules = (
+                cls.parse_rules(rulefile))
+        if not toaster.texture_path_rules:
+            toaster.logger.warn("no texture path rules found")
+            return False
+        return super(SpellMapTexturePath, cls).toastentry(toaster)
+
+    def substitute(self, old_path):
+        match = self.toaster.texture_path_regex.match(
+            self.normalize_path(old_path))
+        if not match:
+            return old_path
+        prefix = match.group(0)
+        return (self.toaster.texture_path_rules[prefix]
+                + old_path[len(prefix):].replace(b'/', b'\\'))
+
 class SpellCollisionType(NifSpell):
     """Sets the object collision to be a different type"""
 
@@ -326,6 +397,11 @@ class SpellScaleAnimationTime(NifSpell):
 
     SPELLNAME = "modify_scaleanimationtime"
     READONLY = False
+    TARGET_BLOCK_TYPES = (NifFormat.NiKeyframeData,
+                          NifFormat.NiControllerSequence,
+                          NifFormat.NiTextKeyExtraData,
+                          NifFormat.NiTimeController,
+                          NifFormat.NiFloatData)
     
     @classmethod
     def toastentry(cls, toaster):
@@ -67,6 +67,8 @@ import os.path # exists
 from pyffi.formats.nif import NifFormat
 from pyffi.utils import unique_map
 import pyffi.utils.tristrip
+import pyffi.utils.simplify
+import pyffi.utils.split
 import pyffi.spells
 import pyffi.spells.nif
 import pyffi.spells.nif.fix
@@ -226,6 +228,8 @@ class SpellOptimizeGeometry(pyffi.spells.nif.NifSpell):
     NORMALPRECISION = 3
     UVPRECISION = 5
     VCOLPRECISION = 3
+    MAXBONESPERPARTITION = 18
+    MAXBONESPERVERTEX = 4
 
     def __init__(self, *args, **kwargs):
         pyffi.spells.nif.NifSpell.__init__(self, *args, **kwargs)
@@ -243,17 +247,25 @@ class SpellOptimizeGeometry(pyffi.spells.nif.NifSpell):
         # blocks, and NiNode blocks are checked
         return self.inspectblocktype(NifFormat.NiTriBasedGeom)
 
+    def dataentry(self):
+        # find out once whether there is any oblivion style tangent space
+        # in the file, so we can skip searching for it in every geometry
+        self._has_tangent_space_extra = bool(self.data.find_by_name(
+            b'Tangent space (binormal & tangent vectors)',
+            NifFormat.NiBinaryExtraData))
+        return True
+
     def branchinspect(self, branch):
         # only inspect the NiAVObject branch
         return isinstance(branch, NifFormat.NiAVObject)
 
     def optimize_vertices(self, data):
         self.toaster.msg("removing duplicate vertices")
-        return unique_map(data.get_vertex_hash_generator(
+        return data.get_vertex_unique_map(
             vertexprecision=self.VERTEXPRECISION,
             normalprecision=self.NORMALPRECISION,
             uvprecision=self.UVPRECISION,
-            vcolprecision=self.VCOLPRECISION))
+            vcolprecision=self.VCOLPRECISION)
         
     def branchentry(self, branch):
         """Optimize a NiTriStrips or NiTriShape block:
@@ -425,7 +437,8 @@ class SpellOptimizeGeometry(pyffi.spells.nif.NifSpell):
                 self.toaster.msg("updating skin partition")
                 # use Oblivion settings
                 branch.update_skin_partition(
-                    maxbonesperpartition = 18, maxbonespervertex = 4,
+                    maxbonesperpartition = self.MAXBONESPERPARTITION,
+                    maxbonespervertex = self.MAXBONESPERVERTEX,
                     stripify = True, verbose = 0)
 
         # update morph data
@@ -453,8 +466,10 @@ class SpellOptimizeGeometry(pyffi.spells.nif.NifSpell):
                      morph.vectors.update_size()
 
         # recalculate tangent space (only if the branch already exists)
-        if (branch.find(block_name=b'Tangent space (binormal & tangent vectors)',
-                        block_type=NifFormat.NiBinaryExtraData)
+        if ((self._has_tangent_space_extra
+             and branch.find(
+                 block_name=b'Tangent space (binormal & tangent vectors)',
+                 block_type=NifFormat.NiBinaryExtraData))
             or (data.num_uv_sets & 61440)
             or (data.bs_num_uv_sets & 61440)):
             self.toaster.msg("recalculating tangent space")
@@ -463,132 +478,32 @@ class SpellOptimizeGeometry(pyffi.spells.nif.NifSpell):
         # stop recursion
         return False
 
-# XXX todo
 class SpellSplitGeometry(pyffi.spells.nif.NifSpell):
-    """Optimize geometry by splitting large models into pieces.
-    (This spell is not yet fully implemented!)
+    """Optimize geometry by splitting large models into pieces: every
+    geometry which has more than :attr:`MAXVERTICES` vertices, or whose
+    radius exceeds :attr:`THRESHOLD_RADIUS`, is replaced by sibling
+    NiTriShape blocks, one for each chunk found by
+    :func:`pyffi.utils.split.get_chunks`. The argument, if specified,
+    overrides the threshold radius. The collision object moves to the
+    first piece; geometries with controllers are not split.
     """
     SPELLNAME = "opt_split"
     READONLY = False
     THRESHOLD_RADIUS = 100 #: Threshold where to split geometry.
+    MAXVERTICES = pyffi.utils.split.MAX_VERTICES #: Vertex limit of a piece.
 
-    # XXX todo
-    @staticmethod
-    def addVertex(sourceindex, v_map, sourcedata, destdata):
-        """Add a vertex from source to destination. Returns index in
-        destdata of the vertex."""
-        # v_map maps source indices that have already been added to the
-        # index they already have in the destdata
-
-        # has_normals, num_uv_sets, etc. of destdata must already match
-        # the sourcedata
-        try:
-            return v_map[sourceindex]
-        except KeyError:
-            v_map[sourceindex] = destdata.num_vertices
-            destdata.num_vertices += 1
-            destdata.vertices.update_size()
-            destdata.vertices[-1].x = sourcedata.vertices[sourceindex].x
-            destdata.vertices[-1].y = sourcedata.vertices[sourceindex].y
-            destdata.vertices[-1].z = sourcedata.vertices[sourceindex].z
-            if sourcedata.has_normals:
-                destdata.normals.update_size()
-                destdata.normals[-1].x = sourcedata.normals[sourceindex].x
-                destdata.normals[-1].y = sourcedata.normals[sourceindex].y
-                destdata.normals[-1].z = sourcedata.normals[sourceindex].z
-            if sourcedata.has_vertex_colors:
-                destdata.vertex_colors.update_size()
-                destdata.vertex_colors[-1].r = sourcedata.vertex_colors[sourceindex].r
-                destdata.vertex_colors[-1].g = sourcedata.vertex_colors[sourceindex].g
-                destdata.vertex_colors[-1].b = sourcedata.vertex_colors[sourceindex].b
-                destdata.vertex_colors[-1].a = sourcedata.vertex_colors[sourceindex].a
-            if sourcedata.has_uv:
-                for sourceuvset, destuvset in zip(sourcedata.uv_sets, destdata.uv_sets):
-                    destuvset.update_size()
-                    destuvset[-1].u = sourceuvset[sourceindex].u
-                    destuvset[-1].v = sourceuvset[sourceindex].v
-            return destdata.num_vertices
-
-    # XXX todo
-    @staticmethod
-    def addTriangle(sourcetriangle, v_map, sourcedata, destdata):
-        """Add a triangle from source to destination."""
-        desttriangle = [
-            destdata.addVertex(sourceindex)
-            for sourceindex in sourcetriangle]
-        destdata.num_triangles += 1
-        destdata.triangles.update_size()
-        destdata.triangles[-1].v_1 = desttriangle[0]
-        destdata.triangles[-1].v_2 = desttriangle[0]
-        destdata.triangles[-1].v_3 = desttriangle[0]
-
-    # XXX todo
-    @staticmethod
-    def get_size(vertices, triangle):
-        """Calculate size of geometry data + given triangle."""
-        def helper(oper, coord):
-            return oper((getattr(vert, coord) for vert in triangle),
-                        oper(getattr(vert, coord) for vert in vertices))
-        minx = helper(min, "x")
-        miny = helper(min, "y")
-        minz = helper(min, "z")
-        maxx = helper(max, "x")
-        maxy = helper(max, "y")
-        maxz = helper(max, "z")
-        return max((maxx - minx, maxy - miny, maxz - minz))
-
-    # XXX todo: merge into branchentry spell
-    @staticmethod
-    def split(geom, threshold_radius = THRESHOLD_RADIUS):
-        """Takes a NiGeometry block and splits the geometries. Returns a NiNode
-        which contains the splitted geometry. Note that everything is triangulated
-        in the process."""
-        # make list of triangles
-        # this will be used as the list of triangles still to add
-        triangles = geom.data.get_triangles()
-        node = NifFormat.NiNode().deepcopy(
-            NifFormat.NiAVObject.deepcopy(geom))
-        geomsplit = None
-        # while there are still triangles to add...
-        while triangles:
-            if geomsplit is None:
-                # split new geometry
-                geomsplit = NifFormat.NiTriShape()
-                node.add_child(geomsplit)
-                geomsplit.data = NifFormat.NiTriShapeData()
-                v_map = {}
-                # copy relevant data
-                geomsplit.name = "%s:%i" % (geom.name, node.num_children - 1)
-                geomsplit.data.has_vertices = geom.data.has_vertices
-                geomsplit.data.has_normals = geom.data.has_normals
-                geomsplit.data.has_vertex_colors = geom.data.has_vertex_colors
-                geomsplit.data.num_uv_sets = geom.data.num_uv_sets
-                geomsplit.data.has_uv = geom.data.has_uv
-                geomsplit.data.uv_sets.update_size()
-                # assign it a random triangle
-                triangle = triangles.pop(0)
-                addTriangle(triangle, v_map, geom.data, geomsplit.data)
-            # find face that is close to current geometry
-            for triangle in triangles:
-                 if get_size(geomsplit.data,
-                            tuple(geom.data.vertices[index]
-                                  for index in triangle)) < threshold_radius:
-                     addTriangle(triangle, v_map, geom.data, geomsplit.data)
-                     break
-            else:
-                # if exceeded, start new geometry
-                # first finish some things in geomsplit data
-                geomsplit.data.update_center_radius()
-                # setting geomsplit to None flags this for
-                # the next iteration
-                geomsplit = None
-        # return grouping node
-        return node
+    @classmethod
+    def toastentry(cls, toaster):
+        if toaster.options["arg"]:
+            toaster.split_radius = float(toaster.options["arg"])
+        else:
+            toaster.split_radius = cls.THRESHOLD_RADIUS
+        return True
 
     def __init__(self, *args, **kwargs):
         pyffi.spells.nif.NifSpell.__init__(self, *args, **kwargs)
-        # list of all optimized geometries so far
-        # (to avoid optimizing the same geometry twice)
+        # list of (geometry, pieces) pairs of all geometries so far
+        # (to avoid splitting the same geometry twice)
         self.optimized = []
 
     def datainspect(self):
@@ -597,36 +512,156 @@ class SpellSplitGeometry(pyffi.spells.nif.NifSpell):
     def branchinspect(self, branch):
         return isinstance(branch, NifFormat.NiAVObject)
 
-    def branchentry(self, branch):
-        if not isinstance(branch, NifFormat.NiTriBasedGeom):
-            # keep recursing
-            return True
-
-        if branch in self.optimized:
-            # already optimized
-            return False
-    
-        # we found a geometry to optimize
-        # XXX todo
-        # get geometry data
-        geomdata = block.data
-        if not geomdata:
-            self.optimized.append(block)
-            return False
-        # check radius
-        if geomdata.radius < self.THRESHOLD_RADIUS:
-            optimized_geometries.append(block)
-            return False
-        # radius is over the threshold, so re-organize the geometry
-        newblock = split(block, threshold_radius = THRESHOLD_RADIUS)
-        # replace block with newblock everywhere
-        data.replace_global_node(block, newblock)
+    @staticmethod
+    def _resize(data, num_vertices):
+        """Set the number of vertices of geometry data, and resize all
+        per vertex arrays.
+        """
+        data.num_vertices = num_vertices
+        data.vertices.update_size()
+        data.normals.update_size()
+        data.vertex_colors.update_size()
+        data.uv_sets.update_size()
+        data.tangents.update_size()
+        data.bitangents.update_size()
 
-        self.optimized.append(block)
+    def split(self, geom):
+        """Split a NiTriBasedGeom block into NiTriShape blocks. Returns
+        the list of pieces, which is just the geometry itself if it need
+        not be split.
+        """
+        data = geom.data
+        max_radius = getattr(self.toaster, "split_radius",
+                             self.THRESHOLD_RADIUS)
+        if not data or (data.num_vertices <= self.MAXVERTICES
+                        and data.radius <= max_radius):
+            return [geom]
+        if geom.controller:
+            # controllers target a single block, and a piece cannot
+            # animate its siblings
+            self.toaster.msg("cannot split geometry with controllers")
+            return [geom]
+        if isinstance(geom.skin_instance, NifFormat.BSDismemberSkinInstance):
+            self.toaster.msg("cannot split geometry with dismember skin")
+            return [geom]
+
+        verts = [(v.x, v.y, v.z) for v in data.vertices]
+        triangles = data.get_triangles()
+        chunks = pyffi.utils.split.get_chunks(
+            verts, triangles, max_vertices=self.MAXVERTICES,
+            max_radius=max_radius)
+        if len(chunks) < 2:
+            return [geom]
+        self.toaster.msg("splitting geometry into %i pieces" % len(chunks))
 
-        # stop recursing
-        return False
+        # copy old data
+        norms = [(n.x, n.y, n.z) for n in data.normals]
+        uvsets = [[(uv.u, uv.v) for uv in uvset] for uvset in data.uv_sets]
+        vcols = [(c.r, c.g, c.b, c.a) for c in data.vertex_colors]
+        # geometry data without vertices, copied for every piece
+        datatemplate = NifFormat.NiTriBasedGeomData().deepcopy(data)
+        self._resize(datatemplate, 0)
+        # tangent space extra data is recalculated for every piece
+        tangentspace = geom.find(
+            block_name=b'Tangent space (binormal & tangent vectors)',
+            block_type=NifFormat.NiBinaryExtraData)
+        # skin data without vertex weights, copied for every piece
+        skininst = geom.skin_instance
+        if skininst:
+            weights = geom.get_vertex_weights()
+            skintemplate = NifFormat.NiSkinData().deepcopy(skininst.data)
+            skintemplate.skin_partition = None
+            for bonedata in skintemplate.bone_list:
+                bonedata.num_vertices = 0
+                bonedata.vertex_weights.update_size()
+            has_skinpart = bool(skininst.skin_partition
+                                or skininst.data.skin_partition)
+
+        pieces = []
+        for chunk in chunks:
+            v_map_inverse, piecetriangles = pyffi.utils.split.get_chunk_map(
+                triangles, chunk)
+            piece = NifFormat.NiTriShape().deepcopy(
+                NifFormat.NiTriBasedGeom().deepcopy(geom))
+            piece.name = b"%s:%i" % (geom.name, len(pieces))
+            # only the first piece keeps the collision object
+            if pieces:
+                piece.collision_object = None
+            elif piece.collision_object:
+                piece.collision_object.target = piece
+            piece.data = NifFormat.NiTriShapeData().deepcopy(datatemplate)
+            piecedata = piece.data
+            self._resize(piecedata, len(v_map_inverse))
+            for v, old_i in zip(piecedata.vertices, v_map_inverse):
+                v.x, v.y, v.z = verts[old_i]
+            if piecedata.has_normals:
+                for n, old_i in zip(piecedata.normals, v_map_inverse):
+                    n.x, n.y, n.z = norms[old_i]
+            for uvset, olduvset in zip(piecedata.uv_sets, uvsets):
+                for uv, old_i in zip(uvset, v_map_inverse):
+                    uv.u, uv.v = olduvset[old_i]
+            if piecedata.has_vertex_colors:
+                for c, old_i in zip(piecedata.vertex_colors, v_map_inverse):
+                    c.r, c.g, c.b, c.a = vcols[old_i]
+            piecedata.set_triangles(piecetriangles)
+            piecedata.update_center_radius()
+
+            # update skin data
+            if skininst:
+                piece.skin_instance = skininst.__class__().deepcopy(skininst)
+                piece.skin_instance.skin_partition = None
+                skindata = NifFormat.NiSkinData().deepcopy(skintemplate)
+                piece.skin_instance.data = skindata
+                boneweights = [[] for bonedata in skindata.bone_list]
+                for i, old_i in enumerate(v_map_inverse):
+                    for bonenum, weight in weights[old_i]:
+                        boneweights[bonenum].append((i, weight))
+                for bonedata, w in zip(skindata.bone_list, boneweights):
+                    bonedata.num_vertices = len(w)
+                    bonedata.vertex_weights.update_size()
+                    for skinweight, (i, weight) in zip(
+                        bonedata.vertex_weights, w):
+                        skinweight.index = i
+                        skinweight.weight = weight
+                if has_skinpart:
+                    # use Oblivion settings
+                    piece.update_skin_partition(
+                        maxbonesperpartition = 18, maxbonespervertex = 4,
+                        stripify = True, verbose = 0)
+
+            # recalculate tangent space
+            if tangentspace:
+                piece.remove_extra_data(tangentspace)
+                piece.update_tangent_space(as_extra=True)
+            elif (data.num_uv_sets & 61440) or (data.bs_num_uv_sets & 61440):
+                piece.update_tangent_space(as_extra=False)
+            pieces.append(piece)
+        return pieces
 
+    def branchentry(self, branch):
+        if not isinstance(branch, NifFormat.NiNode):
+            # geometries are split by their parent
+            return False
+        children = []
+        is_split = False
+        for child in branch.get_children():
+            if not isinstance(child, NifFormat.NiTriBasedGeom):
+                children.append(child)
+                continue
+            for geom, pieces in self.optimized:
+                if geom is child:
+                    break
+            else:
+                pieces = self.split(child)
+                self.optimized.append((child, pieces))
+            if len(pieces) > 1:
+                is_split = True
+            children.extend(pieces)
+        if is_split:
+            branch.set_children(children)
+            self.changed = True
+        # keep recursing
+        return True
 
 class SpellDelUnusedBones(pyffi.spells.nif.NifSpell):
     """Remove empty and duplicate entries in reference lists."""
@@ -641,10 +676,9 @@ class SpellDelUnusedBones(pyffi.spells.nif.NifSpell):
     def dataentry(self):
         # make list of used bones
         self._used_bones = set()
-        for branch in self.data.get_global_iterator():
-            if isinstance(branch, NifFormat.NiGeometry):
-                if branch.skin_instance:
-                    self._used_bones |= set(branch.skin_instance.bones)
+        for branch in self.data.blocks_of_type(NifFormat.NiGeometry):
+            if branch.skin_instance:
+                self._used_bones |= set(branch.skin_instance.bones)
         return True
 
     def branchinspect(self, branch):
@@ -690,6 +724,100 @@ class SpellReduceGeometry(SpellOptimizeGeometry):
             cls.VCOLPRECISION = max(precision, 0)
             return True
 
+class SpellSimplifyGeometry(SpellOptimizeGeometry):
+    """Reduce triangles of all geometries:
+      - remove duplicate vertices
+      - collapse edges by quadric error (see :mod:`pyffi.utils.simplify`)
+      - stripify if strips are long enough
+      - recalculate skin partition
+      - recalculate tangent space
+    """
+
+    SPELLNAME = "opt_simplifygeometry"
+    READONLY = False
+
+    # spell parameters
+    RATIO = 0.5
+    MAXERROR = None
+
+    @classmethod
+    def toastentry(cls, toaster):
+        if not toaster.options["arg"]:
+            toaster.logger.warn(
+                "must specify fraction of triangles to keep as argument "
+                "(e.g. 0.5 to halve the number of triangles), optionally "
+                "followed by the largest error relative to the size of "
+                "the geometry (e.g. 0.5,0.01) to apply spell")
+            return False
+        else:
+            args = toaster.options["arg"].split(",")
+            toaster.simplify_ratio = float(args[0])
+            toaster.simplify_max_error = (
+                float(args[1]) if len(args) > 1 else cls.MAXERROR)
+            return True
+
+    def branchentry(self, branch):
+        # remember the geometry, for its skin weights
+        self._geometry = branch
+        return SpellOptimizeGeometry.branchentry(self, branch)
+
+    def optimize_vertices(self, data):
+        v_map, v_map_inverse = SpellOptimizeGeometry.optimize_vertices(
+            self, data)
+        self.toaster.msg("collapsing edges")
+        # attributes of the unique vertices
+        verts = [(v.x, v.y, v.z) for v in data.vertices]
+        attributes = []
+        if data.has_normals:
+            attributes.append([(n.x, n.y, n.z) for n in data.normals])
+        for uvset in data.uv_sets:
+            attributes.append([(uv.u, uv.v) for uv in uvset])
+        if data.has_vertex_colors:
+            attributes.append([(c.r, c.g, c.b, c.a)
+                               for c in data.vertex_colors])
+        groups = None
+        max_groups = None
+        geom = self._geometry
+        if geom.skin_instance:
+            weights = geom.get_vertex_weights()
+            num_bones = geom.skin_instance.data.num_bones
+            skinweights = [[0.0] * num_bones for weightlist in weights]
+            for row, weightlist in zip(skinweights, weights):
+                for bonenum, weight in weightlist:
+                    row[bonenum] = weight
+            attributes.append(skinweights)
+            # the skin partition keeps only the strongest bones of each
+            # vertex; the triangles around each vertex are kept within
+            # the bones of a single partition
+            groups = [set(bonenum for bonenum, weight in
+                          sorted(weightlist, key=lambda x: x[1],
+                                 reverse=True)[:self.MAXBONESPERVERTEX])
+                      for weightlist in weights]
+            max_groups = self.MAXBONESPERPARTITION
+        # simplify the mesh of unique vertices
+        c_map, triangles = pyffi.utils.simplify.simplify(
+            [verts[i] for i in v_map_inverse],
+            [tuple(v_map[i] for i in tri) for tri in data.get_triangles()],
+            attributes=[[rows[i] for i in v_map_inverse]
+                        for rows in attributes],
+            ratio=getattr(self.toaster, "simplify_ratio", self.RATIO),
+            max_error=getattr(self.toaster, "simplify_max_error",
+                              self.MAXERROR),
+            groups=(None if groups is None
+                    else [groups[i] for i in v_map_inverse]),
+            max_groups=max_groups)
+        self.toaster.msg("(num triangles was %i and is now %i)"
+                         % (data.num_triangles, len(triangles)))
+        # store triangles with old vertex indices; these are mapped
+        # to the new indices along with the vertices
+        data.set_triangles([tuple(v_map_inverse[i] for i in tri)
+                            for tri in triangles])
+        # combine the maps
+        c_map_inverse = sorted(set(c_map))
+        rank = dict((i, k) for k, i in enumerate(c_map_inverse))
+        return ([rank[c_map[i]] for i in v_map],
+                [v_map_inverse[i] for i in c_map_inverse])
+
 class SpellOptimizeCollisionGeometry(pyffi.spells.nif.NifSpell):
     """Optimize collision geometries by removing duplicate vertices."""
 
@@ -724,8 +852,8 @@ class SpellOptimizeCollisionGeometry(pyffi.spells.nif.NifSpell):
         data = shape.data
 
         self.toaster.msg(_("removing duplicate vertices"))
-        v_map, v_map_inverse = unique_map(
-            shape.get_vertex_hash_generator(self.VERTEXPRECISION))
+        v_map, v_map_inverse = shape.get_vertex_unique_map(
+            self.VERTEXPRECISION)
         
         new_numvertices = len(v_map_inverse)
         self.toaster.msg(_("(num vertices in collision shape was %i and is now %i)")
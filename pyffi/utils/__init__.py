@@ -161,6 +161,34 @@ def unique_map(hash_generator):
             hash_map.append(hash_index)
     return hash_map, hash_map_inverse
 
+def find_first_difference(buf1, buf2, chunk_size=65536):
+    """Return the offset of the first byte where two buffers differ,
+    or ``None`` if the buffers are identical. If one buffer is a
+    prefix of the other, then the length of the shortest buffer is
+    returned. Buffers are compared chunk by chunk, so only the first
+    chunk which differs is compared byte by byte.
+
+    >>> find_first_difference(b"abcdef", b"abcdef") is None
+    True
+    >>> find_first_difference(b"abcdef", b"abcxef", chunk_size=2)
+    3
+    >>> find_first_difference(b"abc", b"abcdef")
+    3
+    >>> find_first_difference(b"", b"") is None
+    True
+    """
+    size = min(len(buf1), len(buf2))
+    for start in range(0, size, chunk_size):
+        chunk1 = buf1[start:start + chunk_size]
+        chunk2 = buf2[start:start + chunk_size]
+        if chunk1 != chunk2:
+            for offset, (byte1, byte2) in enumerate(zip(chunk1, chunk2)):
+                if byte1 != byte2:
+                    return start + offset
+    if len(buf1) != len(buf2):
+        return size
+    return None
+
 if __name__=='__main__':
     import doctest
     doctest.testmod()
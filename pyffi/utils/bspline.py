@@ -0,0 +1,176 @@
+"""Codec and evaluator for compressed B-spline control points.
+
+B-spline interpolators store their control points in a single list,
+either as floats, or compressed to shorts. A compressed value ``x``
+stands for ``bias + x * multiplier / 32767.0``, so the bias is the
+center and the multiplier is half the range of the values.
+
+If numpy is available, the functions below process entire ranges of
+control points at once, and return arrays; otherwise, they return
+lists of tuples, which hold the same values.
+
+>>> shorts, bias, multiplier = encode_comp([(1, 2), (4, 3)])
+>>> shorts, bias, multiplier
+([-32767, -10922, 32767, 10922], 2.5, 1.5)
+>>> [tuple(round(float(x), 3) for x in point)
+...  for point in decode_comp(shorts, 2, bias, multiplier)]
+[(1.0, 2.0), (4.0, 3.0)]
+>>> points = [(0.0, 1.0), (1.0, 1.0), (2.0, 1.0), (3.0, 1.0), (4.0, 1.0)]
+>>> [tuple(round(float(x), 3) for x in point)
+...  for point in evaluate(points, [0.0, 0.5, 1.0], 0.0, 1.0)]
+[(0.0, 1.0), (2.0, 1.0), (4.0, 1.0)]
+"""
+
+# ***** BEGIN LICENSE BLOCK *****
+#
+# Copyright (c) 2007-2009, Python File Format Interface
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#
+#    * Redistributions in binary form must reproduce the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer in the documentation and/or other materials provided
+#      with the distribution.
+#
+#    * Neither the name of the Python File Format Interface
+#      project nor the names of its contributors may be used to endorse
+#      or promote products derived from this software without specific
+#      prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# ***** END LICENSE BLOCK *****
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+DEGREE = 3
+"""Degree of the B-splines in nif files."""
+
+def decode_comp(shorts, element_size, bias, multiplier):
+    """Decompress a flat list of shorts into control points.
+
+    :param shorts: The compressed values.
+    :param element_size: Number of values per control point.
+    :param bias: Value bias.
+    :param multiplier: Value multiplier.
+    :return: The control points, one per row.
+    """
+    if numpy is not None:
+        values = numpy.asarray(shorts, dtype=float).reshape(-1, element_size)
+        return bias + values * multiplier / 32767.0
+    return [tuple(bias + x * multiplier / 32767.0
+                  for x in shorts[i:i + element_size])
+            for i in range(0, len(shorts), element_size)]
+
+def encode_comp(points):
+    """Compress control points into a flat list of shorts.
+
+    :param points: The control points, one per row.
+    :return: The compressed values, the bias, and the multiplier.
+    """
+    if numpy is not None:
+        values = numpy.asarray(points, dtype=float)
+        maxvalue = float(values.max())
+        minvalue = float(values.min())
+    else:
+        maxvalue = max(max(point) for point in points)
+        minvalue = min(min(point) for point in points)
+    bias = 0.5 * (maxvalue + minvalue)
+    if maxvalue > minvalue:
+        multiplier = 0.5 * (maxvalue - minvalue)
+    else:
+        # no need to compress in this case
+        multiplier = 1.0
+    if numpy is not None:
+        shorts = (32767 * (values - bias) / multiplier).astype(int)
+        return shorts.ravel().tolist(), bias, multiplier
+    return ([int(32767 * (x - bias) / multiplier)
+             for point in points for x in point],
+            bias, multiplier)
+
+def _get_spans(num_points, degree, start_time, stop_time, times):
+    """Map times to knot spans and spline parameters, for an open
+    uniform knot vector. For internal use only."""
+    num_spans = num_points - degree
+    scale = num_spans / float(stop_time - start_time)
+    if numpy is not None:
+        params = numpy.clip(
+            (numpy.asarray(times, dtype=float) - start_time) * scale,
+            0, num_spans)
+        spans = numpy.minimum(params.astype(int), num_spans - 1)
+        return spans, params
+    params = [min(max((time - start_time) * scale, 0), num_spans)
+              for time in times]
+    return [min(int(param), num_spans - 1) for param in params], params
+
+def evaluate(points, times, start_time, stop_time, degree=DEGREE):
+    """Evaluate the open uniform B-spline with the given control
+    points at the given times, using de Boor's algorithm. The curve
+    starts at the first control point at C{start_time}, and ends at
+    the last one at C{stop_time}.
+
+    :param points: The control points, one per row; rows may also be
+        single floats.
+    :param times: The times at which to evaluate the curve.
+    :param start_time: Start time of the curve.
+    :param stop_time: Stop time of the curve.
+    :param degree: Degree of the curve; lowered if there are too
+        few control points.
+    :return: The curve values, one row per time.
+    """
+    degree = min(degree, len(points) - 1)
+    if degree <= 0:
+        return [points[0] for time in times]
+    spans, params = _get_spans(
+        len(points), degree, start_time, stop_time, times)
+    # the knot at index i is clamp(i - degree, 0, num_spans), so with
+    # knot span k (counted from the first span) the de Boor points are
+    # the control points k up to k + degree
+    num_spans = len(points) - degree
+    if numpy is not None:
+        points = numpy.asarray(points, dtype=float)
+        d = [points[spans + j] for j in range(degree + 1)]
+        for r in range(1, degree + 1):
+            for j in range(degree, r - 1, -1):
+                left = numpy.clip(spans + j - degree, 0, num_spans)
+                right = numpy.clip(spans + j + 1 - r, 0, num_spans)
+                alpha = (params - left) / (right - left)
+                if points.ndim > 1:
+                    alpha = alpha[:, None]
+                d[j] = (1 - alpha) * d[j - 1] + alpha * d[j]
+        return d[degree]
+    result = []
+    for span, param in zip(spans, params):
+        d = [points[span + j] for j in range(degree + 1)]
+        scalar = not isinstance(d[0], (tuple, list))
+        if scalar:
+            d = [(x,) for x in d]
+        for r in range(1, degree + 1):
+            for j in range(degree, r - 1, -1):
+                left = min(max(span + j - degree, 0), num_spans)
+                right = min(max(span + j + 1 - r, 0), num_spans)
+                alpha = (param - left) / float(right - left)
+                d[j] = tuple((1 - alpha) * x + alpha * y
+                             for x, y in zip(d[j - 1], d[j]))
+        result.append(d[degree][0] if scalar else d[degree])
+    return result
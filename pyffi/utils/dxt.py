@@ -0,0 +1,765 @@
+"""Block compression (DXT1, DXT3, and DXT5) and mipmap generation.
+
+Images are passed around as ``bytes`` with four channels (red, green,
+blue, alpha) per pixel, rows from top to bottom. Compressed images are
+``bytes`` as stored in DDS files: a sequence of blocks of 4x4 pixels,
+rows of blocks from top to bottom.
+
+The encoder picks the endpoints of each block from the bounding box of
+its colors, along the diagonal which matches the sign of the color
+covariance, inset by a sixteenth of the range to reduce the error at
+the extremes. Each pixel then gets the nearest palette entry. All
+arithmetic is done on integers, so the numpy implementation, which
+processes all blocks at once, and the pure Python implementation give
+identical results.
+
+Mipmaps are computed with a separable box or Kaiser windowed sinc
+filter, again in integer arithmetic, each level from the previous one.
+"""
+
+# ***** BEGIN LICENSE BLOCK *****
+#
+# Copyright (c) 2007-2009, Python File Format Interface
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#
+#    * Redistributions in binary form must reproduce the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer in the documentation and/or other materials provided
+#      with the distribution.
+#
+#    * Neither the name of the Python File Format Interface
+#      project nor the names of its contributors may be used to endorse
+#      or promote products derived from this software without specific
+#      prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# ***** END LICENSE BLOCK *****
+
+import math
+import struct
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+BLOCK_SIZE = {"DXT1": 8, "DXT3": 16, "DXT5": 16}
+"""Number of bytes of a block of 4x4 pixels, for each format."""
+
+def _get_kaiser_weights(alpha=4.0, taps=8, bits=14):
+    """Integer weights of a Kaiser windowed sinc filter which halves
+    the resolution. The weights sum to ``2 ** bits``.
+    """
+    def bessel_i0(x):
+        total = 1.0
+        term = 1.0
+        for k in range(1, 20):
+            term *= (0.5 * x / k) ** 2
+            total += term
+        return total
+    weights = []
+    for j in range(taps):
+        # distance to the center, in pixels of the halved image
+        x = (j - 0.5 * (taps - 1)) / 2.0
+        sinc = math.sin(math.pi * x) / (math.pi * x)
+        window = bessel_i0(
+            alpha * math.sqrt(max(0.0, 1.0 - (4.0 * x / taps) ** 2)))
+        weights.append(sinc * window / bessel_i0(alpha))
+    total = sum(weights)
+    weights = [int(round(w * (1 << bits) / total)) for w in weights]
+    weights[taps // 2] += (1 << bits) - sum(weights)
+    return weights
+
+FILTERS = {
+    "box": (0, [1, 1], 1),
+    "kaiser": (-3, _get_kaiser_weights(), 14),
+    }
+"""For each mipmap filter, the offset of the first tap relative to twice
+the destination pixel index, the integer weights, and the number of
+bits to shift the weighted sum by."""
+
+def get_level_sizes(width, height, num_levels=None):
+    """Return the width and height of every level of a mipmap chain.
+
+    >>> get_level_sizes(60, 20)
+    [(60, 20), (30, 10), (15, 5), (7, 2), (3, 1), (1, 1)]
+    >>> get_level_sizes(60, 20, 2)
+    [(60, 20), (30, 10)]
+
+    :param width: The width of the first level.
+    :type width: ``int``
+    :param height: The height of the first level.
+    :type height: ``int``
+    :param num_levels: The number of levels, or ``None`` for a full
+        chain, down to 1x1.
+    :type num_levels: ``int``
+    :return: The size of each level.
+    :rtype: ``list`` of ``tuple`` of ``int``
+    """
+    sizes = [(width, height)]
+    while ((num_levels is None and (width > 1 or height > 1))
+           or (num_levels is not None and len(sizes) < num_levels)):
+        width = max(1, width // 2)
+        height = max(1, height // 2)
+        sizes.append((width, height))
+    return sizes
+
+def get_size(width, height, fmt):
+    """Return the number of bytes of a compressed image.
+
+    >>> get_size(60, 20, "DXT1")
+    600
+    >>> get_size(1, 1, "DXT5")
+    16
+
+    :param width: The width of the image.
+    :type width: ``int``
+    :param height: The height of the image.
+    :type height: ``int``
+    :param fmt: The format: ``"DXT1"``, ``"DXT3"``, or ``"DXT5"``.
+    :type fmt: ``str``
+    :return: The number of bytes.
+    :rtype: ``int``
+    """
+    return ((width + 3) // 4) * ((height + 3) // 4) * BLOCK_SIZE[fmt]
+
+def _unpack_565(color):
+    """Expand a 16 bit color to 8 bits per channel."""
+    red = (color >> 11) & 31
+    green = (color >> 5) & 63
+    blue = color & 31
+    return ((red << 3) | (red >> 2),
+            (green << 2) | (green >> 4),
+            (blue << 3) | (blue >> 2))
+
+def _pack_565(red, green, blue):
+    """Round a color with 8 bits per channel to 16 bits."""
+    return (((red * 31 + 127) // 255) << 11
+            | ((green * 63 + 127) // 255) << 5
+            | ((blue * 31 + 127) // 255))
+
+def _get_color_palette(color0, color1, four_colors):
+    """Return the four RGBA palette entries of a color block."""
+    rgb0 = _unpack_565(color0)
+    rgb1 = _unpack_565(color1)
+    if four_colors:
+        rgb2 = tuple((2 * c0 + c1 + 1) // 3 for c0, c1 in zip(rgb0, rgb1))
+        rgb3 = tuple((c0 + 2 * c1 + 1) // 3 for c0, c1 in zip(rgb0, rgb1))
+        return [rgb0 + (255,), rgb1 + (255,), rgb2 + (255,), rgb3 + (255,)]
+    else:
+        rgb2 = tuple((c0 + c1) // 2 for c0, c1 in zip(rgb0, rgb1))
+        return [rgb0 + (255,), rgb1 + (255,), rgb2 + (255,), (0, 0, 0, 0)]
+
+def _get_alpha_palette(alpha0, alpha1):
+    """Return the eight palette entries of a DXT5 alpha block."""
+    if alpha0 > alpha1:
+        return [alpha0, alpha1] + [
+            ((8 - i) * alpha0 + (i - 1) * alpha1 + 3) // 7
+            for i in range(2, 8)]
+    else:
+        return [alpha0, alpha1] + [
+            ((6 - i) * alpha0 + (i - 1) * alpha1 + 2) // 5
+            for i in range(2, 6)] + [0, 255]
+
+def _get_blocks(rgba, width, height):
+    """Yield the 16 RGBA pixels of each block, in block order. Pixels
+    outside the image repeat the nearest edge pixel.
+    """
+    for y in range(0, height, 4):
+        rows = [min(y + j, height - 1) for j in range(4)]
+        for x in range(0, width, 4):
+            cols = [min(x + i, width - 1) for i in range(4)]
+            yield [tuple(rgba[4 * (row * width + col):4 * (row * width + col)
+                              + 4])
+                   for row in rows for col in cols]
+
+def _get_blocks_numpy(rgba, width, height):
+    """Return the pixels of all blocks, as an array of shape
+    (number of blocks, 16, 4).
+    """
+    pixels = numpy.frombuffer(rgba, dtype=numpy.uint8).reshape(
+        height, width, 4)
+    pad_height = (-height) % 4
+    pad_width = (-width) % 4
+    if pad_height or pad_width:
+        pixels = numpy.pad(
+            pixels, ((0, pad_height), (0, pad_width), (0, 0)), mode="edge")
+    rows, cols = pixels.shape[0] // 4, pixels.shape[1] // 4
+    return pixels.reshape(rows, 4, cols, 4, 4).transpose(
+        0, 2, 1, 3, 4).reshape(-1, 16, 4).astype(numpy.int32)
+
+def _set_blocks(blocks, width, height):
+    """Assemble RGBA pixels from blocks of 16 pixels each."""
+    rgba = bytearray(4 * width * height)
+    blocks = iter(blocks)
+    for y in range(0, height, 4):
+        for x in range(0, width, 4):
+            block = next(blocks)
+            for j in range(min(4, height - y)):
+                for i in range(min(4, width - x)):
+                    pos = 4 * ((y + j) * width + x + i)
+                    rgba[pos:pos + 4] = bytes(block[4 * j + i])
+    return bytes(rgba)
+
+def _set_blocks_numpy(blocks, width, height):
+    """Implementation of :func:`_set_blocks` using numpy."""
+    rows, cols = (height + 3) // 4, (width + 3) // 4
+    pixels = blocks.reshape(rows, cols, 4, 4, 4).transpose(
+        0, 2, 1, 3, 4).reshape(4 * rows, 4 * cols, 4)
+    return numpy.ascontiguousarray(
+        pixels[:height, :width], dtype=numpy.uint8).tobytes()
+
+def _decode_color_block(buf, pos, four_colors):
+    """Decode the color block at the given position."""
+    color0, color1, indices = struct.unpack("<HHI", buf[pos:pos + 8])
+    palette = _get_color_palette(
+        color0, color1, four_colors or color0 > color1)
+    return [palette[(indices >> (2 * i)) & 3] for i in range(16)]
+
+def _decode(buf, width, height, fmt):
+    """Pure Python implementation of :func:`decode`."""
+    block_size = BLOCK_SIZE[fmt]
+    blocks = []
+    for pos in range(0, get_size(width, height, fmt), block_size):
+        if fmt == "DXT1":
+            blocks.append(_decode_color_block(buf, pos, False))
+            continue
+        colors = _decode_color_block(buf, pos + 8, True)
+        if fmt == "DXT3":
+            bits, = struct.unpack("<Q", buf[pos:pos + 8])
+            alphas = [17 * ((bits >> (4 * i)) & 15) for i in range(16)]
+        else:
+            palette = _get_alpha_palette(buf[pos], buf[pos + 1])
+            bits = int.from_bytes(buf[pos + 2:pos + 8], "little")
+            alphas = [palette[(bits >> (3 * i)) & 7] for i in range(16)]
+        blocks.append([color[:3] + (alpha,)
+                       for color, alpha in zip(colors, alphas)])
+    return _set_blocks(blocks, width, height)
+
+def _decode_color_blocks_numpy(colors, four_colors):
+    """Decode an array of color blocks, of shape (number of blocks, 8)
+    and type uint8, to an array of shape (number of blocks, 16, 4).
+    """
+    color0 = colors[:, 0].astype(numpy.int64) | (colors[:, 1].astype(
+        numpy.int64) << 8)
+    color1 = colors[:, 2].astype(numpy.int64) | (colors[:, 3].astype(
+        numpy.int64) << 8)
+    indices = numpy.ascontiguousarray(colors[:, 4:8]).view("<u4")[:, 0]
+    indices = (indices[:, numpy.newaxis] >> (2 * numpy.arange(16))) & 3
+    rgb0 = _unpack_565_numpy(color0).T
+    rgb1 = _unpack_565_numpy(color1).T
+    is_four = numpy.ones(len(colors), dtype=bool) if four_colors \
+        else color0 > color1
+    palette = numpy.empty((len(colors), 4, 4), dtype=numpy.int64)
+    palette[:, 0, :3] = rgb0
+    palette[:, 1, :3] = rgb1
+    palette[:, :, 3] = 255
+    palette[:, 2, :3] = numpy.where(
+        is_four[:, numpy.newaxis], (2 * rgb0 + rgb1 + 1) // 3,
+        (rgb0 + rgb1) // 2)
+    palette[:, 3, :3] = numpy.where(
+        is_four[:, numpy.newaxis], (rgb0 + 2 * rgb1 + 1) // 3, 0)
+    palette[:, 3, 3] = numpy.where(is_four, 255, 0)
+    return numpy.take_along_axis(
+        palette, indices[:, :, numpy.newaxis].astype(numpy.intp), axis=1)
+
+def _unpack_565_numpy(color):
+    """Implementation of :func:`_unpack_565` using numpy. Returns an
+    array of shape (3, ...).
+    """
+    red = (color >> 11) & 31
+    green = (color >> 5) & 63
+    blue = color & 31
+    return numpy.stack([(red << 3) | (red >> 2),
+                        (green << 2) | (green >> 4),
+                        (blue << 3) | (blue >> 2)])
+
+def _get_alpha_palette_numpy(alpha0, alpha1):
+    """Implementation of :func:`_get_alpha_palette` using numpy."""
+    i = numpy.arange(8)
+    eight = ((8 - i) * alpha0[:, numpy.newaxis]
+             + (i - 1) * alpha1[:, numpy.newaxis] + 3) // 7
+    six = ((6 - i) * alpha0[:, numpy.newaxis]
+           + (i - 1) * alpha1[:, numpy.newaxis] + 2) // 5
+    six[:, 6] = 0
+    six[:, 7] = 255
+    palette = numpy.where((alpha0 > alpha1)[:, numpy.newaxis], eight, six)
+    palette[:, 0] = alpha0
+    palette[:, 1] = alpha1
+    return palette
+
+def _decode_numpy(buf, width, height, fmt):
+    """Implementation of :func:`decode` using numpy."""
+    block_size = BLOCK_SIZE[fmt]
+    data = numpy.frombuffer(
+        buf, dtype=numpy.uint8,
+        count=get_size(width, height, fmt)).reshape(-1, block_size)
+    if fmt == "DXT1":
+        return _set_blocks_numpy(
+            _decode_color_blocks_numpy(data, False), width, height)
+    blocks = _decode_color_blocks_numpy(data[:, 8:], True)
+    if fmt == "DXT3":
+        bits = numpy.ascontiguousarray(data[:, :8]).view("<u8")[:, 0]
+        blocks[:, :, 3] = 17 * (
+            (bits[:, numpy.newaxis] >> numpy.uint64(4)
+             * numpy.arange(16, dtype=numpy.uint64)) & numpy.uint64(15))
+    else:
+        palette = _get_alpha_palette_numpy(
+            data[:, 0].astype(numpy.int64), data[:, 1].astype(numpy.int64))
+        bits = numpy.zeros(len(data), dtype=numpy.uint64)
+        for k in range(6):
+            bits |= data[:, 2 + k].astype(numpy.uint64) << numpy.uint64(8 * k)
+        indices = (bits[:, numpy.newaxis] >> numpy.uint64(3)
+                   * numpy.arange(16, dtype=numpy.uint64)) & numpy.uint64(7)
+        blocks[:, :, 3] = numpy.take_along_axis(
+            palette, indices.astype(numpy.intp), axis=1)
+    return _set_blocks_numpy(blocks, width, height)
+
+def decode(buf, width, height, fmt, use_numpy=True):
+    """Decode a compressed image.
+
+    >>> decode(b"\\x00\\xf8\\x1f\\x00TTTT", 2, 2, "DXT1")
+    b'\\xff\\x00\\x00\\xff\\x00\\x00\\xff\\xff\\xff\\x00\\x00\\xff\\x00\\x00\\xff\\xff'
+
+    :param buf: The compressed image.
+    :type buf: ``bytes``
+    :param width: The width of the image.
+    :type width: ``int``
+    :param height: The height of the image.
+    :type height: ``int``
+    :param fmt: The format: ``"DXT1"``, ``"DXT3"``, or ``"DXT5"``.
+    :type fmt: ``str``
+    :param use_numpy: Whether to use numpy, if it is available.
+    :type use_numpy: ``bool``
+    :return: The RGBA pixels.
+    :rtype: ``bytes``
+    """
+    if len(buf) < get_size(width, height, fmt):
+        raise ValueError(
+            "expected %i bytes of %s data, but got %i"
+            % (get_size(width, height, fmt), fmt, len(buf)))
+    if use_numpy and numpy is not None:
+        return _decode_numpy(buf, width, height, fmt)
+    else:
+        return _decode(buf, width, height, fmt)
+
+_WEIGHTS = (3, 0, 2, 1)
+"""Weight of the first endpoint, in thirds, for each index of a four
+color block."""
+
+def _div_round(num, den):
+    """Divide, round to the nearest integer, and clamp to a byte."""
+    return min(max((2 * num + den) // (2 * den), 0), 255)
+
+def _fit_color_block(pixels, is_transparent, highs, lows):
+    """Quantize the endpoints of a color block, and find the nearest
+    palette entry for every pixel.
+
+    :return: The two 16 bit colors, the palette indices, and the
+        squared error.
+    """
+    color0 = _pack_565(*highs)
+    color1 = _pack_565(*lows)
+    if (color0 < color1) != is_transparent:
+        color0, color1 = color1, color0
+    if not is_transparent and color0 == color1:
+        palette = _get_color_palette(color0, color1, True)
+        return color0, color1, [0] * 16, sum(
+            sum((pixel[k] - palette[0][k]) ** 2 for k in range(3))
+            for pixel in pixels)
+    palette = _get_color_palette(color0, color1, not is_transparent)
+    candidates = range(3 if is_transparent else 4)
+    indices = []
+    error = 0
+    for pixel in pixels:
+        if is_transparent and pixel[3] < 128:
+            indices.append(3)
+            continue
+        distances = [sum((pixel[k] - palette[j][k]) ** 2 for k in range(3))
+                     for j in candidates]
+        index = distances.index(min(distances))
+        indices.append(index)
+        error += distances[index]
+    return color0, color1, indices, error
+
+def _encode_color_block(pixels, allow_alpha):
+    """Encode the colors of 16 RGBA pixels as a color block."""
+    is_transparent = allow_alpha and any(pixel[3] < 128 for pixel in pixels)
+    opaque = [pixel for pixel in pixels
+              if not (is_transparent and pixel[3] < 128)]
+    if not opaque:
+        return struct.pack("<HHI", 0, 0, 0xffffffff)
+    lows = [min(pixel[k] for pixel in opaque) for k in range(3)]
+    highs = [max(pixel[k] for pixel in opaque) for k in range(3)]
+    ranges = [high - low for low, high in zip(lows, highs)]
+    ref = ranges.index(max(ranges))
+    # inset the bounding box, and flip the channels which decrease along
+    # the reference channel
+    for k in range(3):
+        centered = [2 * pixel[k] - lows[k] - highs[k] for pixel in opaque]
+        ref_centered = [2 * pixel[ref] - lows[ref] - highs[ref]
+                        for pixel in opaque]
+        covariance = sum(x * y for x, y in zip(centered, ref_centered))
+        inset = ranges[k] >> 4
+        lows[k] += inset
+        highs[k] -= inset
+        if covariance < 0:
+            lows[k], highs[k] = highs[k], lows[k]
+    color0, color1, indices, error = _fit_color_block(
+        pixels, is_transparent, highs, lows)
+    if not is_transparent:
+        # least squares fit of the endpoints to the chosen indices,
+        # in multiples of a third
+        weights = [_WEIGHTS[index] for index in indices]
+        aa = sum(w * w for w in weights)
+        ab = sum(w * (3 - w) for w in weights)
+        bb = sum((3 - w) * (3 - w) for w in weights)
+        det = aa * bb - ab * ab
+        if det:
+            highs = []
+            lows = []
+            for k in range(3):
+                xa = sum(w * pixel[k] for w, pixel in zip(weights, pixels))
+                xb = sum((3 - w) * pixel[k]
+                         for w, pixel in zip(weights, pixels))
+                highs.append(_div_round(3 * (bb * xa - ab * xb), det))
+                lows.append(_div_round(3 * (aa * xb - ab * xa), det))
+            fit = _fit_color_block(pixels, False, highs, lows)
+            if fit[3] < error:
+                color0, color1, indices, error = fit
+    bits = 0
+    for i, index in enumerate(indices):
+        bits |= index << (2 * i)
+    return struct.pack("<HHI", color0, color1, bits)
+
+def _encode_alpha_block(pixels, fmt):
+    """Encode the alpha of 16 RGBA pixels as a DXT3 or DXT5 alpha
+    block.
+    """
+    alphas = [pixel[3] for pixel in pixels]
+    if fmt == "DXT3":
+        bits = 0
+        for i, alpha in enumerate(alphas):
+            bits |= ((alpha * 15 + 127) // 255) << (4 * i)
+        return struct.pack("<Q", bits)
+    alpha0 = max(alphas)
+    alpha1 = min(alphas)
+    bits = 0
+    if alpha0 > alpha1:
+        palette = _get_alpha_palette(alpha0, alpha1)
+        for i, alpha in enumerate(alphas):
+            index = min(range(8), key=lambda j: abs(alpha - palette[j]))
+            bits |= index << (3 * i)
+    return bytes((alpha0, alpha1)) + bits.to_bytes(6, "little")
+
+def _encode(rgba, width, height, fmt):
+    """Pure Python implementation of :func:`encode`."""
+    chunks = []
+    for pixels in _get_blocks(rgba, width, height):
+        if fmt != "DXT1":
+            chunks.append(_encode_alpha_block(pixels, fmt))
+        chunks.append(_encode_color_block(pixels, fmt == "DXT1"))
+    return b"".join(chunks)
+
+def _fit_color_blocks_numpy(planes, is_opaque, is_transparent, highs, lows):
+    """Implementation of :func:`_fit_color_block` using numpy, for the
+    color channels of all blocks as an array of shape (3, number of
+    blocks, 16), and endpoints of shape (3, number of blocks).
+    """
+    color0 = _pack_565_numpy(highs)
+    color1 = _pack_565_numpy(lows)
+    swap = (color0 < color1) != is_transparent
+    color0, color1 = (numpy.where(swap, color1, color0),
+                      numpy.where(swap, color0, color1))
+    rgb0 = _unpack_565_numpy(color0)
+    rgb1 = _unpack_565_numpy(color1)
+    palette = [
+        rgb0, rgb1,
+        numpy.where(is_transparent, (rgb0 + rgb1) // 2,
+                    (2 * rgb0 + rgb1 + 1) // 3),
+        numpy.where(is_transparent, 0, (rgb0 + 2 * rgb1 + 1) // 3)]
+    # squared distance of every pixel to every palette entry
+    distances = numpy.empty((4,) + planes.shape[1:], dtype=numpy.int32)
+    for distance, entry in zip(distances, palette):
+        distance[...] = 0
+        for plane, value in zip(planes, entry):
+            diff = plane - value[:, numpy.newaxis]
+            diff *= diff
+            distance += diff
+    distances[3, is_transparent] = numpy.iinfo(numpy.int32).max
+    distances[1:, ~is_transparent & (color0 == color1)] = \
+        numpy.iinfo(numpy.int32).max
+    indices = numpy.argmin(distances, axis=0)
+    errors = numpy.where(
+        is_opaque, numpy.take_along_axis(
+            distances, indices[numpy.newaxis], axis=0)[0], 0).sum(axis=1)
+    indices[~is_opaque] = 3
+    return color0, color1, indices, errors
+
+def _encode_color_blocks_numpy(blocks, allow_alpha):
+    """Implementation of :func:`_encode_color_block` using numpy, for
+    an array of blocks of shape (number of blocks, 16, 4). Returns an
+    array of shape (number of blocks, 8) and type uint8.
+    """
+    planes = numpy.ascontiguousarray(blocks[:, :, :3].transpose(2, 0, 1))
+    is_transparent = numpy.zeros(len(blocks), dtype=bool)
+    if allow_alpha:
+        is_transparent = (blocks[:, :, 3] < 128).any(axis=1)
+    is_opaque = ~(is_transparent[:, numpy.newaxis] & (blocks[:, :, 3] < 128))
+    has_opaque = is_opaque.any(axis=1)
+    lows = numpy.where(is_opaque, planes, 255).min(axis=2)
+    highs = numpy.where(is_opaque, planes, 0).max(axis=2)
+    lows[:, ~has_opaque] = 0
+    highs[:, ~has_opaque] = 0
+    ranges = highs - lows
+    ref = numpy.argmax(ranges, axis=0)
+    # inset the bounding box, and flip the channels which decrease along
+    # the reference channel
+    centered = numpy.where(
+        is_opaque, 2 * planes - (lows + highs)[:, :, numpy.newaxis], 0)
+    ref_centered = numpy.take_along_axis(
+        centered, ref[numpy.newaxis, :, numpy.newaxis], axis=0)
+    covariance = (centered * ref_centered).sum(axis=2)
+    inset = ranges >> 4
+    lows, highs = lows + inset, highs - inset
+    flip = covariance < 0
+    lows, highs = numpy.where(flip, highs, lows), numpy.where(flip, lows, highs)
+    color0, color1, indices, errors = _fit_color_blocks_numpy(
+        planes, is_opaque, is_transparent, highs, lows)
+    # least squares fit of the endpoints to the chosen indices, in
+    # multiples of a third
+    weights = numpy.array(_WEIGHTS, dtype=numpy.int32)[indices]
+    aa = (weights * weights).sum(axis=1)
+    ab = (weights * (3 - weights)).sum(axis=1)
+    bb = ((3 - weights) * (3 - weights)).sum(axis=1)
+    det = aa * bb - ab * ab
+    refine = numpy.flatnonzero(~is_transparent & (det != 0))
+    if len(refine):
+        weights = weights[refine]
+        sub_planes = planes[:, refine]
+        xa = (weights * sub_planes).sum(axis=2)
+        xb = ((3 - weights) * sub_planes).sum(axis=2)
+        aa, ab, bb, det = aa[refine], ab[refine], bb[refine], det[refine]
+        highs = numpy.clip(
+            (6 * (bb * xa - ab * xb) + det) // (2 * det), 0, 255)
+        lows = numpy.clip(
+            (6 * (aa * xb - ab * xa) + det) // (2 * det), 0, 255)
+        fit = _fit_color_blocks_numpy(
+            sub_planes, is_opaque[refine], is_transparent[refine],
+            highs, lows)
+        better = fit[3] < errors[refine]
+        refine = refine[better]
+        color0[refine] = fit[0][better]
+        color1[refine] = fit[1][better]
+        indices[refine] = fit[2][better]
+    indices[~has_opaque] = 3
+    color0[~has_opaque] = 0
+    color1[~has_opaque] = 0
+    bits = (indices.astype(numpy.uint32) << (
+        2 * numpy.arange(16, dtype=numpy.uint32))).sum(
+            axis=1, dtype=numpy.uint32)
+    result = numpy.empty((len(blocks), 8), dtype=numpy.uint8)
+    result[:, 0:2] = color0.astype("<u2").view(numpy.uint8).reshape(-1, 2)
+    result[:, 2:4] = color1.astype("<u2").view(numpy.uint8).reshape(-1, 2)
+    result[:, 4:8] = bits.astype("<u4").view(numpy.uint8).reshape(-1, 4)
+    return result
+
+def _pack_565_numpy(rgb):
+    """Implementation of :func:`_pack_565` using numpy, for an array
+    of shape (3, ...).
+    """
+    return (((rgb[0] * 31 + 127) // 255) << 11
+            | ((rgb[1] * 63 + 127) // 255) << 5
+            | ((rgb[2] * 31 + 127) // 255))
+
+def _encode_alpha_blocks_numpy(blocks, fmt):
+    """Implementation of :func:`_encode_alpha_block` using numpy, for
+    an array of blocks of shape (number of blocks, 16, 4). Returns an
+    array of shape (number of blocks, 8) and type uint8.
+    """
+    alphas = numpy.ascontiguousarray(blocks[:, :, 3], dtype=numpy.int16)
+    if fmt == "DXT3":
+        nibbles = ((alphas * 15 + 127) // 255).astype(numpy.uint8)
+        return nibbles[:, 0::2] | (nibbles[:, 1::2] << 4)
+    alpha0 = alphas.max(axis=1)
+    alpha1 = alphas.min(axis=1)
+    palette = _get_alpha_palette_numpy(alpha0, alpha1).astype(numpy.int16)
+    # nearest palette entry, the first one on ties
+    best = numpy.abs(alphas - palette[:, 0, numpy.newaxis])
+    indices = numpy.zeros(alphas.shape, dtype=numpy.uint8)
+    for j in range(1, 8):
+        distance = numpy.abs(alphas - palette[:, j, numpy.newaxis])
+        is_better = distance < best
+        numpy.minimum(distance, best, out=best)
+        indices[is_better] = j
+    indices[alpha0 == alpha1] = 0
+    bits = numpy.zeros(len(blocks), dtype=numpy.uint64)
+    for i in range(16):
+        bits |= indices[:, i].astype(numpy.uint64) << numpy.uint64(3 * i)
+    result = numpy.empty((len(blocks), 8), dtype=numpy.uint8)
+    result[:, 0] = alpha0
+    result[:, 1] = alpha1
+    result[:, 2:8] = bits.astype("<u8").view(numpy.uint8).reshape(
+        -1, 8)[:, :6]
+    return result
+
+def _encode_numpy(rgba, width, height, fmt):
+    """Implementation of :func:`encode` using numpy."""
+    blocks = _get_blocks_numpy(rgba, width, height)
+    colors = _encode_color_blocks_numpy(blocks, fmt == "DXT1")
+    if fmt == "DXT1":
+        return colors.tobytes()
+    return numpy.hstack(
+        [_encode_alpha_blocks_numpy(blocks, fmt), colors]).tobytes()
+
+def encode(rgba, width, height, fmt, use_numpy=True):
+    """Compress an image.
+
+    >>> red_blue = b"\\xff\\x00\\x00\\xff\\x00\\x00\\xff\\xff"
+    >>> encode(red_blue * 2, 2, 2, "DXT1")
+    b'\\x00\\xf8\\x1f\\x00TTTT'
+    >>> encode(red_blue * 2, 2, 2, "DXT1", use_numpy=False)
+    b'\\x00\\xf8\\x1f\\x00TTTT'
+    >>> rgba = bytes(range(256)) * 4
+    >>> buf = encode(rgba, 16, 16, "DXT5")
+    >>> buf == encode(rgba, 16, 16, "DXT5", use_numpy=False)
+    True
+    >>> max(abs(x - y) for x, y in zip(rgba, decode(buf, 16, 16, "DXT5")))
+    14
+
+    :param rgba: The RGBA pixels.
+    :type rgba: ``bytes``
+    :param width: The width of the image.
+    :type width: ``int``
+    :param height: The height of the image.
+    :type height: ``int``
+    :param fmt: The format: ``"DXT1"``, ``"DXT3"``, or ``"DXT5"``.
+    :type fmt: ``str``
+    :param use_numpy: Whether to use numpy, if it is available.
+    :type use_numpy: ``bool``
+    :return: The compressed image.
+    :rtype: ``bytes``
+    """
+    if len(rgba) != 4 * width * height:
+        raise ValueError(
+            "expected %i bytes of RGBA data, but got %i"
+            % (4 * width * height, len(rgba)))
+    if use_numpy and numpy is not None:
+        return _encode_numpy(rgba, width, height, fmt)
+    else:
+        return _encode(rgba, width, height, fmt)
+
+def _downsample(lines, filter_):
+    """Halve the number of lines of an image, given as a list of lines
+    of RGBA pixel tuples.
+    """
+    first, weights, shift = FILTERS[filter_]
+    half = 1 << (shift - 1)
+    size = len(lines)
+    result = []
+    for i in range(size // 2):
+        sources = [lines[min(max(2 * i + first + j, 0), size - 1)]
+                   for j in range(len(weights))]
+        result.append([
+            tuple(min(max((sum(w * pixel[k] for w, pixel
+                               in zip(weights, pixels)) + half) >> shift,
+                          0), 255)
+                  for k in range(4))
+            for pixels in zip(*sources)])
+    return result
+
+def _downsample_numpy(pixels, axis, filter_):
+    """Implementation of :func:`_downsample` using numpy, for an array
+    of shape (height, width, channels).
+    """
+    first, weights, shift = FILTERS[filter_]
+    size = pixels.shape[axis]
+    targets = 2 * numpy.arange(size // 2)
+    total = 0
+    for j, weight in enumerate(weights):
+        sources = numpy.clip(targets + first + j, 0, size - 1)
+        total = total + weight * numpy.take(pixels, sources, axis=axis)
+    return numpy.clip((total + (1 << (shift - 1))) >> shift, 0, 255)
+
+def get_mipmaps(rgba, width, height, num_levels=None, filter_="box",
+                use_numpy=True):
+    """Compute a mipmap chain. Each level is computed from the previous
+    one, by filtering and halving the width and the height (unless they
+    are one already).
+
+    >>> rgba = bytes((0, 0, 0, 255, 255, 255, 255, 255)) * 2
+    >>> get_mipmaps(rgba, 2, 2)
+    [(2, 2, b'\\x00\\x00\\x00\\xff\\xff\\xff\\xff\\xff\\x00\\x00\\x00\\xff\\xff\\xff\\xff\\xff'), (1, 1, b'\\x80\\x80\\x80\\xff')]
+    >>> rgba = bytes(range(256)) * 64
+    >>> kaiser = get_mipmaps(rgba, 64, 64, filter_="kaiser")
+    >>> [(w, h) for w, h, level in kaiser]
+    [(64, 64), (32, 32), (16, 16), (8, 8), (4, 4), (2, 2), (1, 1)]
+    >>> kaiser == get_mipmaps(rgba, 64, 64, filter_="kaiser", use_numpy=False)
+    True
+
+    :param rgba: The RGBA pixels of the first level.
+    :type rgba: ``bytes``
+    :param width: The width of the first level.
+    :type width: ``int``
+    :param height: The height of the first level.
+    :type height: ``int``
+    :param num_levels: The number of levels, or ``None`` for a full
+        chain, down to 1x1.
+    :type num_levels: ``int``
+    :param filter_: The filter, ``"box"`` or ``"kaiser"``.
+    :type filter_: ``str``
+    :param use_numpy: Whether to use numpy, if it is available.
+    :type use_numpy: ``bool``
+    :return: The width, height, and RGBA pixels of each level, starting
+        with the given image.
+    :rtype: ``list`` of ``tuple``
+    """
+    if filter_ not in FILTERS:
+        raise ValueError("unknown mipmap filter %s" % filter_)
+    sizes = get_level_sizes(width, height, num_levels)
+    levels = [(width, height, bytes(rgba))]
+    if use_numpy and numpy is not None:
+        pixels = numpy.frombuffer(rgba, dtype=numpy.uint8).reshape(
+            height, width, 4).astype(numpy.int64)
+        for (old_width, old_height), (width, height) in zip(sizes, sizes[1:]):
+            if old_height > 1:
+                pixels = _downsample_numpy(pixels, 0, filter_)
+            if old_width > 1:
+                pixels = _downsample_numpy(pixels, 1, filter_)
+            levels.append(
+                (width, height, pixels.astype(numpy.uint8).tobytes()))
+    else:
+        rows = [[tuple(rgba[4 * (y * width + x):4 * (y * width + x) + 4])
+                 for x in range(width)] for y in range(height)]
+        for (old_width, old_height), (width, height) in zip(sizes, sizes[1:]):
+            if old_height > 1:
+                rows = _downsample(rows, filter_)
+            if old_width > 1:
+                cols = _downsample(list(zip(*rows)), filter_)
+                rows = [list(row) for row in zip(*cols)]
+            levels.append((width, height, bytes(
+                value for row in rows for pixel in row for value in pixel)))
+    return levels
+
+if __name__=='__main__':
+    import doctest
+    doctest.testmod()
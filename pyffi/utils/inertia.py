@@ -41,6 +41,11 @@ shapes."""
 import math
 from pyffi.utils.mathutils import *
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 # see http://en.wikipedia.org/wiki/List_of_moment_of_inertia_tensors
 
 def getMassInertiaSphere(radius, density = 1, solid = True):
@@ -106,6 +111,129 @@ def getMassInertiaCapsule(length, radius, density = 1, solid = True):
                     ( 0, inertia_yy, 0 ),
                     ( 0, 0, inertia_zz ) )
 
+# 120 times the covariance matrix of the canonical tetrahedron
+# (0,0,0),(1,0,0),(0,1,0),(0,0,1)
+# integrate(integrate(integrate(z*z, x=0..1-y-z), y=0..1-z), z=0..1) = 1/120
+# integrate(integrate(integrate(y*z, x=0..1-y-z), y=0..1-z), z=0..1) = 1/60
+COVARIANCE_CANONICAL = ( (2, 1, 1),
+                         (1, 2, 1),
+                         (1, 1, 2) )
+COVARIANCE_CORRECTION = 1.0/120
+
+def _get_mass_center_covariance(vertices, triangles, solid):
+    """Return mass, center of gravity, and covariance matrix around the
+    origin of a polyhedron, for unit density. The center and
+    covariance are ``None`` if the mass is nearly zero. For internal
+    use only.
+    """
+    covariances = []
+    masses = []
+    centers = []
+
+    # for each triangle
+    # construct a tetrahedron from triangle + (0,0,0)
+    # find its matrix, mass, and center (for density = 1, will be corrected at
+    # the end of the algorithm)
+    for triangle in triangles:
+        # get vertices
+        vert0, vert1, vert2 = operator.itemgetter(*triangle)(vertices)
+
+        # construct a transform matrix that converts the canonical tetrahedron
+        # into (0,0,0),vert0,vert1,vert2
+        transform_transposed = ( vert0, vert1, vert2 )
+        transform = matTransposed(transform_transposed)
+
+        # find the covariance matrix of the transformed tetrahedron/triangle
+        if solid:
+            # we shall be needing the determinant more than once, so
+            # precalculate it
+            determinant = matDeterminant(transform)
+            # C' = det(A) * A * C * A^T
+            covariances.append(
+                matscalarMul(
+                    matMul(matMul(transform,
+                                  COVARIANCE_CANONICAL),
+                           transform_transposed),
+                    determinant))
+            # m = det(A) / 6.0
+            masses.append(determinant / 6.0)
+            # find center of gravity of the tetrahedron
+            centers.append(tuple( 0.25 * sum(vert[i]
+                                             for vert in (vert0, vert1, vert2))
+                                  for i in range(3) ))
+        else:
+            # find center of gravity of the triangle
+            centers.append(tuple( sum(vert[i]
+                                      for vert in (vert0, vert1, vert2)) / 3.0
+                                  for i in range(3) ))
+            # find mass of triangle
+            # mass is surface, which is half the norm of cross product
+            # of two edges
+            masses.append(
+                vecNorm(vecCrossProduct(
+                    vecSub(vert1, vert0), vecSub(vert2, vert0))) / 2.0)
+            # find covariance at center of this triangle
+            # (this is approximate only as it replaces triangle with point mass
+            # todo: find better way)
+            covariances.append(
+                tuple(tuple( masses[-1]*x*y for x in centers[-1] )
+                      for y in centers[-1]))
+
+    # accumulate the results
+    total_mass = sum(masses)
+    if abs(total_mass) < 0.0001:
+        return total_mass, None, None
+    # weighed average of centers with masses
+    total_center = (0, 0, 0)
+    for center, mass in zip(centers, masses):
+        total_center = vecAdd(total_center,
+                              vecscalarMul(center, mass / total_mass))
+    # add covariances, and correct the values
+    total_covariance = ((0,0,0),(0,0,0),(0,0,0))
+    for covariance in covariances:
+        total_covariance = matAdd(total_covariance, covariance)
+    if solid:
+        total_covariance = matscalarMul(total_covariance, COVARIANCE_CORRECTION)
+    return total_mass, total_center, total_covariance
+
+def _get_mass_center_covariance_numpy(vertices, triangles, solid):
+    """As L{_get_mass_center_covariance}, but processes all triangles
+    at once. For internal use only.
+    """
+    vertices = numpy.asarray(vertices, dtype=float).reshape(-1, 3)
+    triangles = numpy.asarray(triangles, dtype=int).reshape(-1, 3)
+    # the rows of each matrix are the vertices of a triangle, so these
+    # are the transposed transforms of the canonical tetrahedron into
+    # (0,0,0),vert0,vert1,vert2
+    transforms_transposed = vertices[triangles]
+    if solid:
+        # C' = det(A) * A * C * A^T, and m = det(A) / 6.0
+        determinants = numpy.linalg.det(transforms_transposed)
+        masses = determinants / 6.0
+        centers = 0.25 * transforms_transposed.sum(axis=1)
+        covariances = numpy.matmul(
+            numpy.matmul(transforms_transposed.transpose(0, 2, 1),
+                         COVARIANCE_CANONICAL),
+            transforms_transposed)
+        total_covariance = COVARIANCE_CORRECTION * numpy.einsum(
+            "t,tij->ij", determinants, covariances)
+    else:
+        # point mass at the center of each triangle, see
+        # _get_mass_center_covariance
+        vert0, vert1, vert2 = transforms_transposed.transpose(1, 0, 2)
+        masses = 0.5 * numpy.sqrt(
+            (numpy.cross(vert1 - vert0, vert2 - vert0) ** 2).sum(axis=1))
+        centers = transforms_transposed.sum(axis=1) / 3.0
+        total_covariance = numpy.einsum(
+            "t,ti,tj->ij", masses, centers, centers)
+    total_mass = float(masses.sum())
+    if abs(total_mass) < 0.0001:
+        return total_mass, None, None
+    total_center = numpy.dot(masses, centers) / total_mass
+    return (total_mass,
+            tuple(float(x) for x in total_center),
+            tuple(tuple(float(x) for x in row) for row in total_covariance))
+
 #
 # References
 # ----------
@@ -184,86 +312,17 @@ def get_mass_center_inertia_polyhedron(vertices, triangles, density = 1, solid =
     True
     """
 
-    # 120 times the covariance matrix of the canonical tetrahedron
-    # (0,0,0),(1,0,0),(0,1,0),(0,0,1)
-    # integrate(integrate(integrate(z*z, x=0..1-y-z), y=0..1-z), z=0..1) = 1/120
-    # integrate(integrate(integrate(y*z, x=0..1-y-z), y=0..1-z), z=0..1) = 1/60
-    covariance_canonical = ( (2, 1, 1),
-                             (1, 2, 1),
-                             (1, 1, 2) )
-    covariance_correction = 1.0/120
-
-    covariances = []
-    masses = []
-    centers = []
-
-    # for each triangle
-    # construct a tetrahedron from triangle + (0,0,0)
-    # find its matrix, mass, and center (for density = 1, will be corrected at
-    # the end of the algorithm)
-    for triangle in triangles:
-        # get vertices
-        vert0, vert1, vert2 = operator.itemgetter(*triangle)(vertices)
-
-        # construct a transform matrix that converts the canonical tetrahedron
-        # into (0,0,0),vert0,vert1,vert2
-        transform_transposed = ( vert0, vert1, vert2 )
-        transform = matTransposed(transform_transposed)
-
-        # find the covariance matrix of the transformed tetrahedron/triangle
-        if solid:
-            # we shall be needing the determinant more than once, so
-            # precalculate it
-            determinant = matDeterminant(transform)
-            # C' = det(A) * A * C * A^T
-            covariances.append(
-                matscalarMul(
-                    matMul(matMul(transform,
-                                  covariance_canonical),
-                           transform_transposed),
-                    determinant))
-            # m = det(A) / 6.0
-            masses.append(determinant / 6.0)
-            # find center of gravity of the tetrahedron
-            centers.append(tuple( 0.25 * sum(vert[i]
-                                             for vert in (vert0, vert1, vert2))
-                                  for i in range(3) ))
-        else:
-            # find center of gravity of the triangle
-            centers.append(tuple( sum(vert[i]
-                                      for vert in (vert0, vert1, vert2)) / 3.0
-                                  for i in range(3) ))
-            # find mass of triangle
-            # mass is surface, which is half the norm of cross product
-            # of two edges
-            masses.append(
-                vecNorm(vecCrossProduct(
-                    vecSub(vert1, vert0), vecSub(vert2, vert0))) / 2.0)
-            # find covariance at center of this triangle
-            # (this is approximate only as it replaces triangle with point mass
-            # todo: find better way)
-            covariances.append(
-                tuple(tuple( masses[-1]*x*y for x in centers[-1] )
-                      for y in centers[-1]))
-
-    # accumulate the results
-    total_mass = sum(masses)
+    if numpy is not None:
+        total_mass, total_center, total_covariance = \
+            _get_mass_center_covariance_numpy(vertices, triangles, solid)
+    else:
+        total_mass, total_center, total_covariance = \
+            _get_mass_center_covariance(vertices, triangles, solid)
     if abs(total_mass) < 0.0001:
         # dimension is probably badly chosen
         #raise ZeroDivisionError("mass is zero (consider calculating inertia with a lower dimension)")
         print("WARNING: mass is nearly zero (%f)" % total_mass)
         return 0, (0,0,0), ((0,0,0),(0,0,0),(0,0,0))
-    # weighed average of centers with masses
-    total_center = (0, 0, 0)
-    for center, mass in zip(centers, masses):
-        total_center = vecAdd(total_center,
-                              vecscalarMul(center, mass / total_mass))
-    # add covariances, and correct the values
-    total_covariance = ((0,0,0),(0,0,0),(0,0,0))
-    for covariance in covariances:
-        total_covariance = matAdd(total_covariance, covariance)
-    if solid:
-        total_covariance = matscalarMul(total_covariance, covariance_correction)
 
     # translate covariance to center of gravity:
     # C' = C - m * ( x dx^T + dx x^T + dx dx^T )
@@ -293,6 +352,62 @@ def get_mass_center_inertia_polyhedron(vertices, triangles, density = 1, solid =
 
     return total_mass, total_center, total_inertia
 
+def get_mass_center_inertia_compound(subshapes_mci):
+    """Return mass, center of gravity, and inertia matrix of a compound
+    shape, from the mass, center of gravity, and inertia matrix around
+    that center of each of its sub shapes. The inertia matrices are
+    moved to the common center of gravity before they are added.
+
+    >>> sphere_mass, sphere_inertia = getMassInertiaSphere(1.0)
+    >>> mass, center, inertia = get_mass_center_inertia_compound(
+    ...     [(sphere_mass, (-2.0, 1.0, 0.0), sphere_inertia),
+    ...      (sphere_mass, (2.0, 1.0, 0.0), sphere_inertia)])
+    >>> abs(mass - 2 * sphere_mass) < 0.0001
+    True
+    >>> center
+    (0.0, 1.0, 0.0)
+    >>> abs(inertia[0][0] - 2 * sphere_inertia[0][0]) < 0.0001
+    True
+    >>> abs(inertia[1][1] - 2 * (sphere_inertia[1][1] + 4 * sphere_mass)) < 0.0001
+    True
+    >>> get_mass_center_inertia_compound([])
+    (0, (0, 0, 0), ((0, 0, 0), (0, 0, 0), (0, 0, 0)))
+    """
+    subshapes_mci = list(subshapes_mci)
+    total_mass = sum(mass for mass, center, inertia in subshapes_mci)
+    if total_mass == 0:
+        return 0, (0, 0, 0), ((0, 0, 0), (0, 0, 0), (0, 0, 0))
+    if numpy is not None:
+        masses = numpy.array([mass for mass, center, inertia in subshapes_mci],
+                             dtype=float)
+        centers = numpy.array(
+            [center for mass, center, inertia in subshapes_mci], dtype=float)
+        inertias = numpy.array(
+            [inertia for mass, center, inertia in subshapes_mci], dtype=float)
+        total_center = numpy.dot(masses, centers) / total_mass
+        # parallel axis theorem: I + m * (|d|^2 E - d d^T)
+        offsets = centers - total_center
+        total_inertia = inertias.sum(axis=0) + (
+            numpy.identity(3) * numpy.dot(masses, (offsets ** 2).sum(axis=1))
+            - numpy.einsum("t,ti,tj->ij", masses, offsets, offsets))
+        return (total_mass,
+                tuple(float(x) for x in total_center),
+                tuple(tuple(float(x) for x in row) for row in total_inertia))
+    total_center = (0, 0, 0)
+    for mass, center, inertia in subshapes_mci:
+        total_center = vecAdd(total_center,
+                              vecscalarMul(center, mass / total_mass))
+    total_inertia = ((0, 0, 0), (0, 0, 0), (0, 0, 0))
+    for mass, center, inertia in subshapes_mci:
+        # parallel axis theorem: I + m * (|d|^2 E - d d^T)
+        offset = vecSub(center, total_center)
+        norm2 = vecDotProduct(offset, offset)
+        total_inertia = matAdd(total_inertia, matAdd(inertia, tuple(
+            tuple(mass * ((norm2 if i == j else 0) - offset[i] * offset[j])
+                  for j in range(3))
+            for i in range(3))))
+    return total_mass, total_center, total_inertia
+
 if __name__ == "__main__":
     import doctest
     doctest.testmod()
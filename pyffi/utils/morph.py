@@ -0,0 +1,237 @@
+"""Morphs of relative vertices stored as scaled shorts, as used by the
+EGM and TRI formats.
+
+Each morph stores, for every vertex of the base model, a triple of
+shorts, which are multiplied by the scale of the morph. L{MorphRecord}
+implements the methods shared by C{EgmFormat.MorphRecord} and
+C{TriFormat.MorphRecord}, and L{get_morphed_vertices} applies weighted
+morphs to a base model.
+
+The shorts of all vertices of a morph are kept as a single buffer,
+read in one go from the file, so bulk access does not need to go
+through the vertices one by one. The buffer is dropped whenever a
+vertex is changed.
+"""
+
+# ***** BEGIN LICENSE BLOCK *****
+#
+# Copyright (c) 2007-2009, Python File Format Interface
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#
+#    * Redistributions in binary form must reproduce the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer in the documentation and/or other materials provided
+#      with the distribution.
+#
+#    * Neither the name of the Python File Format Interface
+#      project nor the names of its contributors may be used to endorse
+#      or promote products derived from this software without specific
+#      prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# ***** END LICENSE BLOCK *****
+
+import array
+import operator
+import sys
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from pyffi.object_models.xml import tracking
+from pyffi.object_models.xml.struct_ import StructBase
+
+class MorphRecord(object):
+    """Methods of a morph structure, which has a C{scale} attribute and
+    a C{vertices} array of C{arg} structures with C{x}, C{y}, and C{z}
+    shorts, stored last. Derive the customizer class of the morph
+    structure from this class.
+    """
+
+    _get_xyz = operator.attrgetter("_x_value_", "_y_value_", "_z_value_")
+
+    def _get_vertices_tracker(self):
+        """Return the tracker of the vertices, which holds their shorts
+        until a vertex is changed, attaching a new one if needed.
+
+        :return: The tracker.
+        :rtype: L{tracking.ChangeTracker}
+        """
+        vertices = self.vertices
+        tracker = vertices._tracker
+        if tracker is None:
+            tracker = tracking.ChangeTracker()
+            vertices._tracker = tracker
+            for vert in list.__iter__(vertices):
+                vert._tracker = tracker
+        return tracker
+
+    def read(self, stream, data):
+        """Read the morph, and keep the shorts of its vertices as a
+        single buffer.
+        """
+        tracker = self._get_vertices_tracker()
+        # the vertices are created again, so track them while reading
+        with tracking.track(tracker):
+            StructBase.read(self, stream, data)
+        # the vertices come last, so their shorts are right behind us
+        size = 6 * len(self.vertices)
+        stream.seek(-size, 1)
+        shorts = array.array("h", stream.read(size))
+        if sys.byteorder == "big":
+            shorts.byteswap()
+        tracker.touch()
+        tracker.cache["shorts"] = shorts
+
+    def get_relative_vertices(self):
+        for vert in self.vertices:
+            yield (vert.x * self.scale,
+                   vert.y * self.scale,
+                   vert.z * self.scale)
+
+    def set_relative_vertices(self, vertices):
+        # copy to list
+        vertices = list(vertices)
+        # check length
+        if len(vertices) != self.arg:
+            raise ValueError("expected %i vertices, but got %i"
+                             % (self.arg, len(vertices)))
+        # get extreme values of morph
+        max_value = max(max(abs(value) for value in vert)
+                        for vert in vertices)
+        # calculate scale
+        self.scale = max_value / 32767.0
+        inv_scale = 1 / self.scale
+        # set vertices
+        for vert, self_vert in zip(vertices, self.vertices):
+            self_vert.x = int(vert[0] * inv_scale)
+            self_vert.y = int(vert[1] * inv_scale)
+            self_vert.z = int(vert[2] * inv_scale)
+
+    def get_short_vertices(self):
+        """Return the unscaled relative vertices as a single flat
+        buffer of shorts.
+
+        :return: The x, y, and z value of every vertex.
+        :rtype: ``array.array`` of type ``'h'``
+        """
+        tracker = self._get_vertices_tracker()
+        shorts = tracker.cache.get("shorts")
+        if shorts is None:
+            # not read from a file, or changed since
+            get_xyz = self._get_xyz
+            shorts = array.array(
+                "h", [basic.get_value()
+                      for vert in self.vertices for basic in get_xyz(vert)])
+            tracker.cache["shorts"] = shorts
+        # copy, so the buffer cannot be changed behind our back
+        return array.array("h", shorts)
+
+    def set_short_vertices(self, shorts):
+        """Set the unscaled relative vertices from a single flat buffer
+        of shorts, as returned by L{get_short_vertices}.
+
+        :param shorts: The x, y, and z value of every vertex.
+        """
+        if len(shorts) != 3 * self.arg:
+            raise ValueError("expected %i values, but got %i"
+                             % (3 * self.arg, len(shorts)))
+        shorts = array.array("h", shorts)
+        get_xyz = self._get_xyz
+        basics = [basic for vert in self.vertices
+                  for basic in get_xyz(vert)]
+        for basic, value in zip(basics, shorts):
+            basic.set_value(value)
+        tracker = self._get_vertices_tracker()
+        tracker.touch()
+        tracker.cache["shorts"] = shorts
+
+    def get_relative_vertices_array(self):
+        """Return all relative vertices at once. If numpy is available,
+        this is an array of shape ``(num_vertices, 3)``; otherwise, it
+        is a list of tuples, as L{get_relative_vertices}.
+        """
+        if numpy is not None:
+            return (numpy.frombuffer(self.get_short_vertices(),
+                                     dtype=numpy.int16)
+                    .reshape(-1, 3) * self.scale)
+        return list(self.get_relative_vertices())
+
+    def set_relative_vertices_array(self, vertices):
+        """Set all relative vertices at once, as L{set_relative_vertices},
+        but faster.
+
+        :param vertices: The relative vertices, as an array of shape
+            ``(num_vertices, 3)`` or a list of tuples.
+        """
+        if numpy is None:
+            return self.set_relative_vertices(vertices)
+        vertices = numpy.asarray(vertices, dtype=float).reshape(-1, 3)
+        # check length
+        if len(vertices) != self.arg:
+            raise ValueError("expected %i vertices, but got %i"
+                             % (self.arg, len(vertices)))
+        # calculate scale
+        self.scale = float(numpy.abs(vertices).max()) / 32767.0
+        inv_scale = 1 / self.scale
+        # set vertices (astype rounds towards zero, as int does)
+        self.set_short_vertices(array.array(
+            "h", (vertices * inv_scale).astype(numpy.int16).tobytes()))
+
+    def apply_scale(self, scale):
+        """Apply scale factor to data."""
+        self.scale *= scale
+
+def get_morphed_vertices(vertices, morphs):
+    """Return the vertices of a base model with morphs applied, each
+    multiplied by its weight. If numpy is available, all morphs are
+    added in a single pass, and an array of shape ``(num_vertices, 3)``
+    is returned; otherwise, a list of tuples is returned.
+
+    :param vertices: The vertices of the base model.
+    :param morphs: The weight and the morph, for each morph to apply.
+    :type morphs: ``list`` of ``(float, MorphRecord)``
+    :return: The morphed vertices.
+    """
+    morphs = [(weight, morph) for weight, morph in morphs if weight]
+    if numpy is not None:
+        result = numpy.array(vertices, dtype=float).reshape(-1, 3)
+        if morphs:
+            # one row of shorts per morph
+            shorts = numpy.array(
+                [numpy.frombuffer(morph.get_short_vertices(),
+                                  dtype=numpy.int16)
+                 for weight, morph in morphs])
+            factors = [weight * morph.scale for weight, morph in morphs]
+            result += numpy.dot(factors, shorts).reshape(-1, 3)
+        return result
+    result = [list(vert) for vert in vertices]
+    for weight, morph in morphs:
+        shorts = morph.get_short_vertices()
+        factor = weight * morph.scale
+        for i, vert in enumerate(result):
+            vert[0] += factor * shorts[3 * i]
+            vert[1] += factor * shorts[3 * i + 1]
+            vert[2] += factor * shorts[3 * i + 2]
+    return [tuple(vert) for vert in result]
@@ -139,6 +139,11 @@ from pyffi.utils.mathutils import *
 
 import operator
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 # adapted from
 # http://en.literateprograms.org/Quickhull_(Python,_arrays)
 def qdome2d(vertices, base, normal, precision = 0.0001):
@@ -284,11 +289,31 @@ def basesimplex3d(vertices, precision = 0.0001):
         # coplanar
         return [ vert0, vert1, vert2 ]
 
-def qhull3d(vertices, precision = 0.0001, verbose = False):
+def qhull3d(vertices, precision = 0.0001, verbose = False, use_numpy = True):
     """Return the triangles making up the convex hull of C{vertices}.
     Considers distances less than C{precision} to be zero (useful to simplify
     the hull of a complex mesh, at the expense of exactness of the hull).
 
+    Faces that are coplanar within C{precision} are merged, so both the
+    numpy and the pure python code give the same hull for a prism with
+    an extra ring of vertices halfway up its side:
+
+    >>> import math
+    >>> prism = [(math.cos(math.pi * i / 32), math.sin(math.pi * i / 32), z)
+    ...          for z in (0.0, 0.5, 1.0) for i in range(64)]
+    >>> verts, triangles = qhull3d(prism)
+    >>> len(verts)
+    128
+    >>> len(triangles)
+    252
+    >>> pure_verts, pure_triangles = qhull3d(prism, use_numpy=False)
+    >>> len(pure_verts)
+    128
+    >>> sorted(verts) == sorted(pure_verts)
+    True
+    >>> len(get_planes(verts, triangles)) == len(get_planes(pure_verts, pure_triangles)) == 66
+    True
+
     :param vertices: The vertices to find the hull of.
     :param precision: Distance used to decide whether points lie outside of
         the hull or not. Larger numbers mean fewer triangles, but some vertices
@@ -296,10 +321,17 @@ def qhull3d(vertices, precision = 0.0001, verbose = False):
         C{precision}.
     :param verbose: Print information about what the algorithm is doing. Only
         useful for debugging.
+    :param use_numpy: Whether to use numpy, if it is available.
     :return: A list cointaining the extreme points of C{vertices}, and
         a list of triangle indices containing the triangles that connect
         all extreme points.
     """
+    # use the vectorized algorithm if possible
+    if use_numpy and numpy is not None and not verbose:
+        result = _qhull3d_numpy(vertices, precision)
+        if result is not None:
+            return result
+
     # find a simplex to start from
     hull_vertices = basesimplex3d(vertices, precision)
 
@@ -398,6 +430,202 @@ def qhull3d(vertices, precision = 0.0001, verbose = False):
                                   for vert in triangle)
                             for triangle in hull_triangles ]
 
+def _basesimplex3d_numpy(points, precision):
+    """As L{basesimplex3d}, but on an array of points, and returns
+    indices into that array. For internal use only."""
+    extents = sorted(list(range(3)),
+                     key=lambda i: points[:, i].max() - points[:, i].min())
+    # lexsort sorts on its last key first, and is stable, so the first
+    # index is the first minimum, as with min
+    order = numpy.lexsort(tuple(points[:, i] for i in reversed(extents)))
+    index0, index1 = order[0], order[-1]
+    vert0, vert1 = points[index0], points[index1]
+    axis = vert1 - vert0
+    length = numpy.sqrt(numpy.dot(axis, axis))
+    if length < precision:
+        return [index0]
+    dists = numpy.sqrt((numpy.cross(points - vert0, axis) ** 2).sum(axis=1))
+    index2 = dists.argmax()
+    if dists[index2] / length < precision:
+        return [index0, index1]
+    normal = numpy.cross(axis, points[index2] - vert0)
+    normal /= numpy.sqrt(numpy.dot(normal, normal))
+    dists = numpy.dot(points - vert0, normal)
+    index3 = numpy.abs(dists).argmax()
+    orientation = dists[index3]
+    if orientation > precision:
+        return [index0, index1, index2, index3]
+    elif orientation < -precision:
+        return [index1, index0, index2, index3]
+    else:
+        return [index0, index1, index2]
+
+def _qhull3d_numpy(vertices, precision):
+    """As L{qhull3d}, but using numpy: every face keeps an array of the
+    points which lie outside it (the conflict graph), and these points
+    are assigned to new faces all at once. Returns ``None`` if the
+    vertices are coplanar, colinear, or coincide. For internal use
+    only."""
+    points = numpy.asarray(vertices, dtype=float).reshape(-1, 3)
+    if len(points) == 0:
+        return None
+    base = _basesimplex3d_numpy(points, precision)
+    if len(base) < 4:
+        return None
+
+    # faces, and their planes and outer points, by face id
+    faces = {}
+    planes = {}
+    outer = {}
+    # maps every directed edge to the face that has it
+    edge_faces = {}
+    # faces which may have outer points
+    todo = []
+
+    def add_faces(new_faces, candidates):
+        """Add faces, and distribute candidate points over them."""
+        new_ids = []
+        normals = []
+        for face in new_faces:
+            vert0, vert1, vert2 = points[list(face)]
+            normal = numpy.cross(vert1 - vert0, vert2 - vert0)
+            normal /= numpy.sqrt(numpy.dot(normal, normal))
+            face_id = len(planes)
+            faces[face_id] = face
+            planes[face_id] = (normal, numpy.dot(normal, vert0))
+            for i in range(3):
+                edge_faces[(face[i], face[(i + 1) % 3])] = face_id
+            new_ids.append(face_id)
+            normals.append(normal)
+        if not len(candidates):
+            return
+        # each point goes to the face it is furthest outside of
+        dists = (numpy.dot(points[candidates], numpy.array(normals).T)
+                 - numpy.array([planes[face_id][1] for face_id in new_ids]))
+        best = dists.argmax(axis=1)
+        best_dists = dists[numpy.arange(len(candidates)), best]
+        is_outer = best_dists > precision
+        candidates = candidates[is_outer]
+        best = best[is_outer]
+        best_dists = best_dists[is_outer]
+        for i, face_id in enumerate(new_ids):
+            selected = (best == i)
+            if selected.any():
+                outer[face_id] = (candidates[selected], best_dists[selected])
+                todo.append(face_id)
+
+    add_faces([operator.itemgetter(i, j, k)(base)
+               for i, j, k in ((1,0,2), (0,1,3), (0,3,2), (3,1,2))],
+              numpy.arange(len(points)))
+    hull_indices = list(base)
+
+    while todo:
+        face_id = todo.pop()
+        if face_id not in outer:
+            # face was removed
+            continue
+        candidates, dists = outer[face_id]
+        pivot = candidates[dists.argmax()]
+        pivot_point = points[pivot]
+        hull_indices.append(pivot)
+        # find the visible faces by walking from this face over the
+        # neighbouring faces, and collect the horizon on the way
+        visible = set([face_id])
+        while True:
+            stack = list(visible)
+            horizon = []
+            while stack:
+                visible_id = stack.pop()
+                face = faces[visible_id]
+                for i in range(3):
+                    edge = (face[i], face[(i + 1) % 3])
+                    other_id = edge_faces[(edge[1], edge[0])]
+                    if other_id in visible:
+                        continue
+                    normal, offset = planes[other_id]
+                    if numpy.dot(normal, pivot_point) - offset > -precision:
+                        visible.add(other_id)
+                        stack.append(other_id)
+                    else:
+                        horizon.append((edge, other_id))
+            # a horizon edge in line with the pivot would give a face
+            # without area: the face behind it lies in the same plane
+            # as the pivot, so replace that face as well
+            flat = set()
+            for edge, other_id in horizon:
+                vert0, vert1 = points[list(edge)]
+                axis = vert1 - vert0
+                dist = numpy.sqrt(
+                    (numpy.cross(pivot_point - vert0, axis) ** 2).sum()
+                    / numpy.dot(axis, axis))
+                if dist <= precision:
+                    flat.add(other_id)
+            if not flat:
+                break
+            visible |= flat
+        horizon = [edge for edge, other_id in horizon]
+        # remove the visible faces, and collect their outer points
+        candidates = []
+        for visible_id in visible:
+            face = faces.pop(visible_id)
+            for i in range(3):
+                edge = (face[i], face[(i + 1) % 3])
+                if edge_faces.get(edge) == visible_id:
+                    del edge_faces[edge]
+            if visible_id in outer:
+                candidates.append(outer.pop(visible_id)[0])
+        candidates = numpy.concatenate(candidates)
+        # close the hole with a cone from the horizon to the pivot
+        add_faces([edge + (pivot,) for edge in horizon],
+                  candidates[candidates != pivot])
+
+    # remap the triangles to indices that point into hull_vertices
+    used = set()
+    for face in faces.values():
+        used.update(face)
+    hull_indices = [index for index in hull_indices if index in used]
+    hull_map = dict((index, i) for i, index in enumerate(hull_indices))
+    return ([vertices[index] for index in hull_indices],
+            [tuple(hull_map[index] for index in face)
+             for face in faces.values()])
+
+def get_planes(vertices, triangles, precision=0.0001):
+    """Return the planes of a convex hull, as found by L{qhull3d}, in the
+    form used by C{bhkConvexVerticesShape.normals}: a unit normal
+    ``(x, y, z)`` pointing outwards, and ``w`` such that a point ``v``
+    lies on the plane if ``x * v[0] + y * v[1] + z * v[2] + w`` is zero.
+    Triangles whose planes differ by no more than C{precision} share a
+    single plane, so for instance a cube has six planes, rather than
+    twelve.
+
+    >>> cube = [(0,0,0),(0,0,1),(0,1,0),(1,0,0),(0,1,1),(1,0,1),(1,1,0),(1,1,1)]
+    >>> verts, triangles = qhull3d(cube)
+    >>> sorted(tuple(round(x, 6) + 0.0 for x in plane)
+    ...        for plane in get_planes(verts, triangles))
+    ... # doctest: +NORMALIZE_WHITESPACE
+    [(-1.0, 0.0, 0.0, 0.0), (0.0, -1.0, 0.0, 0.0), (0.0, 0.0, -1.0, 0.0),
+     (0.0, 0.0, 1.0, -1.0), (0.0, 1.0, 0.0, -1.0), (1.0, 0.0, 0.0, -1.0)]
+
+    :param vertices: The vertices of the hull.
+    :param triangles: The triangles of the hull.
+    :param precision: Largest difference between planes that are
+        considered equal.
+    :return: A list of planes, each a tuple of four floats.
+    """
+    planes = []
+    for triangle in triangles:
+        verts = operator.itemgetter(*triangle)(vertices)
+        normal = vecNormal(*verts)
+        if vecNorm(normal) <= precision ** 2:
+            # triangle without area, it has no plane of its own
+            continue
+        normal = vecNormalized(normal)
+        plane = normal + (-vecDotProduct(normal, verts[0]),)
+        if not any(max(abs(x - y) for x, y in zip(plane, other)) <= precision
+                   for other in planes):
+            planes.append(plane)
+    return planes
+
 if __name__ == "__main__":
     import doctest
     doctest.testmod()
@@ -0,0 +1,471 @@
+"""Mesh simplification by quadric error metrics.
+
+The mesh is reduced by collapsing edges, cheapest first, where the
+cost of a collapse is the quadric error of the position that remains,
+as described in 'Surface Simplification Using Quadric Error Metrics'
+by Michael Garland and Paul S. Heckbert, SIGGRAPH 1997.
+
+Only half edge collapses are performed: a vertex is removed by moving
+it onto one of its neighbours. No new vertices are created, so the
+attributes of the remaining vertices (normals, uv coordinates, colors,
+skin weights, ...) are always valid, and the result can be described
+by a vertex map, just like when removing duplicate vertices. The
+difference in attributes between both vertices is added to the cost
+of the collapse, so edges across which attributes change a lot are
+collapsed last.
+
+Vertices on the boundary of the mesh, and vertices which share their
+position with other vertices (such as vertices on uv seams) are never
+removed, so boundaries and seams are preserved exactly.
+"""
+
+# ***** BEGIN LICENSE BLOCK *****
+#
+# Copyright (c) 2007-2009, Python File Format Interface
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#
+#    * Redistributions in binary form must reproduce the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer in the documentation and/or other materials provided
+#      with the distribution.
+#
+#    * Neither the name of the Python File Format Interface
+#      project nor the names of its contributors may be used to endorse
+#      or promote products derived from this software without specific
+#      prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# ***** END LICENSE BLOCK *****
+
+import heapq
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from pyffi.utils import unique_map
+from pyffi.utils.mathutils import vecDotProduct
+
+ATTRIBUTE_WEIGHT = 0.001
+"""Default weight of the squared attribute difference in the cost of
+a collapse, relative to the squared size of the mesh."""
+
+def _get_normal(p0, p1, p2):
+    """Return the (not normalized) normal of a triangle."""
+    x1, y1, z1 = p1[0] - p0[0], p1[1] - p0[1], p1[2] - p0[2]
+    x2, y2, z2 = p2[0] - p0[0], p2[1] - p0[1], p2[2] - p0[2]
+    return (y1 * z2 - z1 * y2, z1 * x2 - x1 * z2, x1 * y2 - y1 * x2)
+
+def _get_plane_quadric(p0, p1, p2):
+    """Return the area weighted quadric of the plane through the
+    given points, as the ten coefficients of the upper triangle of
+    the symmetric 4x4 matrix, or ``None`` if the triangle is
+    degenerate.
+    """
+    n = _get_normal(p0, p1, p2)
+    norm = vecDotProduct(n, n) ** 0.5
+    if norm == 0:
+        return None
+    a, b, c = n[0] / norm, n[1] / norm, n[2] / norm
+    d = -(a * p0[0] + b * p0[1] + c * p0[2])
+    area = 0.5 * norm
+    return [area * a * a, area * a * b, area * a * c, area * a * d,
+            area * b * b, area * b * c, area * b * d,
+            area * c * c, area * c * d,
+            area * d * d]
+
+def _get_quadrics(positions, triangles, num_quadrics, quadric_index):
+    """Sum the plane quadrics of all triangles at each of their
+    corners.
+    """
+    quadrics = [[0.0] * 10 for i in range(num_quadrics)]
+    for tri in triangles:
+        q = _get_plane_quadric(*[positions[i] for i in tri])
+        if q is None:
+            continue
+        for i in tri:
+            quadric = quadrics[quadric_index[i]]
+            for k in range(10):
+                quadric[k] += q[k]
+    return quadrics
+
+def _get_quadrics_numpy(positions, triangles, num_quadrics, quadric_index):
+    """Implementation of :func:`_get_quadrics` using numpy."""
+    points = numpy.array(positions, dtype=numpy.float64)
+    tris = numpy.array(triangles, dtype=numpy.int64).reshape(-1, 3)
+    p0, p1, p2 = (points[tris[:, k]] for k in range(3))
+    n = numpy.cross(p1 - p0, p2 - p0)
+    norm = numpy.sqrt(numpy.einsum("ij,ij->i", n, n))
+    good = norm != 0
+    n = n[good] / norm[good, numpy.newaxis]
+    d = -numpy.einsum("ij,ij->i", n, p0[good])
+    plane = numpy.column_stack((n, d))
+    upper = numpy.triu_indices(4)
+    q = (plane[:, :, numpy.newaxis] * plane[:, numpy.newaxis, :])[
+        :, upper[0], upper[1]] * (0.5 * norm[good])[:, numpy.newaxis]
+    quadrics = numpy.zeros((num_quadrics, 10), dtype=numpy.float64)
+    corners = numpy.array(quadric_index, dtype=numpy.int64)[tris[good]]
+    for k in range(3):
+        numpy.add.at(quadrics, corners[:, k], q)
+    return quadrics.tolist()
+
+def _get_quadric_error(q, p):
+    """Evaluate the quadric at a point."""
+    x, y, z = p
+    return (q[0] * x * x + 2 * q[1] * x * y + 2 * q[2] * x * z
+            + 2 * q[3] * x + q[4] * y * y + 2 * q[5] * y * z
+            + 2 * q[6] * y + q[7] * z * z + 2 * q[8] * z + q[9])
+
+def simplify(vertices, triangles, attributes=None, ratio=0.5,
+             max_error=None, attribute_weight=ATTRIBUTE_WEIGHT,
+             groups=None, max_groups=None, use_numpy=True):
+    """Reduce the number of triangles of a mesh by collapsing edges.
+
+    Collapses are done in order of increasing cost, until the number
+    of triangles drops to ``ratio`` times the original number, or
+    until the cost of the cheapest collapse exceeds ``max_error``.
+
+    A square made of 32 flat triangles can be reduced to just a few
+    triangles, keeping all boundary vertices:
+
+    >>> verts = [(x, y, 0.0) for y in range(5) for x in range(5)]
+    >>> tris = []
+    >>> for y in range(4):
+    ...     for x in range(4):
+    ...         i = 5 * y + x
+    ...         tris += [(i, i + 1, i + 6), (i, i + 6, i + 5)]
+    >>> v_map, new_tris = simplify(verts, tris, ratio=0.0)
+    >>> len(new_tris) < 20
+    True
+    >>> sorted(set(v_map)) == [i for i in range(25)
+    ...                        if verts[i][0] in (0, 4) or verts[i][1] in (0, 4)]
+    True
+    >>> simplify(verts, tris, ratio=0.0, use_numpy=False) == (v_map, new_tris)
+    True
+
+    The area and orientation of the square are unchanged:
+
+    >>> def area(tri):
+    ...     return _get_normal(*[verts[i] for i in tri])[2] / 2
+    >>> sum(area(tri) for tri in new_tris)
+    16.0
+    >>> min(area(tri) for tri in new_tris) > 0
+    True
+
+    Moving a vertex out of the plane makes its removal costly, so it
+    is kept if the maximal error is small:
+
+    >>> verts[12] = (2.0, 2.0, 1.0)
+    >>> v_map, new_tris = simplify(verts, tris, ratio=0.0, max_error=0.01)
+    >>> v_map[12], v_map[8] != 8
+    (12, True)
+
+    Attributes which differ a lot prevent collapses as well:
+
+    >>> verts[12] = (2.0, 2.0, 0.0)
+    >>> uvs = [(0.0, 0.0)] * 25
+    >>> uvs[12] = (1.0, 1.0)
+    >>> v_map, new_tris = simplify(verts, tris, attributes=[uvs],
+    ...                            ratio=0.0, max_error=0.01)
+    >>> v_map[12], v_map[8] != 8
+    (12, True)
+
+    Without other limits, the number of triangles drops to exactly
+    ``ratio`` times the original number:
+
+    >>> len(simplify(verts, tris, ratio=0.75)[1])
+    24
+
+    No collapse makes the triangles around a vertex belong to more
+    than ``max_groups`` groups, for instance bones of a skin partition,
+    unless they already did. Here, each quarter of the square is a
+    group:
+
+    >>> groups = [set([(x // 2, y // 2)]) for (x, y, z) in verts]
+    >>> def get_fan_groups(tris):
+    ...     fan_groups = {}
+    ...     for tri in tris:
+    ...         tri_groups = set().union(*[groups[i] for i in tri])
+    ...         for i in tri:
+    ...             fan_groups.setdefault(i, set()).update(tri_groups)
+    ...     return fan_groups
+    >>> old_fan_groups = get_fan_groups(tris)
+    >>> def get_grown_fans(tris, max_groups):
+    ...     return sorted(
+    ...         i for i, fan in get_fan_groups(tris).items()
+    ...         if len(fan) > max(max_groups, len(old_fan_groups[i])))
+    >>> v_map, new_tris = simplify(verts, tris, ratio=0.0)
+    >>> len(new_tris), get_grown_fans(new_tris, 3)
+    (14, [0, 2, 10])
+    >>> v_map, new_tris = simplify(verts, tris, ratio=0.0,
+    ...                            groups=groups, max_groups=3)
+    >>> len(new_tris), get_grown_fans(new_tris, 3)
+    (26, [])
+    >>> simplify(verts, tris, ratio=0.0, groups=groups, max_groups=3,
+    ...          use_numpy=False) == (v_map, new_tris)
+    True
+
+    The limit can keep the number of triangles above the ratio:
+
+    >>> len(simplify(verts, tris, ratio=0.75,
+    ...              groups=groups, max_groups=3)[1])
+    26
+    >>> len(simplify(verts, tris, ratio=0.75,
+    ...              groups=groups, max_groups=2)[1])
+    32
+
+    :param vertices: The position of each vertex.
+    :type vertices: ``list`` of 3-tuples of ``float``
+    :param triangles: The triangles, as triples of vertex indices.
+    :type triangles: ``list`` of 3-tuples of ``int``
+    :param attributes: For each kind of attribute (normals, uv
+        coordinates, colors, skin weights, ...), a list with for each
+        vertex a sequence of floats.
+    :type attributes: ``list``
+    :param ratio: Number of triangles to keep, relative to the number
+        of triangles of the mesh.
+    :type ratio: ``float``
+    :param max_error: Largest allowed error, relative to the size
+        (bounding box diagonal) of the mesh, or ``None`` for no limit.
+    :type max_error: ``float``
+    :param attribute_weight: Weight of the squared difference of
+        attributes in the cost of a collapse, relative to the squared
+        size of the mesh.
+    :type attribute_weight: ``float``
+    :param groups: For each vertex, the set of groups (such as bones)
+        it belongs to, or ``None``.
+    :type groups: ``list`` of ``set``
+    :param max_groups: Largest number of groups the triangles around
+        a single vertex may belong to after a collapse, such as the
+        number of bones per skin partition, or ``None`` for no limit.
+    :type max_groups: ``int``
+    :param use_numpy: Whether to use numpy, if it is available.
+    :type use_numpy: ``bool``
+    :return: A map from each vertex to the vertex it was collapsed
+        into (itself if it is kept), and the remaining triangles.
+    """
+    positions = [tuple(float(x) for x in vert) for vert in vertices]
+    num_vertices = len(positions)
+    attributes = attributes or []
+    if any(len(rows) != num_vertices for rows in attributes):
+        raise ValueError("need attributes for every vertex")
+    attrs = [sum((tuple(row[i]) for row in attributes), ())
+             for i in range(num_vertices)]
+    if max_groups is not None and groups is None:
+        raise ValueError("need groups to impose max_groups")
+    # remove degenerate triangles
+    tris = [list(tri) for tri in triangles if len(set(tri)) == 3]
+    num_alive = len(tris)
+    alive = [True] * num_alive
+    v_map = list(range(num_vertices))
+    if not tris:
+        return v_map, []
+    target = int(ratio * num_alive)
+
+    # size of the mesh, to make errors relative
+    extent = [max(p[k] for p in positions) - min(p[k] for p in positions)
+              for k in range(3)]
+    size = vecDotProduct(extent, extent) ** 0.5 or 1.0
+    max_cost = None if max_error is None else (max_error * size) ** 2
+    attribute_weight *= size * size
+
+    # vertices at the same position share a quadric and are locked
+    pos_map, pos_map_inverse = unique_map(positions)
+    num_positions = len(pos_map_inverse)
+    pos_tris = [set() for i in range(num_positions)]
+    vert_tris = [set() for i in range(num_vertices)]
+    for t, tri in enumerate(tris):
+        for i in tri:
+            vert_tris[i].add(t)
+            pos_tris[pos_map[i]].add(t)
+    locked = [False] * num_vertices
+    num_copies = [0] * num_positions
+    for i in range(num_vertices):
+        num_copies[pos_map[i]] += 1
+    for i in range(num_vertices):
+        if num_copies[pos_map[i]] > 1:
+            locked[i] = True
+    # lock boundary and non-manifold edges
+    edge_count = {}
+    for tri in tris:
+        for k in range(3):
+            edge = (pos_map[tri[k]], pos_map[tri[k - 1]])
+            edge = (min(edge), max(edge))
+            edge_count[edge] = edge_count.get(edge, 0) + 1
+    boundary = set()
+    for edge, count in edge_count.items():
+        if count != 2:
+            boundary.update(edge)
+    for i in range(num_vertices):
+        if pos_map[i] in boundary:
+            locked[i] = True
+
+    if use_numpy and numpy is not None:
+        quadrics = _get_quadrics_numpy(
+            positions, tris, num_positions, pos_map)
+    else:
+        quadrics = _get_quadrics(positions, tris, num_positions, pos_map)
+
+    def get_neighbours(pos):
+        return set(pos_map[i] for t in pos_tris[pos] for i in tris[t]) - set([pos])
+
+    def is_valid(u, v):
+        """Check that collapsing u into v keeps the mesh manifold, does
+        not flip triangles, and respects the group limit of every fan.
+        """
+        pos_u, pos_v = pos_map[u], pos_map[v]
+        # link condition: the only common neighbours are the vertices
+        # opposite to the collapsed edge
+        opposite = set(pos_map[i] for t in vert_tris[u] if v in tris[t]
+                       for i in tris[t]) - set([pos_u, pos_v])
+        if get_neighbours(pos_u) & get_neighbours(pos_v) != opposite:
+            return False
+        p_v = positions[v]
+        for t in vert_tris[u]:
+            tri = tris[t]
+            if v in tri:
+                continue
+            n_old = _get_normal(*[positions[i] for i in tri])
+            n_new = _get_normal(*[p_v if i == u else positions[i]
+                                  for i in tri])
+            if vecDotProduct(n_old, n_new) <= 0:
+                return False
+        if max_groups is not None:
+            # the triangles around every vertex whose triangles change
+            for w in set(i for t in vert_tris[u] for i in tris[t]):
+                if w == u:
+                    continue
+                old_groups = get_fan_groups(w, vert_tris[w])
+                new_groups = get_fan_groups(
+                    w, vert_tris[w] | vert_tris[u], u, v)
+                if (len(new_groups) > max_groups
+                    and len(new_groups) > len(old_groups)):
+                    return False
+        return True
+
+    def get_fan_groups(w, fan, u=None, v=None):
+        """Return the groups of the triangles in the fan around w, as
+        they would be after collapsing u into v.
+        """
+        fan_groups = set()
+        for t in fan:
+            tri = tris[t]
+            if u in tri and v in tri:
+                # this triangle disappears
+                continue
+            new_tri = [v if i == u else i for i in tri]
+            if w not in new_tri:
+                continue
+            for i in new_tri:
+                fan_groups |= groups[i]
+        return fan_groups
+
+    def get_best_collapse(u):
+        """Return the cost and target of the cheapest valid collapse
+        of u, or ``None`` if u cannot be removed.
+        """
+        if locked[u] or not vert_tris[u]:
+            return None
+        quadric_u = quadrics[pos_map[u]]
+        attr_u = attrs[u]
+        candidates = []
+        for v in set(i for t in vert_tris[u] for i in tris[t]):
+            if v == u:
+                continue
+            quadric_v = quadrics[pos_map[v]]
+            cost = _get_quadric_error(
+                [q_u + q_v for q_u, q_v in zip(quadric_u, quadric_v)],
+                positions[v])
+            if attr_u:
+                cost += attribute_weight * sum(
+                    (a_u - a_v) ** 2 for a_u, a_v in zip(attr_u, attrs[v]))
+            candidates.append((cost, v))
+        candidates.sort()
+        for cost, v in candidates:
+            if is_valid(u, v):
+                return cost, v
+        return None
+
+    # the heap holds (cost, vertex, target, stamp) entries; an entry
+    # is outdated if the stamp of its vertex has changed since
+    stamps = [0] * num_vertices
+    heap = []
+    for u in range(num_vertices):
+        best = get_best_collapse(u)
+        if best is not None:
+            heap.append((best[0], u, best[1], 0))
+    heapq.heapify(heap)
+
+    while num_alive > target and heap:
+        cost, u, v, stamp = heapq.heappop(heap)
+        if stamp != stamps[u]:
+            continue
+        if max_cost is not None and cost > max_cost:
+            break
+        # the cost only changes along with the stamp, but changes
+        # further away can still make the collapse invalid
+        if not is_valid(u, v):
+            stamps[u] += 1
+            best = get_best_collapse(u)
+            if best is not None:
+                heapq.heappush(heap, (best[0], u, best[1], stamps[u]))
+            continue
+        # collapse u into v
+        pos_u, pos_v = pos_map[u], pos_map[v]
+        for t in vert_tris[u]:
+            tri = tris[t]
+            pos_tris[pos_u].discard(t)
+            if v in tri:
+                alive[t] = False
+                num_alive -= 1
+                for i in tri:
+                    if i != u:
+                        vert_tris[i].discard(t)
+                        pos_tris[pos_map[i]].discard(t)
+            else:
+                tri[tri.index(u)] = v
+                vert_tris[v].add(t)
+                pos_tris[pos_v].add(t)
+        vert_tris[u] = set()
+        v_map[u] = v
+        quadrics[pos_v] = [q_u + q_v for q_u, q_v
+                           in zip(quadrics[pos_u], quadrics[pos_v])]
+        # update the collapses around v
+        stamps[u] += 1
+        for w in set(i for t in pos_tris[pos_v] for i in tris[t]):
+            stamps[w] += 1
+            best = get_best_collapse(w)
+            if best is not None:
+                heapq.heappush(heap, (best[0], w, best[1], stamps[w]))
+
+    # follow chains of collapses
+    for i in range(num_vertices):
+        j = i
+        while v_map[j] != j:
+            j = v_map[j]
+        v_map[i] = j
+    return v_map, [tuple(tri) for t, tri in enumerate(tris) if alive[t]]
+
+if __name__=='__main__':
+    import doctest
+    doctest.testmod()
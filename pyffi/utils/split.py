@@ -0,0 +1,192 @@
+"""Split meshes into spatially coherent chunks.
+
+The triangles are organized in a bounding volume hierarchy: starting
+from the full mesh, a set of triangles which uses too many vertices,
+or which is too large, is split in two halves at the median of the
+triangle centroids along their longest axis. The leaves of the
+hierarchy are the chunks. If numpy is available, the hierarchy is
+built in bulk, otherwise a pure Python implementation is used which
+gives identical results.
+"""
+
+# ***** BEGIN LICENSE BLOCK *****
+#
+# Copyright (c) 2007-2009, Python File Format Interface
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#
+#    * Redistributions in binary form must reproduce the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer in the documentation and/or other materials provided
+#      with the distribution.
+#
+#    * Neither the name of the Python File Format Interface
+#      project nor the names of its contributors may be used to endorse
+#      or promote products derived from this software without specific
+#      prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# ***** END LICENSE BLOCK *****
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from pyffi.utils import unique_map
+
+MAX_VERTICES = 65535
+"""Largest number of vertices that a single geometry can index."""
+
+def _get_chunks(vertices, triangles, max_vertices, max_radius):
+    """Pure Python implementation of :func:`get_chunks`."""
+    corners = [[vertices[i] for i in tri] for tri in triangles]
+    centroids = [tuple((p0[k] + p1[k] + p2[k]) / 3.0 for k in range(3))
+                 for p0, p1, p2 in corners]
+    chunks = []
+    stack = [list(range(len(triangles)))]
+    while stack:
+        indices = stack.pop()
+        if len(indices) > 1:
+            is_leaf = (
+                len(set(i for t in indices for i in triangles[t]))
+                <= max_vertices)
+            if is_leaf and max_radius is not None:
+                points = [p for t in indices for p in corners[t]]
+                extent = [max(p[k] for p in points)
+                          - min(p[k] for p in points) for k in range(3)]
+                is_leaf = (0.5 * sum(x * x for x in extent) ** 0.5
+                           <= max_radius)
+        else:
+            is_leaf = True
+        if is_leaf:
+            chunks.append(sorted(indices))
+            continue
+        # split at the median along the longest axis of the centroids
+        extent = [max(centroids[t][k] for t in indices)
+                  - min(centroids[t][k] for t in indices) for k in range(3)]
+        axis = max(range(3), key=extent.__getitem__)
+        indices = sorted(indices, key=lambda t: centroids[t][axis])
+        half = len(indices) // 2
+        stack.append(indices[half:])
+        stack.append(indices[:half])
+    return chunks
+
+def _get_chunks_numpy(vertices, triangles, max_vertices, max_radius):
+    """Implementation of :func:`get_chunks` using numpy."""
+    points = numpy.array(vertices, dtype=numpy.float64).reshape(-1, 3)
+    tris = numpy.array(triangles, dtype=numpy.int64).reshape(-1, 3)
+    corners = points[tris]
+    centroids = (corners[:, 0] + corners[:, 1] + corners[:, 2]) / 3.0
+    lows = corners.min(axis=1)
+    highs = corners.max(axis=1)
+    chunks = []
+    stack = [numpy.arange(len(tris))]
+    while stack:
+        indices = stack.pop()
+        if len(indices) > 1:
+            is_leaf = numpy.unique(tris[indices]).size <= max_vertices
+            if is_leaf and max_radius is not None:
+                extent = highs[indices].max(axis=0) - lows[indices].min(axis=0)
+                is_leaf = 0.5 * numpy.sqrt(numpy.dot(extent, extent)) \
+                    <= max_radius
+        else:
+            is_leaf = True
+        if is_leaf:
+            chunks.append(numpy.sort(indices).tolist())
+            continue
+        # split at the median along the longest axis of the centroids
+        coords = centroids[indices]
+        axis = numpy.argmax(coords.max(axis=0) - coords.min(axis=0))
+        indices = indices[numpy.argsort(coords[:, axis], kind="stable")]
+        half = len(indices) // 2
+        stack.append(indices[half:])
+        stack.append(indices[:half])
+    return chunks
+
+def get_chunks(vertices, triangles, max_vertices=MAX_VERTICES,
+               max_radius=None, use_numpy=True):
+    """Split the triangles of a mesh into chunks which each use at
+    most ``max_vertices`` vertices, and whose bounding box has at most
+    radius ``max_radius``. Chunks which consist of a single triangle
+    are never split further.
+
+    >>> verts = [(x, y, 0.0) for y in range(3) for x in range(5)]
+    >>> tris = []
+    >>> for y in range(2):
+    ...     for x in range(4):
+    ...         i = 5 * y + x
+    ...         tris += [(i, i + 1, i + 6), (i, i + 6, i + 5)]
+    >>> get_chunks(verts, tris)
+    [[0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15]]
+    >>> get_chunks(verts, tris, max_vertices=9)
+    [[0, 1, 2, 3, 8, 9, 10, 11], [4, 5, 6, 7, 12, 13, 14, 15]]
+    >>> get_chunks(verts, tris, max_radius=1.0)
+    [[0, 1], [8, 9], [2, 3], [10, 11], [4, 5], [6, 7], [12, 13], [14, 15]]
+    >>> get_chunks(verts, tris, max_radius=1.0, use_numpy=False)
+    [[0, 1], [8, 9], [2, 3], [10, 11], [4, 5], [6, 7], [12, 13], [14, 15]]
+    >>> get_chunks(verts, [])
+    []
+
+    :param vertices: The position of each vertex.
+    :type vertices: ``list`` of 3-tuples of ``float``
+    :param triangles: The triangles, as triples of vertex indices.
+    :type triangles: ``list`` of 3-tuples of ``int``
+    :param max_vertices: Largest number of vertices of a chunk.
+    :type max_vertices: ``int``
+    :param max_radius: Largest radius of a chunk, or ``None`` for no
+        limit.
+    :type max_radius: ``float``
+    :param use_numpy: Whether to use numpy, if it is available.
+    :type use_numpy: ``bool``
+    :return: For each chunk, the sorted indices of its triangles. Each
+        triangle belongs to exactly one chunk.
+    """
+    if not triangles:
+        return []
+    if use_numpy and numpy is not None:
+        return _get_chunks_numpy(vertices, triangles, max_vertices,
+                                 max_radius)
+    else:
+        return _get_chunks(vertices, triangles, max_vertices, max_radius)
+
+def get_chunk_map(triangles, chunk):
+    """Return the vertices used by a chunk, in order of first use, and
+    the triangles of the chunk indexing these vertices.
+
+    >>> get_chunk_map([(0, 1, 2), (2, 1, 3), (3, 4, 5)], [1, 2])
+    ([2, 1, 3, 4, 5], [(0, 1, 2), (2, 3, 4)])
+
+    :param triangles: The triangles of the mesh.
+    :type triangles: ``list`` of 3-tuples of ``int``
+    :param chunk: Indices of the triangles of the chunk.
+    :type chunk: ``list`` of ``int``
+    :return: A map from new to old vertex index, and the remapped
+        triangles.
+    """
+    indices = [i for t in chunk for i in triangles[t]]
+    v_map, v_map_inverse = unique_map(indices)
+    return ([indices[i] for i in v_map_inverse],
+            list(zip(*[iter(v_map)] * 3)))
+
+if __name__=='__main__':
+    import doctest
+    doctest.testmod()
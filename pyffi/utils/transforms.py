@@ -0,0 +1,291 @@
+"""Kernels for 3x3 and 4x4 transform matrices.
+
+Matrices are given as rows, and vectors are row vectors which are
+multiplied on the left, as in the nif format, so a 4x4 transform
+holds its translation in the last row. The single matrix kernels work
+on nested tuples (or lists), and are used by the matrix classes of
+the formats, which only need to read and write their elements once.
+
+The batch functions work on many matrices at once, for instance on the
+transforms of all bones of a skin. If numpy is available, they accept
+and return arrays of shape ``(N, 4, 4)``, and all matrices are
+processed in bulk. Otherwise, they return lists of tuples, computed
+with the single matrix kernels, which gives the same results.
+
+>>> rot = ((0, 1, 0), (-1, 0, 0), (0, 0, 1))
+>>> m = compose_scale_rotation_translation(2, rot, (1, 2, 3))
+>>> m
+((0, 2, 0, 0.0), (-2, 0, 0, 0.0), (0, 0, 2, 0.0), (1, 2, 3, 1.0))
+>>> is_identity(mul44(m, inverse44(m)))
+True
+>>> is_identity(mul44(inverse44_fast(m), m))
+True
+>>> decompose_scale_rotation_translation(m)
+(2.0, ((0.0, 1.0, 0.0), (-1.0, 0.0, 0.0), (0.0, 0.0, 1.0)), (1, 2, 3))
+>>> ms = batch_mul(
+...     batch_inverse([m, m], fast=True), [m, m])
+>>> [is_identity(tuple(tuple(row) for row in n)) for n in ms]
+[True, True]
+"""
+
+# ***** BEGIN LICENSE BLOCK *****
+#
+# Copyright (c) 2007-2009, Python File Format Interface
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#
+#    * Redistributions in binary form must reproduce the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer in the documentation and/or other materials provided
+#      with the distribution.
+#
+#    * Neither the name of the Python File Format Interface
+#      project nor the names of its contributors may be used to endorse
+#      or promote products derived from this software without specific
+#      prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# ***** END LICENSE BLOCK *****
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+EPSILON = 0.0001
+"""Tolerance for identity checks and for singular matrices."""
+
+def mul33(a, b):
+    """Return the product of two 3x3 matrices.
+
+    >>> mul33(((1, 2, 0), (0, 1, 0), (0, 0, 1)),
+    ...       ((1, 0, 0), (3, 1, 0), (0, 0, 2)))
+    ((7, 2, 0), (3, 1, 0), (0, 0, 2))
+    """
+    (a11, a12, a13), (a21, a22, a23), (a31, a32, a33) = a
+    (b11, b12, b13), (b21, b22, b23), (b31, b32, b33) = b
+    return (
+        (a11 * b11 + a12 * b21 + a13 * b31,
+         a11 * b12 + a12 * b22 + a13 * b32,
+         a11 * b13 + a12 * b23 + a13 * b33),
+        (a21 * b11 + a22 * b21 + a23 * b31,
+         a21 * b12 + a22 * b22 + a23 * b32,
+         a21 * b13 + a22 * b23 + a23 * b33),
+        (a31 * b11 + a32 * b21 + a33 * b31,
+         a31 * b12 + a32 * b22 + a33 * b32,
+         a31 * b13 + a32 * b23 + a33 * b33))
+
+def mul44(a, b):
+    """Return the product of two 4x4 matrices."""
+    ((a11, a12, a13, a14), (a21, a22, a23, a24),
+     (a31, a32, a33, a34), (a41, a42, a43, a44)) = a
+    ((b11, b12, b13, b14), (b21, b22, b23, b24),
+     (b31, b32, b33, b34), (b41, b42, b43, b44)) = b
+    return (
+        (a11 * b11 + a12 * b21 + a13 * b31 + a14 * b41,
+         a11 * b12 + a12 * b22 + a13 * b32 + a14 * b42,
+         a11 * b13 + a12 * b23 + a13 * b33 + a14 * b43,
+         a11 * b14 + a12 * b24 + a13 * b34 + a14 * b44),
+        (a21 * b11 + a22 * b21 + a23 * b31 + a24 * b41,
+         a21 * b12 + a22 * b22 + a23 * b32 + a24 * b42,
+         a21 * b13 + a22 * b23 + a23 * b33 + a24 * b43,
+         a21 * b14 + a22 * b24 + a23 * b34 + a24 * b44),
+        (a31 * b11 + a32 * b21 + a33 * b31 + a34 * b41,
+         a31 * b12 + a32 * b22 + a33 * b32 + a34 * b42,
+         a31 * b13 + a32 * b23 + a33 * b33 + a34 * b43,
+         a31 * b14 + a32 * b24 + a33 * b34 + a34 * b44),
+        (a41 * b11 + a42 * b21 + a43 * b31 + a44 * b41,
+         a41 * b12 + a42 * b22 + a43 * b32 + a44 * b42,
+         a41 * b13 + a42 * b23 + a43 * b33 + a44 * b43,
+         a41 * b14 + a42 * b24 + a43 * b34 + a44 * b44))
+
+def inverse33_fast(m):
+    """Return the inverse of a 3x3 matrix which is a scale times a
+    rotation: its transpose divided by the square of the scale.
+
+    >>> inverse33_fast(((0, 2, 0), (-2, 0, 0), (0, 0, 2)))
+    ((0.0, -0.5, 0.0), (0.5, 0.0, 0.0), (0.0, 0.0, 0.5))
+    """
+    (m11, m12, m13), (m21, m22, m23), (m31, m32, m33) = m
+    scale2 = m11 * m11 + m12 * m12 + m13 * m13
+    return ((m11 / scale2, m21 / scale2, m31 / scale2),
+            (m12 / scale2, m22 / scale2, m32 / scale2),
+            (m13 / scale2, m23 / scale2, m33 / scale2))
+
+def inverse44_fast(m):
+    """Return the inverse of a 4x4 matrix which is composed of a scale,
+    a rotation, and a translation."""
+    ((m11, m12, m13, m14), (m21, m22, m23, m24),
+     (m31, m32, m33, m34), (tx, ty, tz, m44)) = m
+    (n11, n12, n13), (n21, n22, n23), (n31, n32, n33) = inverse33_fast(
+        ((m11, m12, m13), (m21, m22, m23), (m31, m32, m33)))
+    return (
+        (n11, n12, n13, 0.0),
+        (n21, n22, n23, 0.0),
+        (n31, n32, n33, 0.0),
+        (-(tx * n11 + ty * n21 + tz * n31),
+         -(tx * n12 + ty * n22 + tz * n32),
+         -(tx * n13 + ty * n23 + tz * n33),
+         1.0))
+
+def inverse44(m, epsilon=EPSILON):
+    """Return the inverse of an arbitrary 4x4 matrix.
+
+    >>> inverse44(((2, 0, 0, 0), (0, 4, 0, 0), (0, 0, 1, 0), (0, 0, 0, 1)))
+    ((0.5, 0.0, 0.0, 0.0), (0.0, 0.25, 0.0, 0.0), (0.0, 0.0, 1.0, 0.0), (0.0, 0.0, 0.0, 1.0))
+    >>> inverse44(((1, 0, 0, 0), (0, 0, 0, 0), (0, 0, 1, 0), (0, 0, 0, 1)))
+    Traceback (most recent call last):
+        ...
+    ZeroDivisionError: cannot invert singular matrix
+
+    :param m: The matrix.
+    :param epsilon: Matrices whose determinant is smaller than this,
+        in absolute value, are considered singular.
+    :raise ZeroDivisionError: If the matrix is singular.
+    """
+    ((m11, m12, m13, m14), (m21, m22, m23, m24),
+     (m31, m32, m33, m34), (m41, m42, m43, m44)) = m
+    # 2x2 minors of the lower two rows, and of the upper two rows
+    s0 = m31 * m42 - m41 * m32
+    s1 = m31 * m43 - m41 * m33
+    s2 = m31 * m44 - m41 * m34
+    s3 = m32 * m43 - m42 * m33
+    s4 = m32 * m44 - m42 * m34
+    s5 = m33 * m44 - m43 * m34
+    c0 = m11 * m22 - m21 * m12
+    c1 = m11 * m23 - m21 * m13
+    c2 = m11 * m24 - m21 * m14
+    c3 = m12 * m23 - m22 * m13
+    c4 = m12 * m24 - m22 * m14
+    c5 = m13 * m24 - m23 * m14
+    det = c0 * s5 - c1 * s4 + c2 * s3 + c3 * s2 - c4 * s1 + c5 * s0
+    if abs(det) < epsilon:
+        raise ZeroDivisionError("cannot invert singular matrix")
+    inv = 1.0 / det
+    return (
+        ((m22 * s5 - m23 * s4 + m24 * s3) * inv,
+         (-m12 * s5 + m13 * s4 - m14 * s3) * inv,
+         (m42 * c5 - m43 * c4 + m44 * c3) * inv,
+         (-m32 * c5 + m33 * c4 - m34 * c3) * inv),
+        ((-m21 * s5 + m23 * s2 - m24 * s1) * inv,
+         (m11 * s5 - m13 * s2 + m14 * s1) * inv,
+         (-m41 * c5 + m43 * c2 - m44 * c1) * inv,
+         (m31 * c5 - m33 * c2 + m34 * c1) * inv),
+        ((m21 * s4 - m22 * s2 + m24 * s0) * inv,
+         (-m11 * s4 + m12 * s2 - m14 * s0) * inv,
+         (m41 * c4 - m42 * c2 + m44 * c0) * inv,
+         (-m31 * c4 + m32 * c2 - m34 * c0) * inv),
+        ((-m21 * s3 + m22 * s1 - m23 * s0) * inv,
+         (m11 * s3 - m12 * s1 + m13 * s0) * inv,
+         (-m41 * c3 + m42 * c1 - m43 * c0) * inv,
+         (m31 * c3 - m32 * c1 + m33 * c0) * inv))
+
+def is_identity(m, epsilon=EPSILON):
+    """Return ``True`` if the square matrix is close to identity."""
+    return all(abs(elem - (1.0 if i == j else 0.0)) <= epsilon
+               for i, row in enumerate(m)
+               for j, elem in enumerate(row))
+
+def compose_scale_rotation_translation(scale, rotation, translation):
+    """Return the 4x4 matrix of a uniform scale, followed by a 3x3
+    rotation, followed by a translation."""
+    (r11, r12, r13), (r21, r22, r23), (r31, r32, r33) = rotation
+    tx, ty, tz = translation
+    return (
+        (r11 * scale, r12 * scale, r13 * scale, 0.0),
+        (r21 * scale, r22 * scale, r23 * scale, 0.0),
+        (r31 * scale, r32 * scale, r33 * scale, 0.0),
+        (tx, ty, tz, 1.0))
+
+def decompose_scale_rotation_translation(m):
+    """Decompose a 4x4 matrix into a uniform scale, a 3x3 rotation, and
+    a translation; the inverse of
+    :func:`compose_scale_rotation_translation`, assuming that the
+    matrix is composed in this way.
+
+    :raise ZeroDivisionError: If the scale is zero.
+    """
+    ((m11, m12, m13, m14), (m21, m22, m23, m24),
+     (m31, m32, m33, m34), (m41, m42, m43, m44)) = m
+    det = (m11 * m22 * m33 + m12 * m23 * m31 + m13 * m21 * m32
+           - m31 * m22 * m13 - m21 * m12 * m33 - m11 * m32 * m23)
+    if det < 0:
+        scale = -((-det) ** (1.0 / 3.0))
+    else:
+        scale = det ** (1.0 / 3.0)
+    return (scale,
+            ((m11 / scale, m12 / scale, m13 / scale),
+             (m21 / scale, m22 / scale, m23 / scale),
+             (m31 / scale, m32 / scale, m33 / scale)),
+            (m41, m42, m43))
+
+def batch_mul(a, b):
+    """Multiply two sequences of 4x4 matrices, pairwise."""
+    if numpy is not None:
+        a = numpy.asarray(a, dtype=float).reshape(-1, 4, 4)
+        b = numpy.asarray(b, dtype=float).reshape(-1, 4, 4)
+        return numpy.matmul(a, b)
+    return [mul44(m, n) for m, n in zip(a, b)]
+
+def batch_inverse(a, fast=True, epsilon=EPSILON):
+    """Invert a sequence of 4x4 matrices.
+
+    :param a: The matrices.
+    :param fast: If ``True``, the matrices are assumed to be composed
+        of a scale, a rotation, and a translation (see
+        :func:`inverse44_fast`).
+    :param epsilon: See :func:`inverse44`.
+    :raise ZeroDivisionError: If any of the matrices is singular.
+    """
+    if numpy is None:
+        if fast:
+            return [inverse44_fast(m) for m in a]
+        return [inverse44(m, epsilon) for m in a]
+    a = numpy.asarray(a, dtype=float).reshape(-1, 4, 4)
+    if fast:
+        rot = a[:, :3, :3]
+        scale2 = (rot[:, 0, :] ** 2).sum(axis=1)
+        result = numpy.zeros_like(a)
+        result[:, :3, :3] = rot.transpose(0, 2, 1) / scale2[:, None, None]
+        result[:, 3, :3] = -numpy.matmul(a[:, 3:, :3], result[:, :3, :3])[:, 0]
+        result[:, 3, 3] = 1.0
+        return result
+    if len(a) and (numpy.abs(numpy.linalg.det(a)) < epsilon).any():
+        raise ZeroDivisionError("cannot invert singular matrix")
+    return numpy.linalg.inv(a)
+
+def batch_decompose_scale_rotation_translation(a):
+    """Decompose a sequence of 4x4 matrices, as in
+    :func:`decompose_scale_rotation_translation`.
+
+    :return: The scales, rotations, and translations.
+    :raise ZeroDivisionError: If any of the scales is zero.
+    """
+    if numpy is None:
+        decomposed = [decompose_scale_rotation_translation(m) for m in a]
+        return ([scale for scale, rot, trans in decomposed],
+                [rot for scale, rot, trans in decomposed],
+                [trans for scale, rot, trans in decomposed])
+    a = numpy.asarray(a, dtype=float).reshape(-1, 4, 4)
+    scales = numpy.cbrt(numpy.linalg.det(a[:, :3, :3]))
+    if (scales == 0).any():
+        raise ZeroDivisionError("scale is zero, unable to obtain rotation")
+    return scales, a[:, :3, :3] / scales[:, None, None], a[:, 3, :3]
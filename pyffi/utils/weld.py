@@ -0,0 +1,180 @@
+"""Fast detection of duplicate vertices.
+
+Vertices are compared by quantizing their attributes (position, normal,
+uv coordinates, colors, ...) to integers, and looking for identical
+rows. If numpy is available, all vertices are processed in bulk,
+otherwise a pure Python implementation is used which gives identical
+results.
+"""
+
+# ***** BEGIN LICENSE BLOCK *****
+#
+# Copyright (c) 2007-2009, Python File Format Interface
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#
+#    * Redistributions in binary form must reproduce the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer in the documentation and/or other materials provided
+#      with the distribution.
+#
+#    * Neither the name of the Python File Format Interface
+#      project nor the names of its contributors may be used to endorse
+#      or promote products derived from this software without specific
+#      prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# ***** END LICENSE BLOCK *****
+
+import logging
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from pyffi.utils import unique_map
+from pyffi.utils.mathutils import float_to_int
+
+# beyond this absolute value, quantized floats might not fit into a
+# 64 bit integer, in which case we fall back to the python implementation
+_MAX_QUANTIZED = 2.0 ** 62
+
+def _quantize_row(values, factor):
+    """Quantize the values of a single row with float_to_int."""
+    if factor is None:
+        return tuple(values)
+    else:
+        return tuple(float_to_int(value * factor) for value in values)
+
+def _quantize_array(rows, factor):
+    """Quantize rows into a 2D numpy integer array, rounding exactly as
+    float_to_int does. Returns ``None`` if the values are too large to
+    be represented.
+    """
+    if factor is None:
+        return numpy.array(rows, dtype=numpy.int64).reshape(len(rows), -1)
+    values = numpy.array(rows, dtype=numpy.float64).reshape(len(rows), -1)
+    values = values * factor
+    nans = numpy.isnan(values)
+    infs = numpy.isinf(values)
+    if nans.any() or infs.any():
+        logger = logging.getLogger("pyffi.utils.weld")
+        if nans.any():
+            logger.warn("converted %i nan to 0." % nans.sum())
+        if infs.any():
+            logger.warn("converted %i inf to +/-2147483648." % infs.sum())
+        values[nans] = 0.0
+        values[infs] = numpy.copysign(2147483648.0, values[infs])
+    if (numpy.abs(values) >= _MAX_QUANTIZED).any():
+        return None
+    # round half away from zero
+    return numpy.trunc(
+        numpy.where(values > 0, values + 0.5, values - 0.5)
+        ).astype(numpy.int64)
+
+def _unique_map_numpy(columns, num_rows):
+    """Implementation of :func:`unique_map_quantized` using numpy.
+    Returns ``None`` if the data cannot be handled.
+    """
+    arrays = []
+    for rows, factor in columns:
+        array = _quantize_array(rows, factor)
+        if array is None:
+            return None
+        arrays.append(array)
+    keys = numpy.hstack(arrays)
+    if keys.shape[1] == 0:
+        # nothing to compare, so all rows are identical
+        return [0] * num_rows, [0]
+    # sort rows lexicographically (lexsort is stable, so within a group
+    # of identical rows, the first occurrence comes first)
+    order = numpy.lexsort(keys.T[::-1])
+    sorted_keys = keys[order]
+    is_start = numpy.empty(num_rows, dtype=bool)
+    is_start[0] = True
+    numpy.any(sorted_keys[1:] != sorted_keys[:-1], axis=1, out=is_start[1:])
+    # index of the group of every sorted row, and first row of every group
+    group = numpy.cumsum(is_start) - 1
+    first = order[is_start]
+    # new indices follow the order in which unique rows first occur
+    group_order = numpy.argsort(first, kind="stable")
+    rank = numpy.empty_like(group_order)
+    rank[group_order] = numpy.arange(len(group_order))
+    v_map = numpy.empty(num_rows, dtype=numpy.int64)
+    v_map[order] = rank[group]
+    return v_map.tolist(), first[group_order].tolist()
+
+def unique_map_quantized(columns, use_numpy=True):
+    """Return a map and inverse map to identify unique rows, after
+    quantizing their values. The result is the same as that of
+    :func:`pyffi.utils.unique_map` applied on the rows of quantized
+    values, but is much faster for large data if numpy is available.
+
+    Each column is a pair ``(rows, factor)``, where ``rows`` is a
+    sequence with, for each vertex, a sequence of floats, and ``factor``
+    is the factor with which to multiply the floats before rounding them
+    to an integer with :func:`pyffi.utils.mathutils.float_to_int`. If
+    ``factor`` is ``None``, then the values are taken to be integers
+    already, and are not converted. All columns must have the same
+    number of rows.
+
+    >>> verts = [(0.0, 0.0, 1.0), (0.0, 0.0, 1.0001), (0.0, 1.0, 0.0),
+    ...          (0.0, 0.0, 0.9996), (0.0, 1.0, 0.0)]
+    >>> uvs = [(0.1, 0.1), (0.1, 0.1), (0.2, 0.2), (0.1, 0.1), (0.3, 0.3)]
+    >>> unique_map_quantized([(verts, 1000)])
+    ([0, 0, 1, 0, 1], [0, 2])
+    >>> unique_map_quantized([(verts, 1000), (uvs, 100)])
+    ([0, 0, 1, 0, 2], [0, 2, 4])
+    >>> unique_map_quantized([(verts, 1000), (uvs, 100)], use_numpy=False)
+    ([0, 0, 1, 0, 2], [0, 2, 4])
+    >>> unique_map_quantized([([(1,), (2,), (1,)], None)])
+    ([0, 1, 0], [0, 1])
+    >>> unique_map_quantized([([], 1000)])
+    ([], [])
+    >>> unique_map_quantized([([(), ()], 1000)])
+    ([0, 0], [0])
+
+    :param columns: The columns, as (rows, factor) pairs.
+    :type columns: ``list``
+    :param use_numpy: Whether to use numpy, if it is available.
+    :type use_numpy: ``bool``
+    :return: A map from old index to new index, and its inverse map
+        from new index to old index (the first occurrence).
+    """
+    num_rows = len(columns[0][0]) if columns else 0
+    if any(len(rows) != num_rows for rows, factor in columns):
+        raise ValueError("all columns must have the same number of rows")
+    if num_rows == 0:
+        return [], []
+    if use_numpy and numpy is not None:
+        result = _unique_map_numpy(columns, num_rows)
+        if result is not None:
+            return result
+    factors = [factor for rows, factor in columns]
+    return unique_map(
+        sum((_quantize_row(values, factor)
+             for values, factor in zip(row, factors)), ())
+        for row in zip(*[rows for rows, factor in columns]))
+
+if __name__=='__main__':
+    import doctest
+    doctest.testmod()
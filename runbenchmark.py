@@ -0,0 +1,495 @@
+#!/usr/bin/python
+
+"""Benchmarks for detecting performance regressions.
+
+Times class generation, inspect, read, write, and round trip of every
+file format on the files under tests/, and some of the heavier
+utilities on synthetic meshes. Results are saved as json, and can be
+compared against a saved baseline::
+
+    python runbenchmark.py --output=baseline.json
+    # ... change some code ...
+    python runbenchmark.py --baseline=baseline.json --threshold=0.2
+
+Positional arguments are regular expressions: only benchmarks whose
+name matches any of them are run. File names are relative to the
+current folder, so results are not written into the source tree
+unless you run the script from there.
+"""
+
+
+# --------------------------------------------------------------------------
+# ***** BEGIN LICENSE BLOCK *****
+#
+# Copyright (c) 2007-2009, Python File Format Interface
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#
+#    * Redistributions in binary form must reproduce the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer in the documentation and/or other materials provided
+#      with the distribution.
+#
+#    * Neither the name of the Python File Format Interface
+#      project nor the names of its contributors may be used to endorse
+#      or promote products derived from this software without specific
+#      prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# ***** END LICENSE BLOCK *****
+# --------------------------------------------------------------------------
+
+
+from io import BytesIO
+import json
+import logging
+import math
+import optparse
+import os
+import random
+import re
+import subprocess
+import sys
+import time
+
+FORMATS = ["nif", "cgf", "kfm", "dds", "tga", "egm", "egt", "tri", "psk",
+           "bsa", "esp", "dae"]
+"""Names of all format modules in pyffi.formats."""
+
+MIN_TIME = 0.001
+"""Timings below this value, in seconds, are not compared."""
+
+def get_format(name):
+    """Import a format module, and return its format class."""
+    module = __import__("pyffi.formats." + name, fromlist=[name])
+    return getattr(module, name.capitalize() + "Format")
+
+def best_time(func, repeat):
+    """Run func repeat times, and return the best timing, in seconds."""
+    result = None
+    for i in range(repeat):
+        start = time.time()
+        func()
+        timing = time.time() - start
+        if result is None or timing < result:
+            result = timing
+    return result
+
+def generate_grid(size):
+    """Synthetic mesh: a wavy square grid of size x size quads.
+
+    :return: Vertices, normals, uvs, and triangles of the grid.
+    """
+    vertices = []
+    normals = []
+    uvs = []
+    for i in range(size + 1):
+        for j in range(size + 1):
+            vertices.append((i, j, math.sin(i * 0.3) * math.cos(j * 0.2)))
+            normals.append((0.0, 0.0, 1.0))
+            uvs.append((i / size, j / size))
+    triangles = []
+    for i in range(size):
+        for j in range(size):
+            v = i * (size + 1) + j
+            triangles.append((v, v + 1, v + size + 1))
+            triangles.append((v + 1, v + size + 2, v + size + 1))
+    return vertices, normals, uvs, triangles
+
+# benchmark generators: each generator yields pairs (name, func)
+
+def benchmarks_import():
+    """Time import of every format, which includes class generation.
+    Every import is done in a new interpreter.
+    """
+    for name in FORMATS:
+        yield ("import:%s" % name,
+               lambda name=name: subprocess.check_call(
+                   [sys.executable, "-c", "import pyffi.formats." + name]))
+
+def benchmarks_format(name):
+    """Time inspect, read, write, and round trip on all test files of
+    the given format.
+    """
+    try:
+        fileformat = get_format(name)
+    except Exception:
+        # for instance, dae is not supported on py3k yet
+        logging.getLogger("pyffi.benchmark").warn(
+            "cannot import %s, skipped" % name)
+        return
+    top = os.path.join("tests", name)
+    for stream in fileformat.walk(top):
+        with stream:
+            buf = stream.read()
+        filename = stream.name.replace(os.sep, "/")
+        data = fileformat.Data()
+        try:
+            data.read(BytesIO(buf))
+        except Exception:
+            # not all test files are valid
+            continue
+        try:
+            data.write(BytesIO())
+        except Exception:
+            # writing is not supported by all formats
+            writable = False
+        else:
+            writable = True
+        def inspect(buf=buf):
+            fileformat.Data().inspect(BytesIO(buf))
+        def read(buf=buf):
+            fileformat.Data().read(BytesIO(buf))
+        def write(data=data):
+            data.write(BytesIO())
+        def roundtrip(buf=buf):
+            data = fileformat.Data()
+            data.read(BytesIO(buf))
+            outstream = BytesIO()
+            data.write(outstream)
+            fileformat.Data().read(BytesIO(outstream.getvalue()))
+        yield "inspect:%s" % filename, inspect
+        yield "read:%s" % filename, read
+        if writable:
+            yield "write:%s" % filename, write
+            yield "roundtrip:%s" % filename, roundtrip
+
+def benchmarks_scale():
+    """Time apply_scale on all blocks of every nif test file, as done
+    by the fix_scale spell.
+    """
+    try:
+        from pyffi.formats.nif import NifFormat
+    except Exception:
+        logging.getLogger("pyffi.benchmark").warn(
+            "cannot import nif, skipped apply_scale")
+        return
+    for stream in NifFormat.walk(os.path.join("tests", "nif")):
+        with stream:
+            buf = stream.read()
+        filename = stream.name.replace(os.sep, "/")
+        data = NifFormat.Data()
+        try:
+            data.read(BytesIO(buf))
+        except Exception:
+            continue
+        def apply_scale(data=data):
+            for block in data.blocks:
+                block.apply_scale(1.01)
+        yield "apply_scale:%s" % filename, apply_scale
+
+def benchmarks_utils(scale):
+    """Time utilities on synthetic meshes; the size of the meshes
+    grows linearly with scale.
+    """
+    import pyffi.utils.quickhull
+    import pyffi.utils.tangentspace
+    import pyffi.utils.tristrip
+    import pyffi.utils.vertex_cache
+    size = int(32 * math.sqrt(scale))
+    vertices, normals, uvs, triangles = generate_grid(size)
+    rand = random.Random(0)
+    points = [(rand.random(), rand.random(), rand.random())
+              for i in range(1000 * scale)]
+    yield ("utils:tristrip.stripify",
+           lambda: pyffi.utils.tristrip.stripify(triangles))
+    yield ("utils:vertex_cache.get_cache_optimized_triangles",
+           lambda: pyffi.utils.vertex_cache.get_cache_optimized_triangles(
+               triangles))
+    yield ("utils:quickhull.qhull3d",
+           lambda: pyffi.utils.quickhull.qhull3d(points))
+    yield ("utils:tangentspace.getTangentSpace",
+           lambda: pyffi.utils.tangentspace.getTangentSpace(
+               vertices=vertices, normals=normals, uvs=uvs,
+               triangles=triangles))
+    try:
+        from pyffi.formats.nif import NifFormat
+    except Exception:
+        logging.getLogger("pyffi.benchmark").warn(
+            "cannot import nif, skipped update_skin_partition")
+        return
+    def update_skin_partition():
+        # skinned grid with one bone per row of quads
+        geom = NifFormat.NiTriShape()
+        geom.data = NifFormat.NiTriShapeData()
+        geom.data.num_vertices = len(vertices)
+        geom.data.has_vertices = True
+        geom.data.vertices.update_size()
+        for vert, (x, y, z) in zip(geom.data.vertices, vertices):
+            vert.x, vert.y, vert.z = x, y, z
+        geom.data.set_triangles(triangles)
+        skelroot = NifFormat.NiNode()
+        skelroot.add_child(geom)
+        geom.skin_instance = NifFormat.NiSkinInstance()
+        geom.skin_instance.skeleton_root = skelroot
+        geom.skin_instance.data = NifFormat.NiSkinData()
+        for i in range(size + 1):
+            bone = NifFormat.NiNode()
+            skelroot.add_child(bone)
+            geom.add_bone(bone, dict((i * (size + 1) + j, 1.0)
+                                     for j in range(size + 1)))
+        geom.update_skin_partition(maxbonesperpartition=4)
+    yield "utils:update_skin_partition", update_skin_partition
+
+def benchmarks_hull():
+    """Time the convex hull of random points in a cube, from a thousand
+    up to a million points; sizes above ten thousand are only timed if
+    numpy is available.
+    """
+    import pyffi.utils.quickhull
+    rand = random.Random(0)
+    for size in (1000, 10000, 100000, 1000000):
+        if size > 10000 and pyffi.utils.quickhull.numpy is None:
+            break
+        points = [(rand.random(), rand.random(), rand.random())
+                  for i in range(size)]
+        yield ("utils:quickhull.qhull3d:%i" % size,
+               lambda points=points: pyffi.utils.quickhull.qhull3d(points))
+
+def benchmarks_split():
+    """Time splitting a grid mesh into chunks under the vertex limit,
+    from twenty thousand up to about a million triangles; sizes above
+    two hundred thousand triangles are only timed if numpy is
+    available.
+    """
+    import pyffi.utils.split
+    rand = random.Random(0)
+    for size in (100, 300, 700):
+        if size > 300 and pyffi.utils.split.numpy is None:
+            break
+        verts = [(x, y, rand.random())
+                 for y in range(size) for x in range(size)]
+        tris = []
+        for y in range(size - 1):
+            for x in range(size - 1):
+                i = size * y + x
+                tris += [(i, i + 1, i + size + 1), (i, i + size + 1, i + size)]
+        def func(verts=verts, tris=tris):
+            for chunk in pyffi.utils.split.get_chunks(verts, tris):
+                pyffi.utils.split.get_chunk_map(tris, chunk)
+        yield ("utils:split.get_chunks:%i" % len(tris), func)
+
+def benchmarks_tga():
+    """Time reading and writing uncompressed and RLE compressed
+    Targa images of 1024x1024 pixels, and of 4096x4096 pixels if numpy
+    is available. The images are generated in memory, with runs of
+    identical pixels so RLE compression is effective.
+    """
+    import pyffi.formats.tga
+    from pyffi.formats.tga import TgaFormat
+    rand = random.Random(0)
+    for size in (1024, 4096):
+        if size > 1024 and pyffi.formats.tga.numpy is None:
+            break
+        row = bytearray()
+        while len(row) < 4 * size:
+            row += bytes((rand.randrange(256), rand.randrange(256),
+                          rand.randrange(256), 255)) * rand.randrange(1, 16)
+        row = bytes(row[:4 * size])
+        pixel_data = b"".join(row[4 * i:] + row[:4 * i] for i in range(size))
+        for label, image_type in (("rgb", TgaFormat.ImageType.RGB),
+                                  ("rle_rgb", TgaFormat.ImageType.RLE_RGB)):
+            data = TgaFormat.Data()
+            data.header.image_type = image_type
+            data.header.width = size
+            data.header.height = size
+            data.header.pixel_size = 32
+            data.image.set_pixel_data(pixel_data, data.header)
+            stream = BytesIO()
+            data.write(stream)
+            buf = stream.getvalue()
+            def read(buf=buf):
+                TgaFormat.Data().read(BytesIO(buf))
+            def write(data=data):
+                # force encoding of the pixels
+                data.image.set_pixel_data(pixel_data, data.header)
+                data.write(BytesIO())
+            name = "%s:%ix%i" % (label, size, size)
+            yield "tga.read:%s" % name, read
+            yield "tga.write:%s" % name, write
+
+def benchmarks_dxt():
+    """Time block compression, decompression, and mipmap generation on
+    a 2048x2048 texture if numpy is available, and on a 256x256 texture
+    otherwise. A 2048x2048 texture has about 4.2 megapixels, so the
+    throughput in megapixels per second is 4.2 divided by the timing.
+    """
+    import pyffi.utils.dxt
+    size = 2048 if pyffi.utils.dxt.numpy is not None else 256
+    rand = random.Random(0)
+    # smooth gradients with some noise, and a few alpha levels
+    rgba = bytes(
+        value
+        for y in range(size) for x in range(size)
+        for value in ((x // 3) % 256, (y // 5) % 256,
+                      min(255, ((x + y) // 7) % 256 + rand.randrange(8)),
+                      255 if (x // 64 + y // 64) % 4 else 128))
+    name = "%ix%i" % (size, size)
+    for fmt in ("DXT1", "DXT5"):
+        buf = pyffi.utils.dxt.encode(rgba, size, size, fmt)
+        def encode(fmt=fmt):
+            pyffi.utils.dxt.encode(rgba, size, size, fmt)
+        def decode(fmt=fmt, buf=buf):
+            pyffi.utils.dxt.decode(buf, size, size, fmt)
+        yield "utils:dxt.encode:%s:%s" % (fmt, name), encode
+        yield "utils:dxt.decode:%s:%s" % (fmt, name), decode
+    for filter_ in sorted(pyffi.utils.dxt.FILTERS):
+        def get_mipmaps(filter_=filter_):
+            pyffi.utils.dxt.get_mipmaps(rgba, size, size, filter_=filter_)
+        yield "utils:dxt.get_mipmaps:%s:%s" % (filter_, name), get_mipmaps
+
+def benchmarks_cgf():
+    """Time reading a cgf file with thousands of chunks, built from
+    copies of the chunks of a test file, both fully, and lazily
+    followed by decoding a single chunk.
+    """
+    from pyffi.formats.cgf import CgfFormat
+    filename = "test.cgf"
+    with open(os.path.join("tests", "cgf", filename), "rb") as stream:
+        data = CgfFormat.Data()
+        data.read(stream)
+    chunks = []
+    for i in range(2500):
+        for chunk in data.chunks:
+            copy = chunk.__class__()
+            copy.deepcopy(chunk)
+            chunks.append(copy)
+    data.chunks = chunks
+    stream = BytesIO()
+    data.write(stream)
+    buf = stream.getvalue()
+    def read():
+        CgfFormat.Data().read(BytesIO(buf))
+    def read_lazy():
+        data = CgfFormat.Data()
+        data.read(BytesIO(buf), lazy=True)
+        data.get_chunk(0)
+    name = "%s:%i" % (filename, len(chunks))
+    yield "cgf.read:%s" % name, read
+    yield "cgf.read_lazy:%s" % name, read_lazy
+
+def run(names, repeat, scale):
+    """Run all benchmarks whose name matches one of the given regular
+    expressions.
+
+    :return: Maps each benchmark name to its best timing, in seconds,
+        or to ``None`` if the benchmark failed.
+    """
+    logger = logging.getLogger("pyffi.benchmark")
+    regexs = [re.compile(name) for name in names]
+    generators = [benchmarks_import()]
+    generators.extend(benchmarks_format(name) for name in FORMATS)
+    generators.append(benchmarks_scale())
+    generators.append(benchmarks_utils(scale))
+    generators.append(benchmarks_hull())
+    generators.append(benchmarks_split())
+    generators.append(benchmarks_tga())
+    generators.append(benchmarks_dxt())
+    generators.append(benchmarks_cgf())
+    results = {}
+    for generator in generators:
+        for name, func in generator:
+            if regexs and not any(regex.search(name) for regex in regexs):
+                continue
+            try:
+                results[name] = best_time(func, repeat)
+            except Exception:
+                logger.exception("%s failed" % name)
+                results[name] = None
+            else:
+                logger.info("%-60s %10.4f" % (name, results[name]))
+    return results
+
+def compare(results, baseline, threshold):
+    """Compare results against baseline. Benchmarks which take less
+    than :data:`MIN_TIME` are ignored, as their timings are too noisy.
+
+    :return: List of names of benchmarks which are slower than
+        the baseline by more than the relative threshold.
+    """
+    logger = logging.getLogger("pyffi.benchmark")
+    regressions = []
+    for name, timing in sorted(results.items()):
+        base = baseline.get(name)
+        if base is None or timing is None:
+            continue
+        if max(base, timing) < MIN_TIME:
+            continue
+        change = (timing - base) / base if base > 0 else 0.0
+        if change > threshold:
+            logger.warn("%s is %i%% slower (%.4f -> %.4f)"
+                        % (name, 100 * change, base, timing))
+            regressions.append(name)
+        elif change < -threshold:
+            logger.info("%s is %i%% faster (%.4f -> %.4f)"
+                        % (name, -100 * change, base, timing))
+    return regressions
+
+def main():
+    parser = optparse.OptionParser(
+        usage="%prog [options] [REGEX] ...",
+        description="Run all benchmarks whose name matches any of the"
+        " given regular expressions (all benchmarks if none specified).")
+    parser.add_option(
+        "--baseline", dest="baseline", metavar="FILE",
+        help="compare results against FILE, and exit with status 1 if"
+        " any benchmark is slower")
+    parser.add_option(
+        "--output", dest="output", metavar="FILE", default="benchmark.json",
+        help="write results to FILE [default: %default]")
+    parser.add_option(
+        "--repeat", dest="repeat", type="int", default=3,
+        help="run each benchmark REPEAT times, and keep the best timing"
+        " [default: %default]")
+    parser.add_option(
+        "--scale", dest="scale", type="int", default=1,
+        help="scale the size of the synthetic inputs [default: %default]")
+    parser.add_option(
+        "--threshold", dest="threshold", type="float", default=0.2,
+        help="relative slow down which is considered a regression"
+        " [default: %default]")
+    options, args = parser.parse_args()
+
+    # file names are relative to the current folder, so resolve them
+    # before changing folder
+    output = os.path.abspath(options.output)
+    baseline = os.path.abspath(options.baseline) if options.baseline else None
+    # run from the folder of this script, so tests/ can be found
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    results = run(args, options.repeat, options.scale)
+    with open(output, "w") as outfile:
+        json.dump(results, outfile, indent=1, sort_keys=True)
+    if baseline:
+        with open(baseline) as basefile:
+            baseline = json.load(basefile)
+        if compare(results, baseline, options.threshold):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    # set up logger
+    logger = logging.getLogger("pyffi")
+    logger.setLevel(logging.INFO)
+    loghandler = logging.StreamHandler(sys.stdout)
+    logformatter = logging.Formatter("%(name)s:%(levelname)s:%(message)s")
+    loghandler.setFormatter(logformatter)
+    logger.addHandler(loghandler)
+    main()
@@ -17,6 +17,7 @@ import pyffi.object_models.xml.bit_struct
 import pyffi.object_models.xml.enum
 import pyffi.object_models.xml.expression
 import pyffi.object_models.xml.struct_
+import pyffi.object_models.xml.tracking
 import pyffi.utils
 import pyffi.utils.tristrip
 import pyffi.utils.mathutils
@@ -24,6 +25,12 @@ import pyffi.utils.quickhull
 import pyffi.utils.inertia
 import pyffi.utils.tangentspace
 import pyffi.utils.mopp
+import pyffi.utils.bspline
+import pyffi.utils.transforms
+import pyffi.utils.weld
+import pyffi.utils.simplify
+import pyffi.utils.split
+import pyffi.utils.dxt
 import pyffi.formats.nif
 import pyffi.formats.cgf
 import pyffi.formats.kfm
@@ -77,8 +84,16 @@ suite.addTest(doctest.DocFileSuite('tests/nif/skinpartition.txt'))
 suite.addTest(doctest.DocFileSuite('tests/nif/bhkpackednitristripsshape.txt'))
 suite.addTest(doctest.DocFileSuite('tests/nif/opt_delunusedbones.txt'))
 suite.addTest(doctest.DocFileSuite('tests/nif/opt_collisiongeometry.txt'))
+suite.addTest(doctest.DocFileSuite('tests/nif/getsize.txt'))
+suite.addTest(doctest.DocFileSuite('tests/nif/dump_pixeldata.txt'))
+suite.addTest(doctest.DocFileSuite('tests/nif/opt_simplifygeometry.txt'))
+suite.addTest(doctest.DocFileSuite('tests/nif/opt_split.txt'))
+suite.addTest(doctest.DocFileSuite('tests/nif/passthrough.txt'))
+suite.addTest(doctest.DocFileSuite('tests/nif/modify_maptexturepath.txt'))
+suite.addTest(doctest.DocFileSuite('tests/nif/dump_htmlreport.txt'))
 suite.addTest(doctest.DocFileSuite('tests/cgf/cgftoaster.txt'))
 suite.addTest(doctest.DocFileSuite('tests/kfm/kfmtoaster.txt'))
+suite.addTest(doctest.DocFileSuite('tests/dds/ddstoaster.txt'))
 suite.addTest(doctest.DocFileSuite('docs-sphinx/intro.rst'))
 
 # TODO: examples
@@ -93,7 +93,7 @@ class NifToaster(pyffi.spells.nif.NifToaster):
         pyffi.spells.nif.optimize.SpellCleanRefLists,
         pyffi.spells.nif.optimize.SpellMergeDuplicates,
         pyffi.spells.nif.optimize.SpellOptimizeGeometry,
-        #pyffi.spells.nif.optimize.SpellOptimizeSplit,
+        pyffi.spells.nif.optimize.SpellSplitGeometry,
         pyffi.spells.nif.optimize.SpellOptimize,
         pyffi.spells.nif.optimize.SpellDelUnusedBones,
         pyffi.spells.nif.modify.SpellTexturePath,
@@ -121,10 +121,12 @@ class NifToaster(pyffi.spells.nif.NifToaster):
         pyffi.spells.nif.modify.SpellDelInterpolatorTransformData,
         pyffi.spells.nif.modify.SpellCollisionToMopp,
         pyffi.spells.nif.optimize.SpellReduceGeometry,
+        pyffi.spells.nif.optimize.SpellSimplifyGeometry,
         pyffi.spells.nif.optimize.SpellOptimizeCollisionGeometry,
         pyffi.spells.nif.optimize.SpellOptimizeAnimation,
         pyffi.spells.nif.check.SpellCheckMaterialEmissiveValue,
-        pyffi.spells.nif.modify.SpellMirrorAnimation
+        pyffi.spells.nif.modify.SpellMirrorAnimation,
+        pyffi.spells.nif.modify.SpellMapTexturePath
         ]
     ALIASDICT = {
         "texdump": "dump_tex",
@@ -57,7 +57,7 @@ setup(
     package_data = {'': ['*.xml', '*.xsd', '*.dll', '*.exe'],
                     'pyffi.formats.nif': ['nifxml/nif.xml'],
                     'pyffi.formats.kfm': ['kfmxml/kfm.xml']},
-    scripts = ['scripts/nif/nifmakehsl.py', 'scripts/nif/niftoaster.py', 'scripts/cgf/cgftoaster.py', 'scripts/kfm/kfmtoaster.py', 'scripts/qskope.py'],
+    scripts = ['scripts/nif/nifmakehsl.py', 'scripts/nif/niftoaster.py', 'scripts/cgf/cgftoaster.py', 'scripts/kfm/kfmtoaster.py', 'scripts/dds/ddstoaster.py', 'scripts/qskope.py'],
     author = "Amorilia",
     author_email = "amorilia@users.sourceforge.net",
     license = "BSD",